@@ -3,229 +3,342 @@ import numpy as np
 from PIL import Image
 import torch
 from ultralytics import YOLO
-from transformers import pipeline
-import io
-import base64
+import os
+
+from inference.backends import serve_module, serve_yolo
+from inference.batching import BatchScheduler
+from inference.classification import ClassificationEngine
+from inference.imaging import decode_image, list_images, load_image
+from inference.postprocess import (
+    detection_arrays, detection_dicts, detection_labels, from_yolo_boxes, rectangle_annotations, segment_dicts
+)
+from inference.quantization import QUANTIZED_SUFFIX, load_quantized
+from inference.registry import ModelRegistry
+from inference.render import render_detections, to_data_url
+from inference.result_cache import result_cache
+
+# COCO数据集的类别名称（torchvision 检测模型使用）
+COCO_INSTANCE_CATEGORY_NAMES = [
+    '__background__', 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
+    'train', 'truck', 'boat', 'traffic light', 'fire hydrant', 'N/A', 'stop sign',
+    'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'N/A', 'backpack', 'umbrella', 'N/A', 'N/A',
+    'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', 'N/A', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl',
+    'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza',
+    'donut', 'cake', 'chair', 'couch', 'potted plant', 'bed', 'N/A', 'dining table',
+    'N/A', 'N/A', 'toilet', 'N/A', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone',
+    'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'N/A', 'book',
+    'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+]
+
+# 分类模型在加载时一次性放到推理设备上，避免每次请求都搬运权重
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# 导出分类模型与一致性校验使用的样例输入
+CLASSIFIER_SAMPLE_INPUT = torch.zeros(1, 3, 224, 224)
+
+SAM_CHECKPOINT = os.getenv("SAM_CHECKPOINT", "sam_vit_h_4b8939.pth")
+SAM_MODEL_TYPE = os.getenv("SAM_MODEL_TYPE", "vit_h")
+
+
+class FallbackResult(list):
+    """模型不可用或推理出错时返回的模拟 / 空结果，用法与普通列表相同；调用方据此不写入结果缓存、不持久化"""
+
+
+def is_fallback(result):
+    """结果是否为模拟 / 回退数据（见 FallbackResult）"""
+    return isinstance(result, FallbackResult)
+
+
+def is_ultralytics_model(model):
+    """ultralytics 的 YOLO 继承自 torch.nn.Module，不能用 isinstance 区分；按其特有的 predictor 与 names 属性判断"""
+    return hasattr(model, "predictor") and hasattr(model, "names")
+
+
+def _load_yolo_detector():
+    return serve_yolo("YOLO", YOLO('yolov8n.pt'))  # nano版本，轻量级
+
+
+def _load_fasterrcnn():
+    try:
+        return _build_fasterrcnn()
+    except Exception as e:
+        print(f"❌ 加载PyTorch检测模型失败: {e}")
+        # 如果加载失败，使用YOLO作为备选
+        model = YOLO('yolov8n.pt')
+        model.conf = 0.4
+        print("⚠️ 使用YOLO模拟Faster R-CNN模型")
+        return model
+
+
+def _load_ssd():
+    import torchvision
+    model = torchvision.models.detection.ssd300_vgg16(pretrained=True)
+    model.eval()  # 设置为评估模式
+    return model
+
+
+def _load_yolo_seg():
+    return serve_yolo("YOLO-Seg", YOLO('yolov8n-seg.pt'))
+
+
+def _load_mask_rcnn():
+    # 模拟Mask R-CNN（实际上使用YOLO-Seg但配置不同）
+    model = serve_yolo("MaskRCNN", YOLO('yolov8n-seg.pt'))
+    model.conf = 0.5  # 设置不同的置信度阈值
+    return model
+
+
+def _build_resnet():
+    import torchvision.models as models
+    return models.resnet50(pretrained=True).eval()
+
+
+def _build_efficientnet():
+    import torchvision.models as models
+    return models.efficientnet_b0(pretrained=True).eval()
+
+
+def _load_resnet():
+    return serve_module("ResNet", _build_resnet().to(DEVICE), CLASSIFIER_SAMPLE_INPUT)
+
+
+def _load_efficientnet():
+    return serve_module("EfficientNet", _build_efficientnet().to(DEVICE), CLASSIFIER_SAMPLE_INPUT)
+
+
+def _build_fasterrcnn():
+    import torchvision
+    return torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=True).eval()
+
+
+def _load_resnet_int8():
+    # 配置了校准目录（AI_QUANT_CALIBRATION_DIR）时做静态量化，否则动态量化
+    return load_quantized("ResNet", _build_resnet, static=True)
+
+
+def _load_efficientnet_int8():
+    return load_quantized("EfficientNet", _build_efficientnet)
+
+
+def _load_fasterrcnn_int8():
+    return load_quantized("FasterRCNN", _build_fasterrcnn)
+
+
+def _load_sam():
+    import importlib.util
+    if importlib.util.find_spec("segment_anything") is None:
+        raise ImportError("未安装segment_anything库，无法加载SAM模型")
+    if not os.path.exists(SAM_CHECKPOINT):
+        raise FileNotFoundError(f"SAM模型文件不存在: {SAM_CHECKPOINT}")
+    from segment_anything import sam_model_registry, SamPredictor
+    print(f"正在加载SAM模型: {SAM_CHECKPOINT}")
+    sam = sam_model_registry[SAM_MODEL_TYPE](checkpoint=SAM_CHECKPOINT)
+    return SamPredictor(sam)
+
 
 class AIModelService:
     def __init__(self):
-        # 初始化模型（首次运行会自动下载）
-        self.detection_models = {}
-        self.segmentation_models = {}
-        self.classification_models = {}
-        self.sam_model = None
-        self._load_models()
-    
-    def _load_models(self):
+        # 只登记模型，首次使用时才加载（首次运行会自动下载权重）
+        self.fasterrcnn_classes = COCO_INSTANCE_CATEGORY_NAMES
+        self.registry = ModelRegistry()
+        self._register_models()
+        self.classification_engine = ClassificationEngine(self.registry, DEVICE)
+
+    def _register_models(self):
+        self.registry.register("YOLO", "detection", _load_yolo_detector)
+        self.registry.register("FasterRCNN", "detection", _load_fasterrcnn)
+        self.registry.register("SSD", "detection", _load_ssd)
+        self.registry.register("YOLO-Seg", "segmentation", _load_yolo_seg)
+        self.registry.register("MaskRCNN", "segmentation", _load_mask_rcnn)
+        self.registry.register("SAM", "segmentation", _load_sam)
+        self.registry.register("ResNet", "classification", _load_resnet)
+        self.registry.register("EfficientNet", "classification", _load_efficientnet)
+        # INT8 量化版本（仅 CPU），通过模型名选择，例如 ResNet-int8
+        self.registry.register("ResNet-int8", "classification", _load_resnet_int8)
+        self.registry.register("EfficientNet-int8", "classification", _load_efficientnet_int8)
+        self.registry.register("FasterRCNN-int8", "detection", _load_fasterrcnn_int8)
+
+    def preload_models(self):
+        """预加载 AI_PRELOAD_MODELS 白名单中的模型"""
+        self.registry.preload()
+
+    def model_version(self, model_name):
+        """模型的权重版本号（必要时先加载模型），未登记或不可用的模型返回 None"""
+        if not self.registry.has(model_name):
+            return None
+        return self.registry.version(model_name)
+
+    def resolve_model_name(self, model_name, family, default):
+        """前端传入的模型名未登记到该模型族时，回退到默认模型"""
+        return model_name if self.registry.has(model_name, family) else default
+
+    def resolve_tool_model(self, tool, model_name=None):
+        """按标注工具解析实际使用的模型名；不支持的工具抛出 ValueError"""
+        if tool == "object_detection":
+            return self.resolve_model_name(model_name, "detection", "YOLO")
+        if tool == "image_classification":
+            return self.resolve_model_name(model_name, "classification", "ResNet")
+        if tool == "image_segmentation":
+            # 未传 model 时默认用 YOLO-Seg，避免走模拟数据
+            return (model_name and str(model_name).strip()) or "YOLO-Seg"
+        raise ValueError(f"Tool type '{tool}' is not supported.")
+
+    def annotate_batch(self, tool, images, model_name=None):
+        """按标注工具对一批图片推理，返回 [(标注列表, 检测框绘制数据), ...]；非检测工具的绘制数据为 None。
+        检测与分类一批只做一次前向推理，分割逐张处理。"""
+        model_name = self.resolve_tool_model(tool, model_name)
+        if tool == "object_detection":
+            return self.detect_batch(images, model_name)
+        if tool == "image_classification":
+            return [(results, None) for results in self.classify_batch(images, model_name)]
+        return [(self.segment_objects(image, model_name), None) for image in images]
+
+    def class_names(self, tool, model_name=None):
+        """模型的类别表 {类别 id: 类别名}，用于把标注转换为 YOLO 标签"""
+        model_name = self.resolve_tool_model(tool, model_name)
+        if tool == "image_classification":
+            return dict(enumerate(self.classification_engine.labels))
+        model = self.registry.get(model_name) if self.registry.has(model_name) else None
+        if model is None:
+            raise RuntimeError(f"模型 {model_name} 不可用")
+        names = model.names if is_ultralytics_model(model) else self.fasterrcnn_classes
+        return dict(names) if isinstance(names, dict) else dict(enumerate(names))
+
+    def prelabel_batch(self, tool, images, model_name=None):
+        """
+        预标注任务使用的批量推理，返回 [(标注列表, 结构化结果), ...]：
+        标注列表与 /api/auto_annotate 写库的格式一致；结构化结果检测为 detect_objects 的格式
+        （含 class_name 与 0~1 的 bbox_percent），分割为 segment_objects 的格式（百分比轮廓），分类为 top-k。
+        与在线接口不同，检测 / 分割模型不可用或推理失败时直接抛出异常，不返回模拟数据，
+        以免把模拟标注写库、写出空标签文件后被后续运行当作已有标签跳过。
+        """
+        model_name = self.resolve_tool_model(tool, model_name)
+        if tool == "object_detection":
+            model = self.registry.get(model_name)
+            if model is None:
+                raise RuntimeError(f"检测模型 {model_name} 不可用")
+            bgr_images = [load_image(image) for image in images]
+            results = []
+            for image, detections in zip(bgr_images, self._run_detection_batch(model, bgr_images)):
+                img_h, img_w = image.shape[:2]
+                results.append((
+                    rectangle_annotations(detections, img_w, img_h),
+                    detection_dicts(detections, img_w, img_h)
+                ))
+            return results
+        if tool == "image_classification":
+            return [(top_k, top_k) for top_k in self.classification_engine.classify_batch(images, model_name)]
+        results = []
+        for image in images:
+            segments = self.segment_objects(image, model_name)
+            if is_fallback(segments):
+                raise RuntimeError(f"分割模型 {model_name} 不可用或推理失败")
+            results.append((segments, segments))
+        return results
+
+    def detect_objects_with_visualization(self, image, model_name="YOLO"):
+        """边界框检测，image 可为图片字节、BGR ndarray 或文件路径，返回 (标注列表, 标注后的图片Base64编码)"""
+        return self.detect_batch_with_visualization([image], model_name)[0]
+
+    def detect_batch_with_visualization(self, images, model_name="YOLO"):
+        """批量边界框检测并渲染：按输入顺序返回 [(标注列表, 标注后的图片Base64编码), ...]"""
         try:
-            # 加载目标检测模型
-            self.detection_models["YOLO"] = YOLO('yolov8n.pt')  # nano版本，轻量级
-            print("✅ YOLO 目标检测模型加载成功")
-            
-            # 加载真正的Faster R-CNN模型
-            try:
-                import torch
-                import torchvision
-                
-                # 加载预训练的Faster R-CNN模型
-                self.detection_models["FasterRCNN"] = torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=True)
-                self.detection_models["FasterRCNN"].eval()  # 设置为评估模式
-                
-                # 加载COCO数据集的类别名称
-                self.fasterrcnn_classes = [
-                    '__background__', 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
-                    'train', 'truck', 'boat', 'traffic light', 'fire hydrant', 'N/A', 'stop sign',
-                    'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
-                    'elephant', 'bear', 'zebra', 'giraffe', 'N/A', 'backpack', 'umbrella', 'N/A', 'N/A',
-                    'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
-                    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
-                    'bottle', 'N/A', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl',
-                    'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza',
-                    'donut', 'cake', 'chair', 'couch', 'potted plant', 'bed', 'N/A', 'dining table',
-                    'N/A', 'N/A', 'toilet', 'N/A', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone',
-                    'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'N/A', 'book',
-                    'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
-                ]
-                print("✅ Faster R-CNN 目标检测模型加载成功")
-                
-                # 加载SSD模型作为另一个选项
-                self.detection_models["SSD"] = torchvision.models.detection.ssd300_vgg16(pretrained=True)
-                self.detection_models["SSD"].eval()  # 设置为评估模式
-                print("✅ SSD 目标检测模型加载成功")
-                
-            except Exception as e:
-                print(f"❌ 加载PyTorch检测模型失败: {e}")
-                # 如果加载失败，使用YOLO作为备选
-                self.detection_models["FasterRCNN"] = YOLO('yolov8n.pt')
-                self.detection_models["FasterRCNN"].conf = 0.4
-                print("⚠️ 使用YOLO模拟Faster R-CNN模型")
-            
-            # 尝试加载分割模型
-            try:
-                # 加载YOLO分割模型
-                self.segmentation_models["YOLO-Seg"] = YOLO('yolov8n-seg.pt')
-                print("✅ YOLO-Seg 分割模型加载成功")
-                
-                # 模拟Mask R-CNN（实际上使用YOLO-Seg但配置不同）
-                self.segmentation_models["MaskRCNN"] = YOLO('yolov8n-seg.pt')
-                self.segmentation_models["MaskRCNN"].conf = 0.5  # 设置不同的置信度阈值
-                print("✅ Mask R-CNN 分割模型加载成功")
-            except Exception as e:
-                print(f"❌ 分割模型加载失败: {e}")
-            
-            # 尝试加载分类模型
-            try:
-                import torch
-                import torchvision.models as models
-                
-                # 加载预训练的ResNet模型
-                self.classification_models["ResNet"] = models.resnet50(pretrained=True)
-                print("✅ ResNet 分类模型加载成功")
-                
-                # 加载预训练的EfficientNet模型
-                self.classification_models["EfficientNet"] = models.efficientnet_b0(pretrained=True)
-                print("✅ EfficientNet 分类模型加载成功")
-            except Exception as e:
-                print(f"❌ 分类模型加载失败: {e}")
-                
-            # 尝试加载SAM模型
-            try:
-                import importlib.util
-                if importlib.util.find_spec("segment_anything") is not None:
-                    from segment_anything import sam_model_registry, SamPredictor
-                    
-                    # 检查SAM模型文件是否存在
-                    import os
-                    sam_checkpoint = "sam_vit_h_4b8939.pth"
-                    model_type = "vit_h"
-                    
-                    if os.path.exists(sam_checkpoint):
-                        print(f"正在加载SAM模型: {sam_checkpoint}")
-                        sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
-                        self.sam_model = SamPredictor(sam)
-                        print("✅ SAM模型加载成功")
-                    else:
-                        print(f"❌ SAM模型文件不存在: {sam_checkpoint}")
-                else:
-                    print("❌ 未安装segment_anything库，无法加载SAM模型")
-            except Exception as e:
-                print(f"❌ 加载SAM模型失败: {e}")
+            bgr_images = [load_image(image) for image in images]
         except Exception as e:
-            print(f"❌ 模型加载失败: {e}")
-    
-    def detect_objects_with_visualization(self, image_bytes, model_name="YOLO"):
-        """边界框检测，返回 (标注列表, 标注后的图片Base64编码)"""
-        # 选择模型，默认使用YOLO
-        if model_name not in self.detection_models:
-            model_name = "YOLO"
-            
-        if not self.detection_models:
-            # 如果模型未加载，返回模拟数据和空图片
-            return [self._generate_mock_bbox()], None
-        
-        try:
-            # 转换图片格式
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            img_np = np.array(image)
-            
-            # 使用指定的模型运行推理
-            model = self.detection_models[model_name]
-            results = model(image)
-            
-            annotations = []
-            # 在图片上绘制
-            draw_img = img_np.copy()
+            print(f"目标检测错误: {e}")
+            return [(FallbackResult([self._generate_mock_bbox()]), None) for _ in images]
+        results = []
+        for image, (annotations, boxes) in zip(bgr_images, self.detect_batch(bgr_images, model_name)):
+            annotated_image = to_data_url(*render_detections(image, boxes)) if boxes is not None else None
+            results.append((annotations, annotated_image))
+        return results
 
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # 获取边界框坐标
-                        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                        conf = box.conf[0].item()
-                        cls = int(box.cls[0].item())
-                        
-                        # 获取类别名称
-                        class_name = model.names[cls]
-                        label = f"{class_name} ({conf:.2f})"
-
-                        # 绘制边界框
-                        cv2.rectangle(draw_img, (x1, y1), (x2, y2), (0, 255, 255), 2)
-                        
-                        # 绘制标签背景
-                        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                        cv2.rectangle(draw_img, (x1, y1 - 20), (x1 + w, y1), (0, 255, 255), -1)
-                        # 绘制标签文字
-                        cv2.putText(draw_img, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
-
-                        # 转换为百分比坐标用于JSON返回
-                        img_w, img_h = image.size
-                        x_percent = (x1 / img_w) * 100
-                        y_percent = (y1 / img_h) * 100
-                        w_percent = ((x2 - x1) / img_w) * 100
-                        h_percent = ((y2 - y1) / img_h) * 100
-                        
-                        annotation = {
-                            "from_name": "tag",
-                            "to_name": "img",
-                            "type": "rectanglelabels",
-                            "value": {
-                                "rectanglelabels": [label],
-                                "x": x_percent,
-                                "y": y_percent,
-                                "width": w_percent,
-                                "height": h_percent
-                            }
-                        }
-                        annotations.append(annotation)
-            
-            # 将绘制后的图片转为Base64
-            _, buffer = cv2.imencode('.jpg', cv2.cvtColor(draw_img, cv2.COLOR_RGB2BGR))
-            annotated_image_base64 = base64.b64encode(buffer).decode('utf-8')
+    def detect_batch(self, images, model_name="YOLO"):
+        """批量边界框检测（不渲染）：一批图片只做一次前向推理，按输入顺序返回 [(标注列表, 绘制数据), ...]
+        每张图片可为图片字节、BGR ndarray 或文件路径；绘制数据为 {"xyxy": [...], "labels": [...]}，
+        供 inference.render 按需渲染。检测失败时返回模拟标注（FallbackResult），绘制数据为 None。"""
+        # 选择模型，默认使用YOLO
+        model_name = self.resolve_model_name(model_name, "detection", "YOLO")
+        model = self.registry.get(model_name)
+        if model is None:
+            # 如果模型加载失败，返回模拟数据
+            return [(FallbackResult([self._generate_mock_bbox()]), None) for _ in images]
 
-            return annotations, f"data:image/jpeg;base64,{annotated_image_base64}"
-            
+        try:
+            # 统一为 BGR ndarray（已解码的图片不会再次解码）
+            bgr_images = [load_image(image) for image in images]
+            results = []
+            for image, detections in zip(bgr_images, self._run_detection_batch(model, bgr_images)):
+                img_h, img_w = image.shape[:2]
+                labels = detection_labels(detections)
+                # 转换为百分比坐标用于JSON返回
+                annotations = rectangle_annotations(detections, img_w, img_h, labels)
+                results.append((annotations, {"xyxy": detections.xyxy.tolist(), "labels": labels}))
+            return results
         except Exception as e:
             print(f"目标检测错误: {e}")
-            return [self._generate_mock_bbox()], None
-    
-    def segment_objects(self, image_path, model_name=None):
-        """多边形分割。优先使用前端指定的模型；未指定时再按 SAM -> YOLO-Seg 回退，避免始终走模拟数据。"""
+            return [(FallbackResult([self._generate_mock_bbox()]), None) for _ in images]
+
+    def _run_detection_batch(self, model, bgr_images, threshold=0.5):
+        """对一批 BGR 图片做一次前向推理，返回每张图片的 DetectionArrays"""
+        if not is_ultralytics_model(model):
+            # torchvision 检测模型（Faster R-CNN / SSD 及其 INT8 版本）原生接受 RGB 张量列表
+            import torchvision.transforms.functional as F
+            tensors = [F.to_tensor(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in bgr_images]
+            with torch.no_grad():
+                predictions = model(tensors)
+            return [
+                detection_arrays(
+                    prediction['boxes'], prediction['scores'], prediction['labels'],
+                    self.fasterrcnn_classes, threshold=threshold, fallback="Class_{}"
+                )
+                for prediction in predictions
+            ]
+
+        # YOLO 直接接受 BGR ndarray 列表，一次推理整批，每张图片对应一个 result
+        results = model(bgr_images)
+        return [from_yolo_boxes(result.boxes, model.names) for result in results]
+
+    def segment_objects(self, image, model_name=None):
+        """多边形分割，image 可为 BGR ndarray、图片字节或文件路径。优先使用前端指定的模型；未指定时再按 SAM -> YOLO-Seg 回退，避免始终走模拟数据。"""
         try:
-            # 读取图像
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"无法读取图像: {image_path}")
+            # 读取图像（已解码的 ndarray 直接使用）
+            image = load_image(image)
                 
             height, width = image.shape[:2]
             
             # 若前端指定了模型，严格按指定模型执行
             if model_name and model_name.strip():
-                if model_name.strip() in self.segmentation_models:
-                    return self._segment_with_yolo(image, width, height, model_name.strip())
-                if (hasattr(self, 'sam_model') and self.sam_model and
-                        model_name.strip().upper() == "SAM"):
-                    return self._segment_with_sam(image, width, height)
-            
-            # 未指定或未匹配时：优先 YOLO-Seg（已加载则用真实推理），否则 SAM，最后才用模拟
-            if self.segmentation_models and "YOLO-Seg" in self.segmentation_models:
+                name = model_name.strip()
+                if name.upper() == "SAM":
+                    sam_model = self.registry.get("SAM")
+                    if sam_model is not None:
+                        return self._segment_with_sam(sam_model, image, width, height)
+                elif self.registry.has(name, "segmentation") and self.registry.get(name) is not None:
+                    return self._segment_with_yolo(image, width, height, name)
+            
+            # 未指定或未匹配时：优先 YOLO-Seg（可加载则用真实推理），否则 SAM，最后才用模拟
+            if self.registry.get("YOLO-Seg") is not None:
                 return self._segment_with_yolo(image, width, height, "YOLO-Seg")
-            if hasattr(self, 'sam_model') and self.sam_model:
-                return self._segment_with_sam(image, width, height)
+            sam_model = self.registry.get("SAM")
+            if sam_model is not None:
+                return self._segment_with_sam(sam_model, image, width, height)
             return self._generate_mock_segments(width, height)
             
         except Exception as e:
             print(f"分割错误: {e}")
-            return []
+            return FallbackResult()
             
-    def _segment_with_sam(self, image, width, height):
+    def _segment_with_sam(self, sam_model, image, width, height):
         """使用SAM模型进行分割"""
         try:
             # 转换为RGB格式
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # 使用SAM模型生成掩码
-            self.sam_model.set_image(image_rgb)
+            sam_model.set_image(image_rgb)
             
             # 自动生成提示点
             # 这里简化处理，使用图像中心点作为提示点
@@ -234,7 +347,7 @@ class AIModelService:
             input_label = np.array([1])  # 1表示前景
             
             # 生成掩码
-            masks, scores, _ = self.sam_model.predict(
+            masks, scores, _ = sam_model.predict(
                 point_coords=input_point,
                 point_labels=input_label,
                 multimask_output=True
@@ -280,7 +393,7 @@ class AIModelService:
     def _segment_with_yolo(self, image, width, height, model_name="YOLO-Seg"):
         """使用YOLO分割模型进行分割。类别与置信度从 result.boxes 取，轮廓从 result.masks.xy 取（新版 ultralytics 的 Masks 无 .cls/.conf）。"""
         try:
-            model = self.segmentation_models[model_name]
+            model = self.registry.get(model_name)
             results = model(image)
             
             segments = []
@@ -288,26 +401,13 @@ class AIModelService:
                 if result.masks is None:
                     continue
                 boxes = result.boxes
-                # 新版 API：cls、conf 在 boxes 上；轮廓在 masks.xy（像素坐标列表）
-                n = len(result.masks.xy)
-                for i in range(n):
-                    cls_id = int(boxes.cls[i].item()) if boxes is not None and i < len(boxes.cls) else 0
-                    conf = float(boxes.conf[i].item()) if boxes is not None and i < len(boxes.conf) else 0.0
-                    class_name = model.names.get(cls_id, f"class_{cls_id}")
-                    # 使用 masks.xy[i]：当前实例的轮廓点 (N, 2) 像素坐标
-                    xy = result.masks.xy[i]
-                    if hasattr(xy, 'cpu'):
-                        xy = xy.cpu().numpy()
-                    xy = np.asarray(xy)
-                    if xy.size < 6:  # 至少 3 个点
-                        continue
-                    points = [[float((x / width) * 100), float((y / height) * 100)] for x, y in xy]
-                    if len(points) >= 3:
-                        segments.append({
-                            "class_name": class_name,
-                            "confidence": conf,
-                            "points": points
-                        })
+                # 轮廓 masks.xy[i] 为 (N, 2) 像素坐标，整体换算为百分比坐标；少于 3 个点的实例被丢弃
+                segments.extend(segment_dicts(
+                    result.masks.xy,
+                    boxes.conf if boxes is not None else None,
+                    boxes.cls if boxes is not None else None,
+                    model.names, width, height
+                ))
             
             return segments
             
@@ -319,7 +419,7 @@ class AIModelService:
     
     def _generate_mock_segments(self, width, height):
         """生成模拟的分割结果"""
-        segments = []
+        segments = FallbackResult()
         
         # 模拟一个多边形
         points = [
@@ -353,30 +453,24 @@ class AIModelService:
         
         return segments
             
-    def detect_objects(self, image_path, model_name=None):
-        """边界框检测，返回检测结果列表"""
+    def detect_objects(self, image, model_name=None):
+        """边界框检测，image 可为 BGR ndarray、图片字节或文件路径，返回检测结果列表"""
         # 选择模型，默认使用YOLO
-        if model_name not in self.detection_models:
+        if not self.registry.has(model_name, "detection"):
             model_name = "YOLO"
-            
-        if not self.detection_models:
-            # 如果模型未加载，返回模拟数据
+
+        model = self.registry.get(model_name)
+        if model is None:
+            # 如果模型加载失败，返回模拟数据
             return self._generate_mock_detections()
         
         try:
-            # 读取图像
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"无法读取图像: {image_path}")
-                
-            height, width = image.shape[:2]
-            
-            # 获取选定的模型
-            model = self.detection_models[model_name]
+            # 读取图像（已解码的 ndarray 直接使用）
+            image = load_image(image)
             
             # 根据模型类型进行不同的处理
-            if model_name in ["FasterRCNN", "SSD"] and isinstance(model, torch.nn.Module):
-                # 使用PyTorch模型进行检测
+            if not is_ultralytics_model(model):
+                # 使用PyTorch模型进行检测（Faster R-CNN / SSD 及其 INT8 版本）
                 return self._detect_with_pytorch(image, model, model_name)
             else:
                 # 使用YOLO模型进行检测
@@ -394,98 +488,31 @@ class AIModelService:
         
         detections = []
         for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    # 获取边界框坐标
-                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                    conf = box.conf[0].item()
-                    cls = int(box.cls[0].item())
-                    
-                    # 获取类别名称
-                    class_name = model.names[cls]
-                    
-                    # 转换为百分比坐标
-                    x_percent = x1 / width
-                    y_percent = y1 / height
-                    w_percent = (x2 - x1) / width
-                    h_percent = (y2 - y1) / height
-                    
-                    # 添加检测结果
-                    detections.append({
-                        'bbox': [x1, y1, x2, y2],
-                        'bbox_percent': [x_percent, y_percent, w_percent, h_percent],
-                        'confidence': float(conf),
-                        'class_id': int(cls),
-                        'class_name': class_name
-                    })
-        
+            detections.extend(detection_dicts(from_yolo_boxes(result.boxes, model.names), width, height))
         return detections
         
     def _detect_with_pytorch(self, image, model, model_name):
         """使用PyTorch检测模型进行目标检测"""
-        import torch
-        import torchvision.transforms as transforms
-        from PIL import Image
-        import numpy as np
-        
-        # 转换图像格式
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(image_rgb)
-        
-        # 转换为PyTorch张量
-        transform = transforms.Compose([
-            transforms.ToTensor()
-        ])
-        img_tensor = transform(pil_image)
+        import torchvision.transforms.functional as F
+
+        # 转换为PyTorch张量（RGB）
+        img_tensor = F.to_tensor(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
         
         # 进行推理
         with torch.no_grad():
             predictions = model([img_tensor])
         
-        # 处理预测结果
-        detections = []
-        boxes = predictions[0]['boxes'].cpu().numpy()
-        scores = predictions[0]['scores'].cpu().numpy()
-        labels = predictions[0]['labels'].cpu().numpy()
-        
-        # 设置置信度阈值
-        threshold = 0.5
-        
-        # 获取图像尺寸
+        # 按置信度阈值 0.5 过滤后整体换算坐标
         height, width = image.shape[:2]
-        
-        for i, box in enumerate(boxes):
-            if scores[i] >= threshold:
-                x1, y1, x2, y2 = map(int, box)
-                label_id = int(labels[i])
-                
-                # 获取类别名称
-                if model_name in ["FasterRCNN", "SSD"]:
-                    class_name = self.fasterrcnn_classes[label_id]
-                else:
-                    class_name = f"Class_{label_id}"
-                
-                # 转换为百分比坐标
-                x_percent = x1 / width
-                y_percent = y1 / height
-                w_percent = (x2 - x1) / width
-                h_percent = (y2 - y1) / height
-                
-                # 添加检测结果
-                detections.append({
-                    'bbox': [x1, y1, x2, y2],
-                    'bbox_percent': [x_percent, y_percent, w_percent, h_percent],
-                    'confidence': float(scores[i]),
-                    'class_id': label_id,
-                    'class_name': class_name
-                })
-        
-        return detections
+        detections = detection_arrays(
+            predictions[0]['boxes'], predictions[0]['scores'], predictions[0]['labels'],
+            self.fasterrcnn_classes, threshold=0.5, fallback="Class_{}"
+        )
+        return detection_dicts(detections, width, height)
     
     def _generate_mock_detections(self):
         """生成模拟的检测结果"""
-        return [
+        return FallbackResult([
             {
                 'bbox': [100, 150, 400, 750],
                 'bbox_percent': [0.1, 0.15, 0.3, 0.6],
@@ -500,13 +527,13 @@ class AIModelService:
                 'class_id': 2,
                 'class_name': "Car"
             }
-        ]
+        ])
         
-    def detect_oriented_objects(self, image_path, model_name=None):
+    def detect_oriented_objects(self, image, model_name=None):
         """方向边界框(OBB)检测"""
         try:
             # 读取图像
-            image = cv2.imread(image_path)
+            image = load_image(image)
             height, width = image.shape[:2]
             
             # 模拟OBB检测结果
@@ -570,69 +597,18 @@ class AIModelService:
             print(f"方向框检测错误: {e}")
             return []
     
-    def classify_image(self, image_path, model_name=None):
-        """图像分类"""
+    def classify_batch(self, images, model_name=None, top_k=3):
+        """批量图像分类：一次前向推理处理多张图片，返回每张图片的 top-k 结果"""
         try:
-            import torch
-            import torchvision.transforms as transforms
-            import torchvision.models as models
-            from PIL import Image
-            
-            # 检查是否有GPU可用
-            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            
-            # 如果模型字典为空，初始化分类模型
-            if not self.classification_models:
-                self.classification_models = {
-                    "ResNet": models.resnet50(pretrained=True),
-                    "EfficientNet": models.efficientnet_b0(pretrained=True)
-                }
-                
-            # 选择模型，默认使用ResNet
-            if model_name not in self.classification_models:
-                model_name = "ResNet"
-                
-            # 使用选定的模型
-            model = self.classification_models[model_name]
-            
-            model.eval()
-            model.to(device)
-            
-            # 图像预处理
-            preprocess = transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            ])
-            
-            # 加载图像
-            image = Image.open(image_path).convert('RGB')
-            input_tensor = preprocess(image)
-            input_batch = input_tensor.unsqueeze(0).to(device)
-            
-            # 进行推理
-            with torch.no_grad():
-                output = model(input_batch)
-                probabilities = torch.nn.functional.softmax(output[0], dim=0)
-            
-            # 加载ImageNet类别标签
-            with open('imagenet_classes.txt', 'r') as f:
-                categories = [s.strip() for s in f.readlines()]
-            
-            # 获取前3个预测结果
-            top3_prob, top3_catid = torch.topk(probabilities, 3)
-            
-            # 构建分类结果
-            classifications = []
-            for i in range(top3_prob.size(0)):
-                classifications.append({
-                    "class_name": categories[top3_catid[i]],
-                    "confidence": float(top3_prob[i].item())
-                })
-            
-            return classifications
-            
+            return self.classification_engine.classify_batch(images, model_name, top_k=top_k)
+        except Exception as e:
+            print(f"批量图像分类错误: {e}")
+            return [self._generate_mock_classification() for _ in images]
+
+    def classify_image(self, image, model_name=None):
+        """图像分类，image 可为 BGR ndarray、图片字节或文件路径"""
+        try:
+            return self.classification_engine.classify_batch([image], model_name)[0]
         except FileNotFoundError:
             # 如果找不到ImageNet类别文件，使用通用类别
             try:
@@ -641,7 +617,7 @@ class AIModelService:
                 import random
                 
                 # 生成随机但合理的分类结果
-                classifications = []
+                classifications = FallbackResult()
                 # 确保主要类别的置信度较高
                 main_confidence = random.uniform(0.7, 0.95)
                 classifications.append({
@@ -673,6 +649,78 @@ class AIModelService:
             # 如果出错，返回模拟数据
             return self._generate_mock_classification()
 
+    def quantization_report(self, model_name, validation_dir, limit=200, batch_size=16):
+        """在验证集上比较 INT8 模型与原始 fp32 模型的精度差异与延迟"""
+        import time
+        from evaluation.metrics import EvaluationMetrics
+
+        if not model_name.endswith(QUANTIZED_SUFFIX):
+            model_name += QUANTIZED_SUFFIX
+        base_name = model_name[:-len(QUANTIZED_SUFFIX)]
+        if not self.registry.has(model_name):
+            raise ValueError(f"没有可用的量化模型: {model_name}")
+        images = [str(path) for path in list_images(validation_dir, limit)]
+        if not images:
+            raise FileNotFoundError(f"验证集目录中没有图片: {validation_dir}")
+
+        quantized_model = self.registry.get(model_name)
+        if quantized_model is None:
+            raise RuntimeError(f"量化模型 {model_name} 加载失败")
+        family = "classification" if self.registry.has(model_name, "classification") else "detection"
+        report = {
+            "model": model_name,
+            "base_model": base_name,
+            "family": family,
+            "quantization_mode": getattr(quantized_model, "quantization_mode", None),
+            "images": len(images),
+        }
+        seconds = {base_name: 0.0, model_name: 0.0}
+
+        if family == "classification":
+            results = {base_name: [], model_name: []}
+            for start in range(0, len(images), batch_size):
+                batch = images[start:start + batch_size]
+                for name in (base_name, model_name):
+                    began = time.perf_counter()
+                    results[name] += self.classification_engine.classify_batch(batch, name, top_k=1)
+                    seconds[name] += time.perf_counter() - began
+            base_top1 = [r[0]["class_name"] for r in results[base_name]]
+            quant_top1 = [r[0]["class_name"] for r in results[model_name]]
+            report["top1_agreement"] = sum(a == b for a, b in zip(base_top1, quant_top1)) / len(images)
+
+            # ImageFolder 结构且子目录名是 ImageNet 类别名时，额外报告 top-1 准确率
+            labels = set(self.classification_engine.labels)
+            truths = [os.path.basename(os.path.dirname(path)) for path in images]
+            labelled = [i for i, truth in enumerate(truths) if truth in labels]
+            if labelled:
+                base_acc = sum(base_top1[i] == truths[i] for i in labelled) / len(labelled)
+                quant_acc = sum(quant_top1[i] == truths[i] for i in labelled) / len(labelled)
+                report["labelled_images"] = len(labelled)
+                report["accuracy"] = {"fp32": base_acc, "int8": quant_acc, "delta": quant_acc - base_acc}
+        else:
+            # 以 fp32 检测结果作为参考标注，计算 INT8 结果的精确率与召回率；类别键带上图片序号，避免跨图片匹配
+            references, predictions = [], []
+            for index, path in enumerate(images):
+                image = load_image(path)
+                for name, target in ((base_name, references), (model_name, predictions)):
+                    began = time.perf_counter()
+                    detections = self.detect_objects(image, name)
+                    seconds[name] += time.perf_counter() - began
+                    target.extend({
+                        'class': f"{index}/{det['class_name']}",
+                        'box': det['bbox'],
+                        'confidence': det['confidence']
+                    } for det in detections)
+            precision, recall = EvaluationMetrics.calculate_precision_recall(predictions, references, 0.5)
+            report["agreement"] = {"precision": precision['overall'], "recall": recall['overall']}
+            report["detections"] = {"fp32": len(references), "int8": len(predictions)}
+
+        report["latency_ms_per_image"] = {
+            "fp32": seconds[base_name] / len(images) * 1000,
+            "int8": seconds[model_name] / len(images) * 1000,
+        }
+        return report
+
     def detect_keypoints(self, image_bytes):
         """关键点检测"""
         # 这里可以集成人体姿态估计模型
@@ -721,11 +769,18 @@ class AIModelService:
     
     def _generate_mock_classification(self):
         """生成模拟分类结果"""
-        return [
+        return FallbackResult([
             {"class_name": "Cat", "confidence": 0.98},
             {"class_name": "Dog", "confidence": 0.01},
             {"class_name": "Other", "confidence": 0.01}
-        ]
+        ])
 
 # 全局模型实例
-ai_service = AIModelService()
\ No newline at end of file
+ai_service = AIModelService()
+# 模型（重新）加载后权重版本变化时，清除该模型旧版本的推理结果缓存
+ai_service.registry.add_version_listener(result_cache.invalidate_model)
+
+# 目标检测微批调度器：同一模型的并发请求合并为一次批量推理（渲染由调用方按需进行）
+detection_scheduler = BatchScheduler(
+    lambda model_name, images: ai_service.detect_batch(images, model_name)
+)
\ No newline at end of file
@@ -0,0 +1 @@
+# 图片与自动 / 手动标注模块初始化文件
\ No newline at end of file
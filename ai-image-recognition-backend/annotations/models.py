@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from database import Base
+
+class Image(Base):
+    __tablename__ = "images"
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, unique=True, index=True)
+    # 原图内容的 SHA-256（对应 image_blobs.content_hash），内容相同的图片共用一份原图与推理结果
+    content_hash = Column(String(64), index=True, nullable=True)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    annotations = relationship("AutoAnnotation", back_populates="image")
+    manual_annotations = relationship("ManualAnnotation", back_populates="image")
+
+class AutoAnnotation(Base):
+    __tablename__ = "auto_annotations"
+    # 按图片（及工具类型）查标注的复合索引，见 migrations/versions.py
+    __table_args__ = (Index("ix_auto_annotations_image_id_tool_type", "image_id", "tool_type"),)
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("images.id"))
+    tool_type = Column(String)
+    annotation_data = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    image = relationship("Image", back_populates="annotations")
+
+class ManualAnnotation(Base):
+    __tablename__ = "manual_annotations"
+    # 按图片（及工具类型）查标注的复合索引，见 migrations/versions.py
+    __table_args__ = (Index("ix_manual_annotations_image_id_tool_type", "image_id", "tool_type"),)
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("images.id"))
+    tool_type = Column(String)
+    annotation_data = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    image = relationship("Image", back_populates="manual_annotations")
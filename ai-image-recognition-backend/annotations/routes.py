@@ -0,0 +1,343 @@
+"""
+批量自动标注：一次请求提交多张图片（multipart 多文件或一个 zip 包），
+按批推理、每批的图片与标注在工作线程中以一个短事务写入，并以 NDJSON 逐张流式返回结果。
+与 /api/auto_annotate 一样登记图片指纹、复用相同内容已保存的推理结果，并在提交后保存原图。
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, File, Form, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ai_models import ai_service, is_fallback
+from database import SessionLocal
+from inference.batching import BATCH_MAX_SIZE
+from inference.executor import InferenceQueueFull, inference_executor
+from inference.imaging import decode_image, is_image_file
+from inference.render import RENDER_MODES, normalize_format, render_detections, render_store, to_data_url
+from inference.result_cache import result_cache
+from image_store.blob_store import blob_store
+from image_store.hashing import fingerprint
+from image_store.service import DEDUP_ENABLED, dedup_service
+from .models import AutoAnnotation
+from .store import insert_annotations, upsert_image_content, upsert_images
+
+# 每批推理的图片数，默认与检测微批大小一致
+BATCH_CHUNK_SIZE = int(os.getenv("AI_AUTO_ANNOTATE_CHUNK_SIZE", str(BATCH_MAX_SIZE)))
+# 单次批量请求最多包含的图片数
+BATCH_MAX_IMAGES = int(os.getenv("AI_AUTO_ANNOTATE_BATCH_MAX_IMAGES", "10000"))
+# 推理队列已满时的重试间隔（秒）：批量请求排队等待，而不是直接失败
+QUEUE_RETRY_SECONDS = 0.2
+
+router = APIRouter(prefix="/api/auto_annotate", tags=["annotations"])
+
+
+def _iter_archive(path: str) -> Iterator[Tuple[str, bytes]]:
+    """逐个读取 zip 包中的图片，返回 (包内路径, 图片字节)，不会一次性解压整个包"""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_image_file(info.filename):
+                yield info.filename, archive.read(info)
+
+
+def _count_archive_images(path: str) -> int:
+    with zipfile.ZipFile(path) as archive:
+        return sum(1 for info in archive.infolist() if not info.is_dir() and is_image_file(info.filename))
+
+
+def _ndjson(payload: Dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _BatchAnnotator:
+    """一次批量请求的处理状态：取图 → 查缓存 / 解码 → 登记指纹并复用已有结果 → 批量推理 → 渲染 → 写库"""
+
+    def __init__(self, sources: Iterator[Tuple[str, bytes]], tool: str, model_name: str,
+                 render: str, render_format: str, render_quality: Optional[int]):
+        self.sources = sources
+        self.tool = tool
+        self.model_name = model_name
+        self.render = render
+        self.render_format = render_format
+        self.render_quality = render_quality
+        self.version: Optional[str] = None
+        self.index = 0
+        self.totals = {
+            "images": 0, "annotations": 0, "errors": 0, "cache_hits": 0, "reused_results": 0, "committed_images": 0
+        }
+
+    def next_chunk(self) -> List[Dict[str, Any]]:
+        """在工作线程中读取下一批图片，查询结果缓存，解码未命中的图片并登记指纹"""
+        chunk = []
+        for filename, image_bytes in self.sources:
+            item = {"index": self.index, "filename": filename, "bytes": image_bytes, "cache_key": None}
+            self.index += 1
+            if self.version and result_cache.enabled:
+                item["cache_key"] = result_cache.make_key(
+                    image_bytes, self.tool, self.model_name, self.version, {"endpoint": "auto_annotate"}
+                )
+                cached = result_cache.get(item["cache_key"])
+                if cached is not None:
+                    item["annotations"], item["render_boxes"] = cached["annotations"], cached["render_boxes"]
+                    item["cached"] = True
+            if "annotations" not in item:
+                try:
+                    item["image"] = decode_image(image_bytes)
+                except ValueError as e:
+                    item["error"] = str(e)
+            chunk.append(item)
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                break
+        if DEDUP_ENABLED:
+            self.register_chunk([item for item in chunk if "error" not in item])
+        return chunk
+
+    def register_chunk(self, items: List[Dict[str, Any]]):
+        """
+        登记本批图片的指纹（一个短事务），内容已存在或与已有图片近重复时复用该原图已保存的推理结果。
+        原图记录先于图片与标注提交；图片与标注写入失败时只留下没有引用的原图记录，再次上传时直接复用。
+        """
+        if not items:
+            return
+        db = SessionLocal()
+        try:
+            for item in items:
+                dedup = item["dedup"] = dedup_service.register(db, fingerprint(item["bytes"]))
+                if "annotations" in item or not self.version:
+                    continue
+                found = dedup_service.find_result(db, dedup, self.tool, self.model_name, self.version)
+                if found is None:
+                    continue
+                result, near = found
+                item["annotations"], item["render_boxes"] = result["annotations"], result["render_boxes"]
+                item["reused"] = "near" if near else "exact"
+                # 近重复复用的结果（已换算到本图尺寸）也保存到本图名下，之后的相同内容直接命中
+                if near:
+                    dedup_service.save_result(db, dedup.blob_id, self.tool, self.model_name, self.version, result)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def infer(self, chunk: List[Dict[str, Any]]):
+        """对本批未命中缓存、也没有可复用结果的图片做一次批量推理；推理队列满时等待后重试"""
+        pending = [item for item in chunk if "image" in item and "annotations" not in item]
+        if not pending:
+            return
+        while True:
+            try:
+                results = await inference_executor.run(
+                    self.model_name, ai_service.annotate_batch,
+                    self.tool, [item["image"] for item in pending], self.model_name
+                )
+                break
+            except InferenceQueueFull:
+                await asyncio.sleep(QUEUE_RETRY_SECONDS)
+        for item, (annotations, render_boxes) in zip(pending, results):
+            item["annotations"], item["render_boxes"] = annotations, render_boxes
+            # 模型不可用或推理出错时返回的是模拟 / 空结果，不写入缓存，也不写入 image_blob_results
+            if self.version and not is_fallback(annotations):
+                result = {"annotations": annotations, "render_boxes": render_boxes}
+                if item["cache_key"]:
+                    result_cache.put(item["cache_key"], self.model_name, self.version, result)
+                if "dedup" in item:
+                    item["result"] = result
+
+    def save_chunk(self, items: List[Dict[str, Any]]) -> Dict[int, Tuple[int, str]]:
+        """
+        在工作线程中写入一批图片与标注并提交，返回 {序号: (图片 id, 实际使用的文件名)}。
+        每批一个短事务，不阻塞事件循环，也不会在整个批量请求期间占用 SQLite 的写锁。
+        登记了指纹的图片按内容写入（同名但内容不同的图片另存为新的文件名，见 upsert_image_content），
+        事务提交后再保存原图。
+        """
+        db = SessionLocal()
+        try:
+            stored = {}
+            if DEDUP_ENABLED:
+                for item in items:
+                    stored[item["index"]] = upsert_image_content(db, item["filename"], item["dedup"].content_hash)
+                    if "result" in item:
+                        dedup_service.save_result(
+                            db, item["dedup"].blob_id, self.tool, self.model_name, self.version, item["result"]
+                        )
+            else:
+                image_ids = upsert_images(db, [item["filename"] for item in items])
+                stored = {item["index"]: (image_ids[item["filename"]], item["filename"]) for item in items}
+            insert_annotations(db, AutoAnnotation, self.tool, (
+                (stored[item["index"]][0], annotation)
+                for item in items for annotation in item["annotations"]
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        # 原图已存在时 put 不重复写入
+        for item in items:
+            if "dedup" in item:
+                try:
+                    blob_store.put(item["dedup"].content_hash, item["bytes"])
+                except OSError as e:
+                    print(f"⚠️ 保存原图 {item['dedup'].content_hash} 失败: {e}")
+        return stored
+
+    def render_item(self, item: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """按 render 模式生成标注图（在工作线程中调用）"""
+        render_boxes = item.get("render_boxes")
+        if render_boxes is None or self.render == "none":
+            return {"annotated_image": None, "annotated_image_url": None}
+        if self.render == "inline":
+            source = item.get("image")
+            data, media_type = render_detections(
+                source if source is not None else item["bytes"], render_boxes, self.render_format, self.render_quality
+            )
+            return {"annotated_image": to_data_url(data, media_type), "annotated_image_url": None}
+        render_file = render_store.add(
+            uuid.uuid4().hex, item["bytes"], render_boxes, self.render_format, self.render_quality
+        )
+        return {"annotated_image": None, "annotated_image_url": f"/api/renders/{render_file}"}
+
+    async def stream(self):
+        """逐批处理并以 NDJSON 逐张返回结果；每批写库提交后才返回该批的结果行，最后一行为汇总"""
+        started = time.perf_counter()
+        pending_chunk = None
+        try:
+            self.version = await asyncio.to_thread(ai_service.model_version, self.model_name)
+            # 读取 / 解码下一批与推理当前批并行进行
+            pending_chunk = asyncio.ensure_future(asyncio.to_thread(self.next_chunk))
+            while True:
+                chunk = await pending_chunk
+                if not chunk:
+                    break
+                pending_chunk = asyncio.ensure_future(asyncio.to_thread(self.next_chunk))
+                await self.infer(chunk)
+
+                ok_items = [item for item in chunk if "annotations" in item]
+                # 本批所有标注一次批量写入并提交
+                stored = await asyncio.to_thread(self.save_chunk, ok_items) if ok_items else {}
+                self.totals["committed_images"] += len(ok_items)
+                for item in chunk:
+                    if "annotations" not in item:
+                        self.totals["errors"] += 1
+                        yield _ndjson({
+                            "type": "error", "index": item["index"], "filename": item["filename"],
+                            "detail": item.get("error", "推理失败")
+                        })
+                        continue
+                    image_id, stored_filename = stored[item["index"]]
+                    rendered = await asyncio.to_thread(self.render_item, item)
+                    self.totals["images"] += 1
+                    self.totals["annotations"] += len(item["annotations"])
+                    self.totals["cache_hits"] += int(item.get("cached", False))
+                    self.totals["reused_results"] += int("reused" in item)
+                    row = {
+                        "type": "result",
+                        "index": item["index"],
+                        "filename": item["filename"],
+                        "stored_filename": stored_filename,
+                        "image_id": image_id,
+                        "annotations": item["annotations"],
+                        "annotation_count": len(item["annotations"]),
+                        "cached": item.get("cached", False),
+                        **rendered
+                    }
+                    if "dedup" in item:
+                        row["dedup"] = {**item["dedup"].to_dict(), "reused_result": item.get("reused")}
+                    yield _ndjson(row)
+
+            committed, detail = True, None
+        except Exception as e:
+            print(f"批量自动标注失败: {e}")
+            committed, detail = False, str(e)
+        finally:
+            if pending_chunk is not None and not pending_chunk.done():
+                pending_chunk.cancel()
+
+        seconds = time.perf_counter() - started
+        yield _ndjson({
+            "type": "summary",
+            "committed": committed,
+            "detail": detail,
+            **self.totals,
+            "seconds": seconds,
+            "images_per_second": self.totals["images"] / seconds if seconds > 0 else 0.0,
+        })
+
+
+@router.post("/batch")
+async def auto_annotate_batch(
+    images: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    tool: str = Form(...),
+    model: Optional[str] = Form(None),
+    render: str = Form("none"),
+    render_format: Optional[str] = Form(None),
+    render_quality: Optional[int] = Form(None),
+):
+    """
+    批量自动标注：images 为多个图片文件，或 archive 为包含图片的 zip 包（二选一，也可同时提供）。
+    响应为 NDJSON 流：每张图片一行 {"type": "result" | "error", ...}，最后一行为 {"type": "summary", ...}。
+    每批图片与标注写库提交后才返回该批的结果行；汇总行的 committed 表示是否全部处理并提交，
+    中途出错时 committed_images 为已提交的图片数（之前各批的结果已保存）。render 默认 none（不渲染标注图）。
+    """
+    render = (render or "none").lower()
+    if render not in RENDER_MODES:
+        return JSONResponse(status_code=400, content={"detail": f"render 取值应为 {', '.join(RENDER_MODES)}"})
+    try:
+        render_format = normalize_format(render_format)
+        model_name = ai_service.resolve_tool_model(tool, model)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+    images = [upload for upload in (images or []) if upload.filename]
+    if not images and archive is None:
+        return JSONResponse(status_code=400, content={"detail": "请通过 images 或 archive 提交图片"})
+
+    # 上传文件在请求结束后会被关闭，这里先读出多文件的内容，并把 zip 包复制到自己的临时文件中
+    uploaded = [(upload.filename, await upload.read()) for upload in images]
+    archive_path = None
+    if archive is not None:
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp:
+            await asyncio.to_thread(shutil.copyfileobj, archive.file, tmp)
+            archive_path = tmp.name
+        try:
+            archive_count = await asyncio.to_thread(_count_archive_images, archive_path)
+        except zipfile.BadZipFile:
+            os.remove(archive_path)
+            return JSONResponse(status_code=400, content={"detail": "archive 不是有效的 zip 文件"})
+    else:
+        archive_count = 0
+
+    total = len(uploaded) + archive_count
+    if total > BATCH_MAX_IMAGES:
+        if archive_path:
+            os.remove(archive_path)
+        return JSONResponse(status_code=400, content={"detail": f"单次最多提交 {BATCH_MAX_IMAGES} 张图片，收到 {total} 张"})
+
+    def sources():
+        yield from uploaded
+        if archive_path:
+            yield from _iter_archive(archive_path)
+
+    annotator = _BatchAnnotator(sources(), tool, model_name, render, render_format, render_quality)
+
+    async def body():
+        try:
+            async for line in annotator.stream():
+                yield line
+        finally:
+            if archive_path and os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Total-Images": str(total)})
@@ -0,0 +1,152 @@
+"""
+标注写入的公共数据库操作，供单张 / 批量自动标注与预标注任务共用。
+写入走批量路径：图片按文件名 upsert，标注用一条 executemany 的 INSERT ... RETURNING 写入并批量取回 id，
+全部在调用方的事务中完成（这里只执行不提交）。
+"""
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import AutoAnnotation, Image, ManualAnnotation
+
+# 支持 INSERT ... ON CONFLICT DO UPDATE ... RETURNING 的方言（SQLite 需 3.35+）
+_UPSERT_INSERTS = {"postgresql": postgresql.insert}
+if sqlite3.sqlite_version_info >= (3, 35):
+    _UPSERT_INSERTS["sqlite"] = sqlite.insert
+# 单条 upsert 语句最多包含的图片数（受 SQLite 绑定参数个数限制）
+UPSERT_CHUNK_SIZE = 1000
+
+
+def upsert_images(db: Session, filenames: List[str]) -> Dict[str, int]:
+    """查找或创建图片记录（不提交），返回 文件名 -> 图片 id"""
+    filenames = list(dict.fromkeys(filenames))
+    if not filenames:
+        return {}
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        # 每批一条语句：冲突时做一次无实际变化的更新，使已存在的行也出现在 RETURNING 中
+        ids = {}
+        now = datetime.utcnow()
+        for start in range(0, len(filenames), UPSERT_CHUNK_SIZE):
+            chunk = filenames[start:start + UPSERT_CHUNK_SIZE]
+            stmt = dialect_insert(Image).values([{"filename": name, "uploaded_at": now} for name in chunk])
+            stmt = stmt.on_conflict_do_update(index_elements=[Image.filename], set_={"filename": stmt.excluded.filename})
+            ids.update({filename: image_id for image_id, filename in db.execute(stmt.returning(Image.id, Image.filename))})
+        return ids
+
+    existing = db.query(Image.id, Image.filename).filter(Image.filename.in_(filenames)).all()
+    ids = {filename: image_id for image_id, filename in existing}
+    created = [Image(filename=filename) for filename in filenames if filename not in ids]
+    if created:
+        db.add_all(created)
+        db.flush()
+        ids.update({image.filename: image.id for image in created})
+    return ids
+
+
+def upsert_image(db: Session, filename: str) -> int:
+    """查找或创建单张图片记录（不提交），返回图片 id"""
+    return upsert_images(db, [filename])[filename]
+
+
+def upsert_image_content(db: Session, filename: str, content_hash: str) -> Tuple[int, str]:
+    """
+    按文件名与内容哈希查找或创建图片记录（不提交），返回 (图片 id, 实际使用的文件名)。
+    同名但内容不同的图片另存为 "名称@哈希前 8 位.扩展名"，不会把标注追加到已有的另一张图片上；
+    还没有内容哈希的旧记录直接补上本次的哈希。
+    """
+    current = db.scalar(select(Image.content_hash).where(Image.filename == filename))
+    if current is not None and current != content_hash:
+        stem, ext = os.path.splitext(filename)
+        filename = f"{stem}@{content_hash[:8]}{ext}"
+    image_id = upsert_image(db, filename)
+    db.execute(
+        update(Image).where(Image.id == image_id, Image.content_hash.is_(None)).values(content_hash=content_hash)
+    )
+    return image_id, filename
+
+
+def insert_annotations(
+    db: Session, model: Type[Any], tool_type: str, rows: Iterable[Tuple[int, Dict[str, Any]]]
+) -> List[int]:
+    """
+    批量写入标注（不提交）。model 为 AutoAnnotation 或 ManualAnnotation，rows 为 (图片 id, 标注数据)，
+    返回与 rows 顺序一致的标注 id。不经过 ORM 工作单元，也不会把对象加入 session。
+    """
+    now = datetime.utcnow()
+    params = [
+        {"image_id": image_id, "tool_type": tool_type, "annotation_data": data, "created_at": now}
+        for image_id, data in rows
+    ]
+    if not params:
+        return []
+    table = model.__table__
+    dialect = db.get_bind().dialect
+    if dialect.name == "sqlite" and dialect.insert_returning:
+        # SQLite 持有写锁时按 VALUES 顺序递增分配 rowid，排序后即与 rows 顺序一致；
+        # 要求 SQLAlchemy 保证顺序会退化为逐行 INSERT
+        return sorted(db.execute(insert(table).returning(table.c.id), params).scalars())
+    if dialect.insert_returning:
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return list(db.execute(stmt, params).scalars())
+
+    objects = [model(**values) for values in params]
+    db.add_all(objects)
+    db.flush()
+    return [obj.id for obj in objects]
+
+
+def filename_prefix_clause(column, prefix: str, dialect: str):
+    """
+    文件名前缀过滤的范围谓词 prefix <= column < 前缀的后继，区分大小写，可以使用文件名索引。
+    startswith 编译为 LIKE：SQLite 的 LIKE 不区分 ASCII 大小写（前缀 Cat 会匹配 cat.jpg），也用不上索引。
+    PostgreSQL 按 C 排序规则（码点顺序）比较，与 SQLite 的 BINARY 一致。
+    """
+    if dialect == "postgresql":
+        column = column.collate("C")
+    # 后继：去掉末尾已是最大码点的字符后，把最后一个字符加一（跳过代理区，它们不能编码为 UTF-8）
+    stem = prefix.rstrip(chr(0x10FFFF))
+    if not stem:
+        return column >= prefix
+    successor = ord(stem[-1]) + 1
+    if 0xD800 <= successor <= 0xDFFF:
+        successor = 0xE000
+    return and_(column >= prefix, column < stem[:-1] + chr(successor))
+
+
+def list_images_page(
+    db: Session, after_id: Optional[int] = None, limit: Optional[int] = None, prefix: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    按 id 升序分页列出图片及其自动 / 手动标注数量，一条 SQL 完成：
+    标注数量为按 (image_id, tool_type) 索引计数的关联子查询，只对当前页的图片求值。
+    after_id 为上一页最后一张图片的 id（键集分页），limit 为空时返回全部，prefix 按文件名前缀过滤。
+    """
+    auto_count = (
+        select(func.count(AutoAnnotation.id)).where(AutoAnnotation.image_id == Image.id).scalar_subquery()
+    )
+    manual_count = (
+        select(func.count(ManualAnnotation.id)).where(ManualAnnotation.image_id == Image.id).scalar_subquery()
+    )
+    query = select(Image.id, Image.filename, Image.uploaded_at, auto_count, manual_count).order_by(Image.id)
+    if after_id is not None:
+        query = query.where(Image.id > after_id)
+    if prefix:
+        query = query.where(filename_prefix_clause(Image.filename, prefix, db.get_bind().dialect.name))
+    if limit is not None:
+        query = query.limit(limit)
+    return [
+        {
+            "id": image_id,
+            "filename": filename,
+            "uploaded_at": uploaded_at.isoformat() if uploaded_at else None,
+            "auto_annotation_count": auto,
+            "manual_annotation_count": manual
+        }
+        for image_id, filename, uploaded_at, auto, manual in db.execute(query)
+    ]
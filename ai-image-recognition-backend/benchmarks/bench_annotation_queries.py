@@ -0,0 +1,162 @@
+"""
+标注查询热点的索引基准：在临时 SQLite 库中生成 --rows 条自动标注（默认 100 万），
+分别在无索引（迁移前的结构）与执行 migrations 之后测量各查询的平均延迟。
+
+用法（在 ai-image-recognition-backend 目录下）:
+    python benchmarks/bench_annotation_queries.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base  # noqa: E402
+from annotations.models import AutoAnnotation, Image, ManualAnnotation  # noqa: E402
+from annotations.store import list_images_page  # noqa: E402
+from evaluation.models import EvaluationResultDB  # noqa: E402
+from visiofirm.models import VisioFirmAnnotation  # noqa: E402
+from migrations.runner import drop_index, run_migrations  # noqa: E402
+
+TOOLS = ["object_detection", "image_segmentation", "image_classification"]
+STATUSES = ["pending", "running", "completed", "failed"]
+CHUNK = 50000
+
+
+def populate(engine, rows):
+    """生成图片、标注、VisioFirm 标注与评估记录；每张图片约 10 条自动标注"""
+    images = max(1, rows // 10)
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    tables = [
+        (Image.__table__, images, lambda i: {"id": i + 1, "filename": f"img_{i:08d}.jpg", "uploaded_at": now}),
+        (AutoAnnotation.__table__, rows, lambda i: {
+            "image_id": rng.randint(1, images), "tool_type": rng.choice(TOOLS),
+            "annotation_data": {"value": {"x": 1.0, "y": 2.0}}, "created_at": now}),
+        (ManualAnnotation.__table__, rows // 10, lambda i: {
+            "image_id": rng.randint(1, images), "tool_type": rng.choice(TOOLS),
+            "annotation_data": {"value": {"x": 1.0, "y": 2.0}}, "created_at": now}),
+        (VisioFirmAnnotation.__table__, rows // 10, lambda i: {
+            "filename": f"img_{rng.randint(0, images - 1):08d}.jpg", "tool_type": rng.choice(TOOLS),
+            "annotation_data": [], "created_at": now}),
+        (EvaluationResultDB.__table__, rows // 20, lambda i: {
+            "evaluation_id": f"eval_{i}", "model_id": f"model_{rng.randint(0, 999)}",
+            "status": rng.choice(STATUSES), "created_at": now - timedelta(seconds=i), "config": {}}),
+    ]
+    for table, count, make in tables:
+        with engine.begin() as conn:
+            for start in range(0, count, CHUNK):
+                conn.execute(table.insert(), [make(i) for i in range(start, min(count, start + CHUNK))])
+        print(f"  {table.name}: {count} 行")
+    return images
+
+
+# migrations 新增的索引：删除它们即得到迁移前的结构
+MIGRATION_INDEXES = {
+    "auto_annotations": ["ix_auto_annotations_image_id_tool_type"],
+    "manual_annotations": ["ix_manual_annotations_image_id_tool_type"],
+    "visiofirm_annotations": ["ix_visiofirm_annotations_filename"],
+    "evaluation_results": ["ix_evaluation_results_model_id_created_at", "ix_evaluation_results_status_created_at"],
+}
+
+
+def drop_migration_indexes(engine):
+    with engine.begin() as conn:
+        for table, names in MIGRATION_INDEXES.items():
+            for name in names:
+                drop_index(conn, table, name)
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+
+
+def queries(images):
+    rng = random.Random(1)
+
+    def by_image(db):
+        image_id = rng.randint(1, images)
+        return db.query(AutoAnnotation).filter(AutoAnnotation.image_id == image_id).all()
+
+    def by_image_tool(db):
+        image_id = rng.randint(1, images)
+        return db.query(AutoAnnotation).filter(
+            AutoAnnotation.image_id == image_id, AutoAnnotation.tool_type == "object_detection"
+        ).all()
+
+    def by_image_name(db):
+        image = db.query(Image).filter(Image.filename == f"img_{rng.randint(0, images - 1):08d}.jpg").first()
+        return (db.query(AutoAnnotation).filter(AutoAnnotation.image_id == image.id).all(),
+                db.query(ManualAnnotation).filter(ManualAnnotation.image_id == image.id).all())
+
+    def images_page(db):
+        return list_images_page(db, after_id=rng.randint(0, max(0, images - 100)), limit=100)
+
+    def visiofirm_by_filename(db):
+        filename = f"img_{rng.randint(0, images - 1):08d}.jpg"
+        return db.query(VisioFirmAnnotation).filter(VisioFirmAnnotation.filename == filename).all()
+
+    def model_evaluations(db):
+        return db.query(EvaluationResultDB).filter(
+            EvaluationResultDB.model_id == f"model_{rng.randint(0, 999)}"
+        ).order_by(EvaluationResultDB.created_at.desc()).all()
+
+    def evaluations_by_status(db):
+        return db.execute(select(EvaluationResultDB.evaluation_id).where(
+            EvaluationResultDB.status == "running"
+        ).order_by(EvaluationResultDB.created_at.desc()).limit(50)).all()
+
+    return [
+        ("get_image_annotations (image_id)", by_image),
+        ("image_id + tool_type", by_image_tool),
+        ("get_annotations_by_image_name", by_image_name),
+        ("/api/images/list (limit=100)", images_page),
+        ("visiofirm by filename", visiofirm_by_filename),
+        ("get_model_evaluations", model_evaluations),
+        ("evaluations by status (limit=50)", evaluations_by_status),
+    ]
+
+
+def measure(engine, images, repeat):
+    results = {}
+    with Session(engine) as db:
+        for name, query in queries(images):
+            query(db)  # 预热
+            start = time.perf_counter()
+            for _ in range(repeat):
+                query(db)
+            results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000, help="自动标注行数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        drop_migration_indexes(engine)
+        print(f"生成数据（{args.rows} 条自动标注）...")
+        images = populate(engine, args.rows)
+
+        before = measure(engine, images, args.repeat)
+        start = time.perf_counter()
+        run_migrations(engine)
+        print(f"迁移耗时 {time.perf_counter() - start:.1f}s")
+        after = measure(engine, images, args.repeat)
+        engine.dispose()
+
+    print(f"\n{'查询':<36}{'迁移前 ms':>12}{'迁移后 ms':>12}{'加速':>10}")
+    for name in before:
+        print(f"{name:<36}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
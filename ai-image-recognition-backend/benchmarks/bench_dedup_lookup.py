@@ -0,0 +1,82 @@
+"""
+近重复查找基准：在临时 SQLite 库中登记 --blobs 个随机 dHash 的原图（默认 100 万），
+对比按 dHash 分段索引查找（DedupService.find_near）与逐条计算汉明距离的全表扫描的平均延迟。
+
+用法（在 ai-image-recognition-backend 目录下）:
+    python benchmarks/bench_dedup_lookup.py [--blobs 1000000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base  # noqa: E402
+from image_store.hashing import from_signed64, hamming, hash_bands, to_signed64  # noqa: E402
+from image_store.models import ImageBlob  # noqa: E402
+from image_store.service import DedupService  # noqa: E402
+
+CHUNK = 50000
+
+
+def populate(engine, blobs, rng):
+    hashes = []
+    with engine.begin() as conn:
+        for start in range(0, blobs, CHUNK):
+            rows = []
+            for i in range(start, min(blobs, start + CHUNK)):
+                value = rng.getrandbits(64)
+                hashes.append(value)
+                row = {"content_hash": f"{i:064x}", "size_bytes": 0, "width": 640, "height": 480,
+                       "dhash": to_signed64(value)}
+                row.update({f"band{b}": band for b, band in enumerate(hash_bands(value))})
+                rows.append(row)
+            conn.execute(ImageBlob.__table__.insert(), rows)
+    return hashes
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blobs", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine, tables=[ImageBlob.__table__])
+        print(f"登记 {args.blobs} 个原图指纹 ...")
+        hashes = populate(engine, args.blobs, rng)
+        service = DedupService(max_distance=3)
+        queries = [flip_bits(rng.choice(hashes), rng.randint(0, 3), rng) for _ in range(args.repeat)]
+
+        with Session(engine) as db:
+            started = time.perf_counter()
+            found = sum(bool(service.find_near(db, query)) for query in queries)
+            indexed = (time.perf_counter() - started) / len(queries)
+
+            scans = queries[:max(1, min(5, len(queries)))]
+            started = time.perf_counter()
+            for query in scans:
+                [row for row in db.execute(select(ImageBlob.id, ImageBlob.dhash))
+                 if hamming(query, from_signed64(row.dhash)) <= 3]
+            scan = (time.perf_counter() - started) / len(scans)
+
+    print(f"分段索引查找: {indexed * 1000:.2f} ms/次（{found}/{len(queries)} 次找到距离 <= 3 的原图）")
+    print(f"全表扫描:     {scan * 1000:.2f} ms/次")
+
+
+if __name__ == "__main__":
+    main()
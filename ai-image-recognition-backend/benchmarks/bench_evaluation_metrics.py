@@ -0,0 +1,112 @@
+"""
+评估指标基准：在 --sizes 个真实框（默认 1k / 10k / 100k，每个真实框约 1.1 个预测）上测量
+calculate_precision_recall、calculate_map 与 generate_pr_curve_data 的耗时。
+不超过 --legacy-max 个框时，同时运行逐对调用 calculate_iou 的原实现做对比并校验结果一致。
+
+用法（在 ai-image-recognition-backend 目录下）:
+    python benchmarks/bench_evaluation_metrics.py [--sizes 1000 10000 100000] [--classes 20] [--legacy-max 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluation.metrics import EvaluationMetrics  # noqa: E402
+
+CANVAS = 4000.0
+
+
+def make_boxes(n, classes, seed):
+    """在 CANVAS×CANVAS 的平面上随机放置真实框；80% 的真实框有一个抖动后的预测，另有 30% 的随机误检"""
+    rng = random.Random(seed)
+    ground_truths, predictions = [], []
+    for _ in range(n):
+        x, y = rng.uniform(0, CANVAS), rng.uniform(0, CANVAS)
+        w, h = rng.uniform(10, 120), rng.uniform(10, 120)
+        cls = f"class_{rng.randrange(classes)}"
+        ground_truths.append({'class': cls, 'box': [x, y, x + w, y + h]})
+        if rng.random() < 0.8:
+            dx, dy = rng.uniform(-0.2, 0.2) * w, rng.uniform(-0.2, 0.2) * h
+            predictions.append({'class': cls, 'box': [x + dx, y + dy, x + w + dx, y + h + dy], 'confidence': rng.random()})
+        if rng.random() < 0.3:
+            fx, fy = rng.uniform(0, CANVAS), rng.uniform(0, CANVAS)
+            predictions.append({'class': f"class_{rng.randrange(classes)}", 'box': [fx, fy, fx + w, fy + h],
+                                'confidence': rng.random()})
+    return predictions, ground_truths
+
+
+def legacy_metrics():
+    """原实现（逐对调用 calculate_iou 的嵌套循环），从 git 历史中的 evaluation/metrics.py 摘录匹配部分"""
+    iou = EvaluationMetrics.calculate_iou
+
+    def match(preds, gts, threshold):
+        matched, flags = set(), []
+        for pred in sorted(preds, key=lambda x: x.get('confidence', 0), reverse=True):
+            best_iou, best = 0, -1
+            for gt_idx, gt in enumerate(gts):
+                if gt_idx not in matched and gt['class'] == pred['class']:
+                    current = iou(pred['box'], gt['box'])
+                    if current > best_iou and current >= threshold:
+                        best_iou, best = current, gt_idx
+            if best != -1:
+                matched.add(best)
+            flags.append(best != -1)
+        return flags
+
+    def precision_recall(preds, gts, threshold=0.5):
+        tp = sum(match(preds, gts, threshold))
+        return tp / len(preds) if preds else 0.0, tp / len(gts) if gts else 0.0
+
+    def mean_ap(preds, gts):
+        classes = {p['class'] for p in preds} | {g['class'] for g in gts}
+        aps = []
+        for cls in classes:
+            cls_preds = [p for p in preds if p['class'] == cls]
+            cls_gts = [g for g in gts if g['class'] == cls]
+            for threshold in [0.5] + [i / 100 for i in range(55, 96, 5)]:
+                flags = match(cls_preds, cls_gts, threshold)
+                tp = [sum(flags[:k + 1]) for k in range(len(flags))]
+                aps.append(EvaluationMetrics.calculate_ap(
+                    [t / (k + 1) for k, t in enumerate(tp)], [t / len(cls_gts) if cls_gts else 0.0 for t in tp]
+                ))
+        return sum(aps) / len(aps)
+
+    return precision_recall, mean_ap
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--legacy-max", type=int, default=1000)
+    args = parser.parse_args()
+
+    legacy_pr, legacy_map = legacy_metrics()
+    print(f"{'框数':>8} {'预测数':>8} {'P/R':>10} {'mAP':>10} {'PR 曲线':>10} {'原 P/R':>10} {'原 mAP':>10}")
+    for n in args.sizes:
+        predictions, ground_truths = make_boxes(n, args.classes, n)
+        (precision, recall), t_pr = timed(EvaluationMetrics.calculate_precision_recall, predictions, ground_truths)
+        (map50, map50_95, _), t_map = timed(EvaluationMetrics.calculate_map, predictions, ground_truths)
+        _, t_curve = timed(EvaluationMetrics.generate_pr_curve_data, predictions, ground_truths)
+        legacy = ["-", "-"]
+        if n <= args.legacy_max:
+            (old_precision, old_recall), t_old_pr = timed(legacy_pr, predictions, ground_truths)
+            old_map, t_old_map = timed(legacy_map, predictions, ground_truths)
+            assert abs(old_precision - precision['overall']) < 1e-9 and abs(old_recall - recall['overall']) < 1e-9
+            assert abs(old_map - map50_95) < 1e-9
+            legacy = [f"{t_old_pr * 1000:.1f}ms", f"{t_old_map * 1000:.1f}ms"]
+        print(f"{n:>8} {len(predictions):>8} {t_pr * 1000:>8.1f}ms {t_map * 1000:>8.1f}ms {t_curve * 1000:>8.1f}ms "
+              f"{legacy[0]:>10} {legacy[1]:>10}")
+
+
+if __name__ == "__main__":
+    main()
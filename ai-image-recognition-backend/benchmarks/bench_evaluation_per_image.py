@@ -0,0 +1,70 @@
+"""
+按图片分组评估的基准：生成 --images 张图片（默认 5 万，每张 0~12 个真实框）的验证集，
+分别用 --workers 中的进程数运行 EvaluationMetrics.evaluate(per_image=True)，报告耗时并校验结果与单进程一致。
+
+用法（在 ai-image-recognition-backend 目录下）:
+    python benchmarks/bench_evaluation_per_image.py [--images 50000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluation import per_image  # noqa: E402
+from evaluation.metrics import EvaluationMetrics  # noqa: E402
+
+
+def make_dataset(images, classes, seed=0):
+    rng = random.Random(seed)
+    predictions, ground_truths = [], []
+    for index in range(images):
+        image_id = f"img_{index:06d}"
+        for _ in range(rng.randint(0, 12)):
+            x, y = rng.uniform(0, 600), rng.uniform(0, 600)
+            w, h = rng.uniform(10, 200), rng.uniform(10, 200)
+            cls = f"class_{rng.randrange(classes)}"
+            ground_truths.append({'image_id': image_id, 'class': cls, 'box': [x, y, x + w, y + h]})
+            if rng.random() < 0.85:
+                dx, dy = rng.uniform(-0.15, 0.15) * w, rng.uniform(-0.15, 0.15) * h
+                predictions.append({'image_id': image_id, 'class': cls, 'confidence': rng.random(),
+                                    'box': [x + dx, y + dy, x + w + dx, y + h + dy]})
+            if rng.random() < 0.4:
+                fx, fy = rng.uniform(0, 600), rng.uniform(0, 600)
+                predictions.append({'image_id': image_id, 'class': f"class_{rng.randrange(classes)}",
+                                    'confidence': rng.random() * 0.6, 'box': [fx, fy, fx + w, fy + h]})
+    return predictions, ground_truths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=50000)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    predictions, ground_truths = make_dataset(args.images, args.classes)
+    print(f"{args.images} 张图片，{len(predictions)} 个预测，{len(ground_truths)} 个真实框，CPU 核数 {os.cpu_count()}")
+    per_image.EVAL_PARALLEL_MIN_IMAGES = 0
+    baseline = None
+    for workers in args.workers:
+        if workers > 1:
+            # 预热：进程池的创建与子进程导入不计入耗时
+            EvaluationMetrics.evaluate(predictions[:1000], ground_truths[:1000], per_image=True, workers=workers)
+        started = time.perf_counter()
+        result = EvaluationMetrics.evaluate(predictions, ground_truths, per_image=True, workers=workers)
+        elapsed = time.perf_counter() - started
+        if baseline is None:
+            baseline = (result, elapsed)
+        else:
+            assert result['map50_95'] == baseline[0]['map50_95']
+            assert result['precision'] == baseline[0]['precision']
+        print(f"workers={workers:<3} {elapsed:8.2f}s  加速比 {baseline[1] / elapsed:5.2f}x  "
+              f"mAP50={result['map50']:.4f} mAP50-95={result['map50_95']:.4f}")
+    per_image.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+检测 / 分割后处理的微基准：对比逐框 .item()/.tolist() 的旧实现与 inference.postprocess 的批量 NumPy 实现。
+
+用法（在 ai-image-recognition-backend 目录下）:
+    python benchmarks/bench_postprocess.py [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference.postprocess import detection_dicts, from_yolo_boxes, segment_dicts  # noqa: E402
+
+WIDTH, HEIGHT = 1280, 720
+NAMES = {i: f"class_{i}" for i in range(80)}
+
+
+class FakeBoxes:
+    """模拟 ultralytics Boxes：整体张量属性，迭代时逐框返回 (1, 4) 的切片"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield FakeBoxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+def make_inputs(n, points_per_polygon=64):
+    generator = torch.Generator().manual_seed(n)
+    xy1 = torch.rand(n, 2, generator=generator) * torch.tensor([WIDTH / 2, HEIGHT / 2])
+    wh = torch.rand(n, 2, generator=generator) * torch.tensor([WIDTH / 2, HEIGHT / 2])
+    boxes = FakeBoxes(
+        torch.cat([xy1, xy1 + wh], dim=1),
+        torch.rand(n, generator=generator),
+        torch.randint(0, 80, (n,), generator=generator).float(),
+    )
+    polygons = [np.random.rand(points_per_polygon, 2).astype(np.float32) * [WIDTH, HEIGHT] for _ in range(n)]
+    return boxes, polygons
+
+
+def legacy_detections(boxes, names, width, height):
+    """旧实现：逐框调用 .tolist() / .item()"""
+    detections = []
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+        conf = box.conf[0].item()
+        cls = int(box.cls[0].item())
+        detections.append({
+            'bbox': [x1, y1, x2, y2],
+            'bbox_percent': [x1 / width, y1 / height, (x2 - x1) / width, (y2 - y1) / height],
+            'confidence': float(conf),
+            'class_id': int(cls),
+            'class_name': names[cls]
+        })
+    return detections
+
+
+def legacy_segments(polygons, boxes, names, width, height):
+    """旧实现：逐实例取类别与置信度，逐点换算百分比坐标"""
+    segments = []
+    for i in range(len(polygons)):
+        cls_id = int(boxes.cls[i].item())
+        conf = float(boxes.conf[i].item())
+        xy = np.asarray(polygons[i])
+        if xy.size < 6:
+            continue
+        points = [[float((x / width) * 100), float((y / height) * 100)] for x, y in xy]
+        segments.append({"class_name": names.get(cls_id, f"class_{cls_id}"), "confidence": conf, "points": points})
+    return segments
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'任务':<8}{'检测数':>8}{'旧实现(ms)':>14}{'批量(ms)':>12}{'加速':>8}")
+    for n in (10, 100, 1000):
+        boxes, polygons = make_inputs(n)
+
+        old = legacy_detections(boxes, NAMES, WIDTH, HEIGHT)
+        new = detection_dicts(from_yolo_boxes(boxes, NAMES), WIDTH, HEIGHT)
+        assert [d['bbox'] for d in old] == [d['bbox'] for d in new]
+        assert np.allclose([d['bbox_percent'] for d in old], [d['bbox_percent'] for d in new])
+        legacy_ms = timeit(lambda: legacy_detections(boxes, NAMES, WIDTH, HEIGHT), args.repeat)
+        batched_ms = timeit(lambda: detection_dicts(from_yolo_boxes(boxes, NAMES), WIDTH, HEIGHT), args.repeat)
+        print(f"{'检测':<8}{n:>8}{legacy_ms:>14.3f}{batched_ms:>12.3f}{legacy_ms / batched_ms:>7.1f}x")
+
+        old = legacy_segments(polygons, boxes, NAMES, WIDTH, HEIGHT)
+        new = segment_dicts(polygons, boxes.conf, boxes.cls, NAMES, WIDTH, HEIGHT)
+        assert np.allclose(old[-1]["points"], new[-1]["points"], rtol=1e-5)
+        legacy_ms = timeit(lambda: legacy_segments(polygons, boxes, NAMES, WIDTH, HEIGHT), args.repeat)
+        batched_ms = timeit(lambda: segment_dicts(polygons, boxes.conf, boxes.cls, NAMES, WIDTH, HEIGHT), args.repeat)
+        print(f"{'分割':<8}{n:>8}{legacy_ms:>14.3f}{batched_ms:>12.3f}{legacy_ms / batched_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,201 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 # 数据库配置 - 从环境变量读取
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./auto_annotate.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} # Needed for SQLite
-)
+# 异步引擎的连接地址，默认由 DATABASE_URL 换成对应的异步驱动（sqlite -> aiosqlite，postgresql -> asyncpg）
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# 连接池配置（PostgreSQL 等服务端数据库）
+DB_POOL_SIZE = int(os.getenv("AI_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("AI_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("AI_DB_POOL_TIMEOUT", "30"))
+# 连接最长复用时间（秒），避免被数据库或中间代理断开的空闲连接被取出使用
+DB_POOL_RECYCLE = int(os.getenv("AI_DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("AI_DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite 连接参数：WAL 模式下读写互不阻塞；写锁被占用时等待 busy_timeout 毫秒而不是立即报 "database is locked"
+SQLITE_JOURNAL_MODE = os.getenv("AI_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("AI_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("AI_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+class PoolMetrics:
+    """通过连接池事件统计连接的取出 / 归还次数、当前与峰值占用数及单次占用时长"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_hold_seconds = 0.0
+        self.max_hold_seconds = 0.0
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        with self._lock:
+            self.checkins += 1
+            self.in_use -= 1
+            self.total_hold_seconds += held
+            self.max_hold_seconds = max(self.max_hold_seconds, held)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        with self._lock:
+            data = {
+                "dialect": self.engine.dialect.name,
+                "pool_class": type(pool).__name__,
+                "pool_status": pool.status(),
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "avg_hold_ms": self.total_hold_seconds / self.checkins * 1000 if self.checkins else 0.0,
+                "max_hold_ms": self.max_hold_seconds * 1000,
+            }
+        # QueuePool 的容量信息；内存 SQLite 使用的 StaticPool 没有这些方法
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                data[name] = getattr(pool, name)()
+        if hasattr(pool, "size"):
+            data["max_overflow"] = pool._max_overflow
+            data["timeout"] = pool.timeout()
+        return data
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        if SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, **kwargs) -> Engine:
+    """
+    按数据库类型创建引擎：
+    - SQLite：每个连接建立时设置 WAL、synchronous 与 busy_timeout；内存库使用 StaticPool 共享同一连接
+    - 其他（PostgreSQL 等）：QueuePool，大小 / 溢出 / 超时 / 回收时间可通过环境变量调整，取出前 ping 检查连接
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        options = {
+            # SQLite 连接默认只能在创建它的线程中使用，请求与后台任务线程共用连接池时需要关闭检查
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            options["poolclass"] = StaticPool
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    options.update(kwargs)
+    db_engine = create_engine(url, **options)
+    if backend == "sqlite":
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
+
+def async_url(url: str = DATABASE_URL) -> str:
+    """把同步连接地址换成异步驱动的地址，例如 sqlite:///./a.db -> sqlite+aiosqlite:///./a.db"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"不支持异步访问的数据库类型: {backend}，请设置 ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_async_db_engine(url: str = None, **kwargs) -> AsyncEngine:
+    """异步引擎，连接池与 SQLite pragma 配置与 create_db_engine 相同"""
+    url = url or ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            options["poolclass"] = StaticPool
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    options.update(kwargs)
+    try:
+        db_engine = create_async_engine(url, **options)
+    except ImportError as e:
+        driver = make_url(url).get_driver_name()
+        raise RuntimeError(
+            f"异步数据库驱动 {driver} 未安装（{e}）：PostgreSQL 请执行 pip install -r requirements-postgres.txt，"
+            f"或用 ASYNC_DATABASE_URL 指定已安装的异步驱动"
+        ) from e
+    if backend == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL)
+pool_metrics = PoolMetrics(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎在首次使用时创建（服务启动时由 main.py 创建，异步驱动 aiosqlite / asyncpg 未安装时启动失败）
+_async_engine = None
+_async_metrics = None
+AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+_async_lock = threading.Lock()
+
 Base = declarative_base()
 
 # Dependency to get DB session
@@ -21,4 +204,26 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_metrics
+    with _async_lock:
+        if _async_engine is None:
+            _async_engine = create_async_db_engine()
+            _async_metrics = PoolMetrics(_async_engine.sync_engine)
+            AsyncSessionLocal.configure(bind=_async_engine)
+        return _async_engine
+
+
+def async_pool_metrics():
+    """异步引擎的连接池指标，尚未创建时返回 None"""
+    return _async_metrics.stats() if _async_metrics is not None else None
+
+
+# Dependency to get async DB session（查询不阻塞事件循环）
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1 @@
+# 标注数据集导出（YOLO / COCO）模块初始化文件
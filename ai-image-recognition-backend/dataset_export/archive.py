@@ -0,0 +1,103 @@
+"""
+导出结果的写入目标：流式 zip / tar.gz（边写边把已生成的字节交给 HTTP 响应，内存占用与数据集大小无关），
+或服务器上的目录（导出任务可直接把其中的 data.yaml 交给训练任务）。
+"""
+import io
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+
+class ChunkBuffer(io.RawIOBase):
+    """只追加、不可 seek 的输出流：写入的字节由 drain() 取走"""
+
+    def __init__(self, sink: Optional[BinaryIO] = None):
+        self._chunks = bytearray()
+        self._sink = sink
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        if self._sink is not None:
+            return self._sink.write(data)
+        self._chunks += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArchiveSink:
+    """zip / tar.gz 写入器；output 为 None 时写入 ChunkBuffer，由调用方 drain() 后流式发送"""
+
+    def __init__(self, archive: str, output: Optional[BinaryIO] = None):
+        if archive not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的压缩格式: {archive}（可选 {', '.join(ARCHIVE_FORMATS)}）")
+        self.archive = archive
+        self.buffer = ChunkBuffer(output)
+        if archive == "zip":
+            # 输出流不可 seek 时 zipfile 使用数据描述符记录大小与 CRC
+            self._zip = zipfile.ZipFile(self.buffer, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            self._tar = tarfile.open(fileobj=self.buffer, mode="w|gz")
+
+    def add_bytes(self, name: str, data: bytes):
+        if self.archive == "zip":
+            self._zip.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def add_file(self, name: str, path: str, compress: bool = False):
+        """按块读取磁盘文件写入压缩包；图片等已压缩的文件默认不再压缩"""
+        if self.archive == "zip":
+            self._zip.write(path, name, compress_type=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+        else:
+            self._tar.add(path, arcname=name, recursive=False)
+
+    def drain(self) -> bytes:
+        return self.buffer.drain()
+
+    def close(self):
+        if self.archive == "zip":
+            self._zip.close()
+        else:
+            self._tar.close()
+
+
+class DirectorySink:
+    """写入服务器上的目录"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name: str) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def add_bytes(self, name: str, data: bytes):
+        self._path(name).write_bytes(data)
+
+    def add_file(self, name: str, path: str, compress: bool = False):
+        target = self._path(name)
+        if os.path.abspath(path) != os.path.abspath(target):
+            shutil.copyfile(path, target)
+
+    def drain(self) -> bytes:
+        return b""
+
+    def close(self):
+        pass
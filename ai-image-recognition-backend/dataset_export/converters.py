@@ -0,0 +1,110 @@
+"""
+把数据库中不同来源的标注 JSON 统一为几何形状，再转换为 YOLO 标签行或 COCO 标注。
+支持的标注格式（坐标均为相对图片尺寸的百分比 0~100）：
+- Label Studio 风格：{"type": "rectanglelabels" | "polygonlabels", "value": {...}}（自动标注、导入数据）
+- 前端 / VisioFirm 风格：{"type": "bbox" | "obb" | "polygon", "label", "bbox": {...}, "points": [...]}
+- 分割结果：{"class_name", "confidence", "points": [[x, y], ...]}
+分类结果等没有几何信息的标注被忽略。
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# 自动标注的标签带置信度后缀，例如 "person (0.91)"
+_CONFIDENCE_SUFFIX = re.compile(r"\s*\(\d+(?:\.\d+)?\)$")
+
+
+class Shape(NamedTuple):
+    """一个标注形状：box 为 [x, y, w, h]，polygon 为 [[x, y], ...]，坐标为 0~1 的相对值"""
+    label: str
+    box: List[float]
+    polygon: Optional[List[List[float]]] = None
+
+
+def _clip(value: float) -> float:
+    return min(1.0, max(0.0, float(value)))
+
+
+def _label(annotation: Dict[str, Any], value: Dict[str, Any], key: str) -> Optional[str]:
+    names = value.get(key) or annotation.get(key)
+    label = (names[0] if names else None) or annotation.get("label") or annotation.get("category") \
+        or annotation.get("class_name")
+    return _CONFIDENCE_SUFFIX.sub("", str(label)) if label else None
+
+
+def _box_shape(label: str, x, y, w, h) -> Optional[Shape]:
+    x1, y1 = _clip(float(x) / 100), _clip(float(y) / 100)
+    x2, y2 = _clip((float(x) + float(w)) / 100), _clip((float(y) + float(h)) / 100)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return Shape(label, [x1, y1, x2 - x1, y2 - y1])
+
+
+def _polygon_shape(label: str, points) -> Optional[Shape]:
+    polygon = [[_clip(float(px) / 100), _clip(float(py) / 100)] for px, py in points]
+    if len(polygon) < 3:
+        return None
+    xs, ys = [p[0] for p in polygon], [p[1] for p in polygon]
+    return Shape(label, [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)], polygon)
+
+
+def to_shape(annotation: Dict[str, Any]) -> Optional[Shape]:
+    """把一条标注转换为 Shape；格式不支持、缺少标签或形状退化时返回 None"""
+    if not isinstance(annotation, dict):
+        return None
+    value = annotation.get("value") if isinstance(annotation.get("value"), dict) else {}
+    kind = annotation.get("type")
+    try:
+        if kind == "rectanglelabels" or (kind in ("bbox", "obb") and annotation.get("bbox")):
+            box = value if kind == "rectanglelabels" else annotation["bbox"]
+            label = _label(annotation, value, "rectanglelabels")
+            if label is None or any(box.get(k) is None for k in ("x", "y", "width", "height")):
+                return None
+            return _box_shape(label, box["x"], box["y"], box["width"], box["height"])
+        points = value.get("points") or annotation.get("points")
+        if points:
+            label = _label(annotation, value, "polygonlabels")
+            return _polygon_shape(label, points) if label else None
+        # 前端手动标注的矩形也可能直接带 x / y / width / height
+        if all(annotation.get(k) is not None for k in ("x", "y", "width", "height")):
+            label = _label(annotation, value, "rectanglelabels")
+            return _box_shape(label, annotation["x"], annotation["y"], annotation["width"], annotation["height"]) if label else None
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def yolo_line(shape: Shape, class_id: int, segment: bool = False) -> str:
+    """YOLO 标签行：检测为 cls cx cy w h，分割为 cls x1 y1 x2 y2 ...（归一化坐标）"""
+    if segment and shape.polygon:
+        values = [coord for point in shape.polygon for coord in point]
+    else:
+        x, y, w, h = shape.box
+        values = [x + w / 2, y + h / 2, w, h]
+    return " ".join([str(class_id)] + [f"{v:.6f}" for v in values])
+
+
+def coco_annotation(shape: Shape, annotation_id: int, image_id: int, category_id: int, width: int, height: int) -> Dict[str, Any]:
+    """COCO 标注：bbox 与 segmentation 为像素坐标"""
+    x, y, w, h = shape.box
+    bbox = [x * width, y * height, w * width, h * height]
+    if shape.polygon:
+        segmentation = [[coord * size for point in shape.polygon for coord, size in zip(point, (width, height))]]
+        area = _polygon_area(segmentation[0])
+    else:
+        segmentation = []
+        area = bbox[2] * bbox[3]
+    return {
+        "id": annotation_id,
+        "image_id": image_id,
+        "category_id": category_id,
+        "bbox": [round(v, 2) for v in bbox],
+        "area": round(area, 2),
+        "segmentation": [[round(v, 2) for v in segmentation[0]]] if segmentation else [],
+        "iscrowd": 0,
+    }
+
+
+def _polygon_area(flat: List[float]) -> float:
+    xs, ys = flat[0::2], flat[1::2]
+    n = len(xs)
+    return abs(sum(xs[i] * ys[(i + 1) % n] - xs[(i + 1) % n] * ys[i] for i in range(n))) / 2
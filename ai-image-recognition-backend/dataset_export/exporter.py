@@ -0,0 +1,339 @@
+"""
+数据集导出：用服务器端游标（yield_per）按文件名顺序流式读取各来源的标注，
+逐张图片转换为 YOLO 标签或 COCO 标注并写入 zip / tar / 目录；除用于检测重名的已导出文件名集合外，内存占用与数据集大小无关。
+"""
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from dataclasses import asdict, dataclass, field
+from itertools import groupby
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterator, List, Optional
+
+import yaml
+from PIL import Image as PILImage
+from sqlalchemy import literal, null, select
+from sqlalchemy.orm import Session
+
+from annotations.models import AutoAnnotation, Image, ManualAnnotation
+from annotations.store import filename_prefix_clause
+from image_store.blob_store import blob_store
+from visiofirm.models import VisioFirmAnnotation
+from .converters import coco_annotation, to_shape, yolo_line
+
+EXPORT_FORMATS = ("yolo", "coco")
+EXPORT_SOURCES = ("manual", "auto", "visiofirm")
+# 服务器端游标每次取回的行数
+EXPORT_YIELD_PER = int(os.getenv("AI_DATASET_EXPORT_YIELD_PER", "1000"))
+# images_dir 只能位于该目录之下（相对路径相对于它解析）；未设置时不接受 images_dir，原图只从图片存储读取
+DATASET_IMAGES_ROOT = os.getenv("AI_DATASET_IMAGES_ROOT", "")
+# COCO 的 JSON 分段在内存中超过该大小后写入临时文件
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+@dataclass
+class ExportConfig:
+    """导出配置"""
+    format: str = "yolo"  # yolo / coco
+    # 标注来源及优先级：同一张图片只取排在最前、且有标注的来源（默认人工标注优先于自动标注）
+    sources: List[str] = field(default_factory=lambda: ["manual", "auto"])
+    tool: Optional[str] = None  # 只导出该工具类型的标注（auto / manual 的 tool_type）
+    prefix: Optional[str] = None  # 文件名前缀过滤
+    classes: Optional[List[str]] = None  # 固定类别顺序，不在其中的标注被跳过；为空时按首次出现的顺序编号
+    # 服务器上的原图目录（按数据库中的文件名查找，须位于 AI_DATASET_IMAGES_ROOT 之下）；
+    # 图片存储中有原图（images.content_hash）时优先使用存储中的原图
+    images_dir: Optional[str] = None
+    include_images: bool = True  # 找得到原图时把原图一起打包
+    val_ratio: float = 0.1  # 按文件名哈希稳定划分验证集的比例
+    segment: bool = False  # YOLO 使用分割格式（多边形），没有多边形的标注仍按框导出
+
+    def validate(self):
+        if self.format not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {self.format}（可选 {', '.join(EXPORT_FORMATS)}）")
+        unknown = [s for s in self.sources if s not in EXPORT_SOURCES]
+        if not self.sources or unknown:
+            raise ValueError(f"sources 取值应为 {', '.join(EXPORT_SOURCES)} 的非空列表")
+        if not 0 <= self.val_ratio < 1:
+            raise ValueError("val_ratio 取值范围为 [0, 1)")
+        if self.images_dir:
+            self.images_dir = resolve_images_dir(self.images_dir)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class ExportStats:
+    """导出进度"""
+    images: int = 0
+    annotations: int = 0
+    skipped_annotations: int = 0  # 无法转换或类别不在 classes 中的标注
+    missing_images: int = 0  # 图片存储与 images_dir 中都找不到原图的图片（COCO 中跳过）
+    unreadable_images: int = 0  # 原图无法读取（损坏或不是图片）、在 COCO 中跳过的图片
+    renamed_images: int = 0  # 展平后与其他图片重名、加了哈希后缀的图片
+    splits: Dict[str, int] = field(default_factory=lambda: {"train": 0, "val": 0})
+
+
+def resolve_images_dir(images_dir: str) -> str:
+    """把 images_dir 解析为 AI_DATASET_IMAGES_ROOT 之下的真实路径，不在其下时抛出 ValueError"""
+    if not DATASET_IMAGES_ROOT:
+        raise ValueError("未设置 AI_DATASET_IMAGES_ROOT，不接受 images_dir（原图从图片存储读取）")
+    root = os.path.realpath(DATASET_IMAGES_ROOT)
+    path = os.path.realpath(os.path.join(root, images_dir))
+    if not _is_within(path, root):
+        raise ValueError("images_dir 必须位于 AI_DATASET_IMAGES_ROOT 之下")
+    return path
+
+
+def _is_within(path: str, root: str) -> bool:
+    return os.path.commonpath([path, root]) == root
+
+
+def split_of(filename: str, val_ratio: float) -> str:
+    """按文件名的 CRC32 稳定划分训练 / 验证集，重复导出时结果不变"""
+    return "val" if zlib.crc32(filename.encode("utf-8")) % 10000 < val_ratio * 10000 else "train"
+
+
+def archive_name(filename: str) -> str:
+    """
+    数据库中的文件名可能带子目录（例如预标注的相对路径），导出时展平为单层文件名：
+    YOLO 按路径中最后一个 images 目录推断标签路径，嵌套目录会使推断出错。
+    """
+    parts = [part for part in PurePosixPath(filename.replace("\\", "/")).parts if part not in ("/", "..", ".")]
+    return "__".join(parts) or "unnamed"
+
+
+def _ordered(column, dialect: str):
+    # 与 Python 字符串的比较顺序一致（按码点），多路归并依赖这一点
+    if dialect == "postgresql":
+        return column.collate("C")
+    return column
+
+
+def iter_image_annotations(db: Session, config: ExportConfig) -> Iterator[tuple]:
+    """
+    按文件名顺序逐张返回 (文件名, 原图内容哈希, 标注列表)。每个来源一条按文件名排序的流式查询，
+    多路归并后按文件名分组；VisioFirm 同一文件名的多次标注只取最后一次（没有内容哈希）。
+    """
+    dialect = db.get_bind().dialect.name
+    streams = []
+    for priority, source in enumerate(config.sources):
+        if source == "visiofirm":
+            model = VisioFirmAnnotation
+            query = select(model.filename, model.annotation_data, literal(priority), model.id, null()).order_by(
+                _ordered(model.filename, dialect), model.created_at, model.id
+            )
+            filename_column = model.filename
+        else:
+            model = AutoAnnotation if source == "auto" else ManualAnnotation
+            query = select(Image.filename, model.annotation_data, literal(priority), model.id, Image.content_hash).join(
+                Image, model.image_id == Image.id
+            ).order_by(_ordered(Image.filename, dialect), model.id)
+            filename_column = Image.filename
+        if config.tool:
+            query = query.where(model.tool_type == config.tool)
+        if config.prefix:
+            query = query.where(filename_prefix_clause(filename_column, config.prefix, dialect))
+        streams.append(db.execute(query.execution_options(yield_per=EXPORT_YIELD_PER)))
+
+    merged = heapq.merge(*streams, key=lambda row: (row[0], row[2]))
+    for filename, rows in groupby(merged, key=lambda row: row[0]):
+        rows = list(rows)
+        content_hash = next((row[4] for row in rows if row[4]), None)
+        priority = rows[0][2]
+        chosen = [row for row in rows if row[2] == priority]
+        if config.sources[priority] == "visiofirm":
+            # 每条记录是一次标注请求的完整结果（列表），只取最后一次
+            data = chosen[-1][1]
+            annotations = data if isinstance(data, list) else []
+        else:
+            annotations = [row[1] for row in chosen]
+        yield filename, content_hash, annotations
+
+
+class DatasetExporter:
+    """把标注写入 sink（ArchiveSink / DirectorySink），run() 逐步产出可发送的字节"""
+
+    def __init__(self, config: ExportConfig, stats: Optional[ExportStats] = None):
+        config.validate()
+        self.config = config
+        self.stats = stats or ExportStats()
+        self.class_ids: Dict[str, int] = {name: i for i, name in enumerate(config.classes or [])}
+        self.cancelled = False
+        # 已使用的导出文件名（YOLO 为主干名，标签文件只按主干名区分）
+        self._used_names = set()
+        # YOLO 导出是否写入了 data.yaml（只有打包了原图时才写，否则其中的 images/ 目录不存在）
+        self.wrote_data_yaml = False
+
+    def _class_id(self, label: str) -> Optional[int]:
+        class_id = self.class_ids.get(label)
+        if class_id is None and not self.config.classes:
+            class_id = self.class_ids[label] = len(self.class_ids)
+        return class_id
+
+    def _export_name(self, filename: str) -> str:
+        """
+        图片在导出包中的文件名。展平可能重名（a/b.jpg 与 a__b.jpg；YOLO 中 x.jpg 与 x.png 的标签同为 x.txt），
+        重名时在主干名后加上原文件名的 SHA-1 前 8 位，按文件名顺序导出时先出现的图片保留原名。
+        """
+        name = PurePosixPath(archive_name(filename))
+        key = (lambda path: path.stem) if self.config.format == "yolo" else (lambda path: path.name)
+        candidate = name
+        if key(candidate) in self._used_names:
+            digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:8]
+            candidate = name.with_name(f"{name.stem}_{digest}{name.suffix}")
+            index = 1
+            while key(candidate) in self._used_names:
+                candidate = name.with_name(f"{name.stem}_{digest}_{index}{name.suffix}")
+                index += 1
+            self.stats.renamed_images += 1
+        self._used_names.add(key(candidate))
+        return str(candidate)
+
+    def _image_path(self, filename: str, content_hash: Optional[str]) -> Optional[str]:
+        """原图路径：优先取图片存储中的原图，其次在 images_dir 中按文件名查找；解析后不在 images_dir 之下的路径视为找不到"""
+        if content_hash:
+            path = blob_store.get_path(content_hash)
+            if path:
+                return path
+        if not self.config.images_dir:
+            return None
+        path = os.path.realpath(os.path.join(self.config.images_dir, filename))
+        return path if _is_within(path, self.config.images_dir) and os.path.isfile(path) else None
+
+    def run(self, db: Session, sink, data_root: Optional[str] = None) -> Iterator[bytes]:
+        """执行导出；data_root 为导出目录的绝对路径时写入 data.yaml 的 path 字段"""
+        if self.config.format == "coco":
+            yield from self._run_coco(db, sink)
+        else:
+            yield from self._run_yolo(db, sink, data_root)
+
+    def _shapes(self, annotations: List[Any]):
+        for annotation in annotations:
+            shape = to_shape(annotation)
+            class_id = self._class_id(shape.label) if shape is not None else None
+            if class_id is None:
+                self.stats.skipped_annotations += 1
+                continue
+            yield shape, class_id
+
+    def _run_yolo(self, db: Session, sink, data_root: Optional[str]) -> Iterator[bytes]:
+        # 实际打包了原图的划分
+        image_splits = set()
+        for filename, content_hash, annotations in iter_image_annotations(db, self.config):
+            if self.cancelled:
+                break
+            split = split_of(filename, self.config.val_ratio)
+            name = self._export_name(filename)
+            lines = [yolo_line(shape, class_id, self.config.segment) for shape, class_id in self._shapes(annotations)]
+            sink.add_bytes(f"labels/{split}/{Path(name).with_suffix('.txt')}", "".join(line + "\n" for line in lines).encode("utf-8"))
+            if self.config.include_images:
+                image_path = self._image_path(filename, content_hash)
+                if image_path:
+                    sink.add_file(f"images/{split}/{name}", image_path)
+                    image_splits.add(split)
+                else:
+                    self.stats.missing_images += 1
+            self.stats.images += 1
+            self.stats.annotations += len(lines)
+            self.stats.splits[split] += 1
+            yield sink.drain()
+
+        names = {class_id: name for name, class_id in self.class_ids.items()}
+        # 只导出标签（include_images=false 或原图都找不到）时不写 data.yaml
+        if image_splits:
+            data = {}
+            if data_root:
+                data["path"] = data_root
+            # 某个划分没有原图时用另一个划分代替，保证 data.yaml 可直接用于训练
+            data["train"] = "images/train" if "train" in image_splits else "images/val"
+            data["val"] = "images/val" if "val" in image_splits else "images/train"
+            data["nc"] = len(names)
+            data["names"] = names
+            sink.add_bytes("data.yaml", yaml.safe_dump(data, allow_unicode=True, sort_keys=False).encode("utf-8"))
+            self.wrote_data_yaml = True
+        sink.add_bytes("classes.txt", "".join(names[i] + "\n" for i in sorted(names)).encode("utf-8"))
+        sink.close()
+        yield sink.drain()
+
+    def _run_coco(self, db: Session, sink) -> Iterator[bytes]:
+        # 每个划分的 images / annotations 数组先分别写入临时文件，最后拼成完整的 JSON
+        parts = {
+            split: {
+                "images": tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES, mode="w+"),
+                "annotations": tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES, mode="w+"),
+                "image_id": 0,
+                "annotation_id": 0,
+            }
+            for split in ("train", "val")
+        }
+        try:
+            for filename, content_hash, annotations in iter_image_annotations(db, self.config):
+                if self.cancelled:
+                    break
+                image_path = self._image_path(filename, content_hash)
+                if image_path is None:
+                    self.stats.missing_images += 1
+                    continue
+                try:
+                    with PILImage.open(image_path) as img:
+                        width, height = img.size
+                except OSError as e:
+                    # UnidentifiedImageError 是 OSError 的子类；流式响应已经开始，不能因单张图片中断整个导出
+                    print(f"⚠️ 导出时无法读取原图 {filename}: {e}")
+                    self.stats.unreadable_images += 1
+                    continue
+                split = split_of(filename, self.config.val_ratio)
+                part = parts[split]
+                part["image_id"] += 1
+                name = self._export_name(filename)
+                self._append(part["images"], {"id": part["image_id"], "file_name": name, "width": width, "height": height})
+                for shape, class_id in self._shapes(annotations):
+                    part["annotation_id"] += 1
+                    self._append(part["annotations"], coco_annotation(
+                        shape, part["annotation_id"], part["image_id"], class_id + 1, width, height
+                    ))
+                    self.stats.annotations += 1
+                if self.config.include_images:
+                    sink.add_file(f"images/{split}/{name}", image_path)
+                self.stats.images += 1
+                self.stats.splits[split] += 1
+                yield sink.drain()
+
+            categories = [{"id": class_id + 1, "name": name, "supercategory": ""} for name, class_id in self.class_ids.items()]
+            for split, part in parts.items():
+                if not part["image_id"]:
+                    continue
+                with tempfile.NamedTemporaryFile("w+", suffix=".json", delete=False) as out:
+                    out.write('{"images": [')
+                    self._copy(part["images"], out)
+                    out.write('], "annotations": [')
+                    self._copy(part["annotations"], out)
+                    out.write('], "categories": ' + json.dumps(categories, ensure_ascii=False) + "}")
+                    json_path = out.name
+                try:
+                    sink.add_file(f"annotations/instances_{split}.json", json_path, compress=True)
+                finally:
+                    os.remove(json_path)
+                yield sink.drain()
+            sink.close()
+            yield sink.drain()
+        finally:
+            for part in parts.values():
+                part["images"].close()
+                part["annotations"].close()
+
+    @staticmethod
+    def _append(spool, item: Dict[str, Any]):
+        if spool.tell():
+            spool.write(",")
+        spool.write(json.dumps(item, ensure_ascii=False))
+
+    @staticmethod
+    def _copy(spool, out):
+        spool.seek(0)
+        shutil.copyfileobj(spool, out)
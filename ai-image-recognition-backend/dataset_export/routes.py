@@ -0,0 +1,108 @@
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
+from database import SessionLocal
+from .archive import ARCHIVE_FORMATS, ArchiveSink
+from .exporter import DatasetExporter, ExportConfig
+from .service import archive_filename, export_service
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+
+class ExportRequest(BaseModel):
+    """数据集导出请求模型"""
+    format: str = "yolo"
+    sources: List[str] = ["manual", "auto"]
+    tool: Optional[str] = None
+    prefix: Optional[str] = None
+    classes: Optional[List[str]] = None
+    images_dir: Optional[str] = None
+    include_images: bool = True
+    val_ratio: float = 0.1
+    segment: bool = False
+
+
+class ExportJobRequest(ExportRequest):
+    """导出任务请求模型：output 为 zip / tar / dir"""
+    output: str = "zip"
+
+
+def _config(request: ExportRequest) -> ExportConfig:
+    return ExportConfig(**request.dict(exclude={"output"}))
+
+
+@router.post("/stream")
+def stream_export(request: ExportRequest, archive: str = "zip"):
+    """
+    直接以流式 zip / tar.gz 响应导出数据集：边查询边转换边发送，服务器不生成临时压缩包。
+    YOLO 包含 images/、labels/、data.yaml 与 classes.txt（没有打包原图时只有 labels/ 与 classes.txt）；COCO 包含 images/ 与 annotations/instances_{split}.json。
+    """
+    if archive not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"archive 取值应为 {', '.join(ARCHIVE_FORMATS)}")
+    config = _config(request)
+    try:
+        exporter = DatasetExporter(config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        # 同步生成器由 Starlette 在线程池中迭代，不阻塞事件循环
+        db = SessionLocal()
+        try:
+            for chunk in exporter.run(db, ArchiveSink(archive)):
+                if chunk:
+                    yield chunk
+        finally:
+            db.close()
+
+    filename = archive_filename(config, archive)
+    media_type = "application/zip" if archive == "zip" else "application/gzip"
+    return StreamingResponse(body(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.post("/jobs", response_model=dict)
+def create_export_job(request: ExportJobRequest):
+    """创建导出任务，在服务器上生成压缩包或目录（YOLO 的 dir 模式打包了原图时返回可用于训练的 data.yaml 路径）"""
+    try:
+        job_id = export_service.create_job(_config(request), request.output)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id, "message": "导出任务已启动"}
+
+
+@router.get("/jobs")
+def list_export_jobs():
+    """获取所有导出任务"""
+    return [job.to_dict() for job in export_service.get_all_jobs()]
+
+
+@router.get("/jobs/{job_id}")
+def get_export_job(job_id: str):
+    """获取导出任务进度"""
+    job = export_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_export_job(job_id: str):
+    """取消导出任务"""
+    if export_service.cancel_job(job_id):
+        return {"message": "导出任务正在取消"}
+    raise HTTPException(status_code=400, detail="无法取消导出任务")
+
+
+@router.get("/jobs/{job_id}/download")
+def download_export(job_id: str):
+    """下载导出任务生成的压缩包"""
+    job = export_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    if job.status.value != "completed" or job.output == "dir" or not job.output_path or not os.path.exists(job.output_path):
+        raise HTTPException(status_code=400, detail="导出任务尚未完成或没有可下载的压缩包")
+    return FileResponse(job.output_path, filename=os.path.basename(job.output_path))
@@ -0,0 +1,133 @@
+"""
+导出任务：在后台线程中把数据集导出为服务器上的 zip / tar.gz 文件或目录。
+YOLO 导出为目录且打包了原图时返回 data.yaml 路径，可直接作为训练任务的 data_path。
+"""
+import os
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from database import SessionLocal
+from .archive import ARCHIVE_FORMATS, ArchiveSink, DirectorySink
+from .exporter import DatasetExporter, ExportConfig, ExportStats
+
+# 导出任务的输出目录
+DATASET_EXPORT_DIR = os.getenv("AI_DATASET_EXPORT_DIR", "dataset_exports")
+EXPORT_OUTPUTS = ARCHIVE_FORMATS + ("dir",)
+
+
+class ExportStatus(Enum):
+    """导出任务状态"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class ExportJob:
+    """导出任务"""
+    job_id: str
+    config: ExportConfig
+    output: str = "zip"  # zip / tar / dir
+    status: ExportStatus = ExportStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    stats: ExportStats = field(default_factory=ExportStats)
+    output_path: Optional[str] = None
+    data_yaml: Optional[str] = None  # 只导出标签时为空
+    error_message: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "config": self.config.to_dict(),
+            "output": self.output,
+            "status": self.status.value,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "stats": asdict(self.stats),
+            "output_path": self.output_path,
+            "data_yaml": self.data_yaml,
+            "error_message": self.error_message,
+        }
+
+
+def archive_filename(config: ExportConfig, archive: str, stem: str = "dataset") -> str:
+    return f"{stem}_{config.format}.{'zip' if archive == 'zip' else 'tar.gz'}"
+
+
+class ExportService:
+    """导出任务管理"""
+
+    def __init__(self):
+        self.jobs: Dict[str, ExportJob] = {}
+        self._exporters: Dict[str, DatasetExporter] = {}
+
+    def create_job(self, config: ExportConfig, output: str = "zip") -> str:
+        """创建并启动导出任务；配置不合法时抛出 ValueError"""
+        if output not in EXPORT_OUTPUTS:
+            raise ValueError(f"output 取值应为 {', '.join(EXPORT_OUTPUTS)}")
+        exporter = DatasetExporter(config)
+        job_id = f"Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        job = ExportJob(job_id=job_id, config=config, output=output, stats=exporter.stats)
+        self.jobs[job_id] = job
+        self._exporters[job_id] = exporter
+        threading.Thread(target=self._run_job, args=(job, exporter), daemon=True).start()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[ExportJob]:
+        return self.jobs.get(job_id)
+
+    def get_all_jobs(self) -> List[ExportJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel_job(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        exporter = self._exporters.get(job_id)
+        if job is None or exporter is None or job.status not in (ExportStatus.PENDING, ExportStatus.RUNNING):
+            return False
+        exporter.cancelled = True
+        return True
+
+    def _run_job(self, job: ExportJob, exporter: DatasetExporter):
+        job.status = ExportStatus.RUNNING
+        job.started_at = datetime.now()
+        output_dir = Path(DATASET_EXPORT_DIR).resolve()
+        db = SessionLocal()
+        try:
+            if job.output == "dir":
+                root = output_dir / job.job_id
+                job.output_path = str(root)
+                for _ in exporter.run(db, DirectorySink(str(root)), data_root=str(root)):
+                    pass
+                if exporter.wrote_data_yaml:
+                    job.data_yaml = str(root / "data.yaml")
+            else:
+                output_dir.mkdir(parents=True, exist_ok=True)
+                path = output_dir / archive_filename(job.config, job.output, job.job_id)
+                job.output_path = str(path)
+                with open(path, "wb") as f:
+                    for _ in exporter.run(db, ArchiveSink(job.output, f)):
+                        pass
+            job.status = ExportStatus.CANCELLED if exporter.cancelled else ExportStatus.COMPLETED
+            print(f"✅ 导出任务 {job.job_id} 结束: {job.status.value}，{job.stats.images} 张图片，{job.stats.annotations} 个标注")
+        except Exception as e:
+            job.status = ExportStatus.FAILED
+            job.error_message = str(e)
+            print(f"❌ 导出任务 {job.job_id} 失败: {e}")
+        finally:
+            db.close()
+            job.completed_at = datetime.now()
+            self._exporters.pop(job.job_id, None)
+
+
+# 全局导出服务实例
+export_service = ExportService()
@@ -0,0 +1,198 @@
+"""
+增量评估累加器：按批接收逐张图片的预测与真实标注，每批到达时即完成图片内匹配（per_image.match_shard），
+之后只保留每个预测的置信度、类别与各 IoU 阈值下的 TP 标记（按位压缩），以及每个类别的真实框数。
+框坐标与解析出的字典在该批匹配完成后即释放，常驻内存只与预测数成正比（10 个阈值时每个预测 14 字节）。
+"""
+import json
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .matching import ClassMatches
+from .metrics import DEFAULT_IOU_THRESHOLDS, EvaluationMetrics
+from .per_image import match_shard
+
+
+class _GrowableArray:
+    """容量按倍数增长的数组，追加的均摊开销为 O(1)；二维时第 0 维为行"""
+
+    def __init__(self, dtype, width: Optional[int] = None, capacity: int = 1024):
+        shape = (capacity,) if width is None else (capacity, width)
+        self._data = np.empty(shape, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: np.ndarray):
+        n = len(values)
+        if self.size + n > len(self._data):
+            capacity = max(self.size + n, 2 * len(self._data))
+            grown = np.empty((capacity,) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:self.size + n] = values
+        self.size += n
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+
+class _Batch:
+    """一批图片解析后的扁平列表；全部行解析成功后才转换为数组并登记类别"""
+
+    def __init__(self):
+        self.pred_boxes: List[List[float]] = []
+        self.pred_classes: List[str] = []
+        self.pred_confidence: List[float] = []
+        self.pred_counts: List[int] = []
+        self.gt_boxes: List[List[float]] = []
+        self.gt_classes: List[str] = []
+        self.gt_counts: List[int] = []
+
+    def add_image(self, image: Dict):
+        if not isinstance(image, dict):
+            raise ValueError("每行应为一个 JSON 对象")
+        predictions = image.get("predictions") or []
+        ground_truths = image.get("ground_truths") or []
+        for pred in predictions:
+            self.pred_boxes.append(_box(pred))
+            self.pred_classes.append(str(pred["class_name"]))
+            self.pred_confidence.append(float(pred.get("confidence", 0)))
+        for gt in ground_truths:
+            self.gt_boxes.append(_box(gt))
+            self.gt_classes.append(str(gt["class_name"]))
+        self.pred_counts.append(len(predictions))
+        self.gt_counts.append(len(ground_truths))
+
+
+def _box(item: Dict) -> List[float]:
+    box = item["box"]
+    if len(box) != 4:
+        raise ValueError("box 应为 [x1, y1, x2, y2]")
+    return [float(value) for value in box]
+
+
+class EvaluationAccumulator:
+    """
+    评估会话与服务器端模型评估的累加状态。每张图片的预测只与同一张图片的同类真实框匹配（COCO 方式），
+    finalize 时得到与 EvaluationMetrics.evaluate(per_image=True) 相同的指标。
+    """
+
+    def __init__(self, iou_threshold: float = 0.5, iou_thresholds: Optional[Sequence[float]] = None):
+        self.iou_thresholds = list(DEFAULT_IOU_THRESHOLDS if iou_thresholds is None else iou_thresholds)
+        if not self.iou_thresholds:
+            raise ValueError("iou_thresholds 不能为空")
+        if not all(0 <= iou <= 1 for iou in [iou_threshold] + self.iou_thresholds):
+            raise ValueError("IoU 阈值应在 0 到 1 之间")
+        # 第 0 个阈值用于精确率 / 召回率与 PR 曲线，与 evaluate 相同
+        self.thresholds = list(dict.fromkeys([iou_threshold] + self.iou_thresholds))
+        self.class_ids: Dict[str, int] = {}
+        self.images = 0
+        self.n_ground_truths = 0
+        self._confidence = _GrowableArray(np.float64)
+        self._classes = _GrowableArray(np.int32)
+        # 每个预测各阈值的 TP 标记按位压缩：[P, ceil(T / 8)] 的 uint8
+        self._tp = _GrowableArray(np.uint8, width=(len(self.thresholds) + 7) // 8)
+        self._gt_counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def n_predictions(self) -> int:
+        return self._confidence.size
+
+    @property
+    def nbytes(self) -> int:
+        return self._confidence.nbytes + self._classes.nbytes + self._tp.nbytes + self._gt_counts.nbytes
+
+    def add_images(self, images: Iterable[Dict]) -> int:
+        """
+        追加一批图片，返回图片数。每项为一张图片的
+        {"predictions": [{"class_name", "box", "confidence"}], "ground_truths": [{"class_name", "box"}]}。
+        """
+        batch = _Batch()
+        for image in images:
+            batch.add_image(image)
+        return self._add_batch(batch)
+
+    def add_lines(self, lines: Sequence[bytes], first_line: int = 1) -> int:
+        """
+        追加一批 NDJSON 行（每行一张图片，格式同 add_images，空行忽略），返回图片数。
+        任一行不合法时抛出带行号的 ValueError，整批都不计入。
+        """
+        batch = _Batch()
+        for number, line in enumerate(lines, start=first_line):
+            if not line.strip():
+                continue
+            try:
+                batch.add_image(json.loads(line))
+            except (KeyError, TypeError, ValueError) as e:
+                detail = f"缺少字段 {e}" if isinstance(e, KeyError) else str(e)
+                raise ValueError(f"第 {number} 行: {detail}")
+        return self._add_batch(batch)
+
+    def _class_array(self, names: Sequence[str]) -> np.ndarray:
+        for name in names:
+            if name not in self.class_ids:
+                self.class_ids[name] = len(self.class_ids)
+        return np.asarray([self.class_ids[name] for name in names], dtype=np.int64)
+
+    def _add_batch(self, batch: _Batch) -> int:
+        return self.add_arrays(
+            batch.pred_boxes, batch.pred_classes, batch.pred_confidence, batch.pred_counts,
+            batch.gt_boxes, batch.gt_classes, batch.gt_counts,
+        )
+
+    def add_arrays(
+        self, pred_boxes, pred_classes: Sequence[str], pred_confidence, pred_counts: Sequence[int],
+        gt_boxes, gt_classes: Sequence[str], gt_counts: Sequence[int],
+    ) -> int:
+        """
+        追加一批已是数组形式的图片（服务器端推理直接调用，不经过字典），返回图片数。
+        框为像素 xyxy，按图片顺序排列；pred_counts / gt_counts 为每张图片的预测 / 真实框数。
+        """
+        n_images = len(pred_counts)
+        if n_images == 0:
+            return 0
+        pred_classes = self._class_array(pred_classes)
+        gt_classes = self._class_array(gt_classes)
+        confidence = np.asarray(pred_confidence, dtype=np.float64).reshape(-1)
+        tp = match_shard(
+            np.asarray(pred_boxes, dtype=np.float64).reshape(-1, 4), pred_classes, confidence,
+            np.concatenate([[0], np.cumsum(pred_counts)]).astype(np.int64),
+            np.asarray(gt_boxes, dtype=np.float64).reshape(-1, 4), gt_classes,
+            np.concatenate([[0], np.cumsum(gt_counts)]).astype(np.int64),
+            self.thresholds,
+        )
+        self._confidence.extend(confidence)
+        self._classes.extend(pred_classes)
+        self._tp.extend(np.packbits(tp.T, axis=1))
+
+        counts = np.bincount(gt_classes, minlength=len(self.class_ids))
+        if len(self._gt_counts) < len(counts):
+            self._gt_counts = np.concatenate([self._gt_counts, np.zeros(len(counts) - len(self._gt_counts), np.int64)])
+        self._gt_counts[:len(counts)] += counts
+        self.images += n_images
+        self.n_ground_truths += len(gt_classes)
+        return n_images
+
+    def matches(self) -> Dict[str, ClassMatches]:
+        """逐类别的匹配结果，格式同 matching.match_detections；预测下标为追加顺序"""
+        confidence = self._confidence.values
+        classes = self._classes.values
+        tp = np.unpackbits(self._tp.values, axis=1, count=len(self.thresholds)).T.astype(bool)
+        results = {}
+        for cls, class_id in self.class_ids.items():
+            index = np.nonzero(classes == class_id)[0]
+            n_gt = int(self._gt_counts[class_id]) if class_id < len(self._gt_counts) else 0
+            rank = np.argsort(-confidence[index], kind="stable")
+            order = index[rank]
+            results[cls] = ClassMatches(confidence=confidence[order], order=order, tp=tp[:, order], n_gt=n_gt)
+        return results
+
+    def metrics(self) -> Dict:
+        """计算最终指标，返回格式同 EvaluationMetrics.evaluate"""
+        return EvaluationMetrics.summarize(
+            self.matches(), self.thresholds, self.iou_thresholds, self.n_predictions, self.n_ground_truths
+        )
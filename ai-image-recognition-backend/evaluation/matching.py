@@ -0,0 +1,194 @@
+"""
+检测结果与真实标注的 NumPy 匹配引擎，供 EvaluationMetrics 的各项指标共用。
+- 每个类别的 IoU 矩阵分块整体计算（预测按 x1 排序后分块，只与 x 方向可能重叠的真实框计算），不再逐对调用 calculate_iou
+- IoU 不低于最小阈值的 (预测, 真实框) 候选对只算一次，各 IoU 阈值的匹配都在候选对上完成
+- 匹配规则与原实现相同：按置信度从高到低，每个预测匹配 IoU 最大且未被匹配的同类真实框
+"""
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+# 分块计算 IoU 时单块的最大元素数（预测数 × 真实框数），控制临时数组的内存占用
+IOU_BLOCK_ELEMENTS = 4_000_000
+# 每块最多的预测数：块越小，x 方向范围越窄，需要计算的真实框越少
+IOU_BLOCK_ROWS = 128
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """[N, 4] 与 [M, 4] 的 xyxy 框两两之间的 IoU，返回 [N, M]"""
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    # 按坐标分量分别计算交集的宽高，避免 [N, M, 2] 的临时数组
+    iw = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    iw -= np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    np.maximum(iw, 0, out=iw)
+    ih = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    ih -= np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    np.maximum(ih, 0, out=ih)
+    intersection = np.multiply(iw, ih, out=iw)
+    union = area1[:, None] + area2[None, :]
+    union -= intersection
+    iou = np.zeros_like(intersection)
+    np.divide(intersection, union, out=iou, where=union > 0)
+    return iou
+
+
+def paired_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """逐行配对的 IoU：[K, 4] 与 [K, 4] 返回 [K]（计算方式与 box_iou 相同）"""
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    iw = np.minimum(boxes1[:, 2], boxes2[:, 2])
+    iw -= np.maximum(boxes1[:, 0], boxes2[:, 0])
+    np.maximum(iw, 0, out=iw)
+    ih = np.minimum(boxes1[:, 3], boxes2[:, 3])
+    ih -= np.maximum(boxes1[:, 1], boxes2[:, 1])
+    np.maximum(ih, 0, out=ih)
+    intersection = np.multiply(iw, ih, out=iw)
+    union = area1 + area2
+    union -= intersection
+    iou = np.zeros_like(intersection)
+    np.divide(intersection, union, out=iou, where=union > 0)
+    return iou
+
+
+class CandidatePairs(NamedTuple):
+    """IoU 不低于 min_iou 的 (预测, 真实框) 对；按预测的置信度名次、IoU 降序、真实框下标排序"""
+    pred: np.ndarray  # 预测在置信度排序中的名次
+    gt: np.ndarray  # 真实框下标
+    iou: np.ndarray
+
+
+def candidate_pairs(pred_boxes: np.ndarray, gt_boxes: np.ndarray, min_iou: float) -> CandidatePairs:
+    """
+    计算候选对。pred_boxes 已按置信度从高到低排列。
+    预测与真实框都按 x1 排序，预测分块后每块只与 x 方向可能重叠的一段连续真实框计算 IoU，
+    框分布稀疏时计算量远小于 P×G。
+    """
+    n_pred, n_gt = len(pred_boxes), len(gt_boxes)
+    empty = CandidatePairs(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0))
+    if n_pred == 0 or n_gt == 0:
+        return empty
+    pred_by_x = np.argsort(pred_boxes[:, 0], kind="stable")
+    gt_by_x = np.argsort(gt_boxes[:, 0], kind="stable")
+    gt_sorted = gt_boxes[gt_by_x]
+    gt_x1 = gt_sorted[:, 0]
+    # 与预测 x 方向重叠的真实框满足 x1 < 预测 x2 且 x1 > 预测 x1 - 最大真实框宽度
+    max_gt_width = max(float((gt_sorted[:, 2] - gt_sorted[:, 0]).max()), 0.0)
+    block = max(1, min(IOU_BLOCK_ROWS, IOU_BLOCK_ELEMENTS // n_gt))
+    preds, gts, ious = [], [], []
+    for start in range(0, n_pred, block):
+        rows = pred_by_x[start:start + block]
+        boxes = pred_boxes[rows]
+        lo = np.searchsorted(gt_x1, boxes[:, 0].min() - max_gt_width, side="right")
+        hi = np.searchsorted(gt_x1, boxes[:, 2].max(), side="left")
+        if lo >= hi:
+            continue
+        iou = box_iou(boxes, gt_sorted[lo:hi])
+        # min_iou 为 0 时也要求有交集，与原实现（best_iou 从 0 开始，严格大于才更新）一致
+        r, c = np.nonzero(iou >= min_iou if min_iou > 0 else iou > 0)
+        preds.append(rows[r])
+        gts.append(gt_by_x[lo + c])
+        ious.append(iou[r, c])
+    if not preds:
+        return empty
+    pred, gt, iou = np.concatenate(preds), np.concatenate(gts), np.concatenate(ious)
+    order = np.lexsort((gt, -iou, pred))
+    return CandidatePairs(pred[order], gt[order], iou[order])
+
+
+def match_thresholds(pairs: CandidatePairs, n_pred: int, iou_thresholds: Sequence[float]) -> np.ndarray:
+    """
+    一次遍历候选对，同时完成所有 IoU 阈值的贪心匹配，返回 [T, P] 的 TP 布尔数组（P 按置信度名次）。
+    每个预测 / 真实框在各阈值下是否已匹配用一个 T 位整数记录：候选对按预测名次与 IoU 降序排列，
+    对每个候选对，在 IoU 达到的阈值中，预测与真实框都还未匹配的那些阈值下记为匹配，
+    与逐个阈值单独贪心匹配的结果相同。
+    """
+    thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    n_thresholds = len(thresholds)
+    tp = np.zeros((n_thresholds, n_pred), dtype=bool)
+    if len(pairs.pred) == 0 or n_pred == 0:
+        return tp
+    # 每个候选对的 IoU 达到了哪些阈值（第 t 位表示第 t 个阈值）；阈值超过 62 个时用 Python 大整数
+    dtype = np.int64 if n_thresholds < 63 else object
+    bits = np.asarray([1 << t for t in range(n_thresholds)], dtype=dtype)
+    reached = (pairs.iou[:, None] >= thresholds[None, :]).astype(dtype) @ bits
+    pred_bits = [0] * n_pred
+    gt_bits = {}
+    for p, g, mask in zip(pairs.pred.tolist(), pairs.gt.tolist(), reached.tolist()):
+        free = mask & ~pred_bits[p] & ~gt_bits.get(g, 0)
+        if free:
+            pred_bits[p] |= free
+            gt_bits[g] = gt_bits.get(g, 0) | free
+    pred_bits = np.asarray(pred_bits, dtype=dtype)
+    for t, bit in enumerate(bits):
+        tp[t] = (pred_bits & bit) != 0
+    return tp
+
+
+class ClassMatches(NamedTuple):
+    """一个类别的匹配结果：预测按置信度从高到低排列"""
+    confidence: np.ndarray  # [P]
+    order: np.ndarray  # [P]，每个名次对应的预测在输入列表中的下标
+    tp: np.ndarray  # [T, P] 布尔数组，第 t 行对应第 t 个 IoU 阈值
+    n_gt: int
+
+
+def group_by_class(items: Sequence[Dict[str, Any]]) -> Dict[Any, List[int]]:
+    groups: Dict[Any, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(item.get('class'), []).append(index)
+    return groups
+
+
+def match_detections(
+    predictions: List[Dict], ground_truths: List[Dict], iou_thresholds: Sequence[float]
+) -> Dict[Any, ClassMatches]:
+    """
+    逐类别计算各 IoU 阈值下的匹配结果；预测与真实标注中出现过的类别都会返回。
+    每个类别的预测只分组、排序一次，IoU 只计算一次，所有阈值在一次匹配中完成。
+    """
+    pred_groups = group_by_class(predictions)
+    gt_groups = group_by_class(ground_truths)
+    min_iou = min(iou_thresholds)
+    results = {}
+    for cls in list(dict.fromkeys(list(pred_groups) + list(gt_groups))):
+        pred_index = np.asarray(pred_groups.get(cls, []), dtype=np.int64)
+        gt_index = gt_groups.get(cls, [])
+        confidence = np.asarray([predictions[i].get('confidence', 0) for i in pred_index], dtype=np.float64)
+        # 稳定排序：置信度相同的预测保持输入顺序，与 sorted(..., reverse=True) 一致
+        rank = np.argsort(-confidence, kind="stable")
+        order = pred_index[rank]
+        pred_boxes = np.asarray([predictions[i]['box'] for i in order], dtype=np.float64).reshape(-1, 4)
+        gt_boxes = np.asarray([ground_truths[i]['box'] for i in gt_index], dtype=np.float64).reshape(-1, 4)
+        pairs = candidate_pairs(pred_boxes, gt_boxes, min_iou)
+        results[cls] = ClassMatches(
+            confidence=confidence[rank],
+            order=order,
+            tp=match_thresholds(pairs, len(order), iou_thresholds),
+            n_gt=len(gt_index),
+        )
+    return results
+
+
+def cumulative_pr(tp: np.ndarray, n_gt: int):
+    """按名次累计的精确率与召回率（每个预测之后的值）；tp 为 [P] 或 [T, P]，沿最后一维累计"""
+    tp_count = np.cumsum(tp, axis=-1)
+    precision = tp_count / np.arange(1, tp.shape[-1] + 1)
+    recall = tp_count / n_gt if n_gt > 0 else np.zeros(tp.shape)
+    return precision, recall
+
+
+def average_precision(tp: np.ndarray, n_gt: int) -> np.ndarray:
+    """
+    [T, P] 的 TP 数组一次算出各阈值的 AP（[T]），计算方式与 EvaluationMetrics.calculate_ap 相同：
+    两端补点后取精度包络（从右向左的累计最大值），再按召回率的增量求面积
+    """
+    precision, recall = cumulative_pr(np.atleast_2d(tp), n_gt)
+    n_thresholds = precision.shape[0]
+    precision = np.hstack([np.zeros((n_thresholds, 1)), precision, np.zeros((n_thresholds, 1))])
+    recall = np.hstack([np.zeros((n_thresholds, 1)), recall, np.ones((n_thresholds, 1))])
+    precision = np.maximum.accumulate(precision[:, ::-1], axis=1)[:, ::-1]
+    # 召回率不变的位置增量为 0，对面积没有贡献
+    return np.sum((recall[:, 1:] - recall[:, :-1]) * precision[:, 1:], axis=1)
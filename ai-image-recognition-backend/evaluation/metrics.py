@@ -2,11 +2,17 @@ import matplotlib
 matplotlib.use('Agg') 
 import numpy as np
 import json
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Sequence
 import matplotlib.pyplot as plt
 import io
 import base64
 
+from .matching import average_precision, cumulative_pr, match_detections
+from .per_image import match_detections_per_image
+
+# mAP@0.5:0.95 使用的 IoU 阈值：0.5, 0.55, ..., 0.95
+DEFAULT_IOU_THRESHOLDS = [0.5] + [i/100 for i in range(55, 96, 5)]
+
 class EvaluationMetrics:
     """评估指标计算工具类"""
     
@@ -17,71 +23,30 @@ class EvaluationMetrics:
         iou_threshold: float = 0.5   #IOU阈值
     ) -> Tuple[Dict, Dict]:
         """
-        计算精确率和召回率
+        计算精确率和召回率（匹配由 matching.match_detections 按类别向量化完成）
         """
-        # 获取所有类别
-        all_classes = set()
-        for pred in predictions:
-            all_classes.add(pred.get('class'))
-        for gt in ground_truths:
-            all_classes.add(gt.get('class'))
-        all_classes = list(all_classes)
-        
-        # 初始化
-        class_stats = {cls: {'tp': 0, 'fp': 0, 'fn': 0} for cls in all_classes}
-        
-        # 标记已匹配的真实标注
-        matched_gt = {i: False for i in range(len(ground_truths))}
-        
-        # 按置信度排序预测结果
-        predictions_sorted = sorted(predictions, key=lambda x: x.get('confidence', 0), reverse=True)
-        
-        # 计算TP, FP
-        for pred in predictions_sorted:
-            pred_cls = pred['class']
-            pred_box = pred['box']
-            best_iou = 0
-            best_gt_idx = -1
-            
-            # 寻找最佳匹配的真实标注
-            for gt_idx, gt in enumerate(ground_truths):
-                if not matched_gt[gt_idx] and gt['class'] == pred_cls:
-                    iou = EvaluationMetrics.calculate_iou(pred_box, gt['box'])
-                    if iou > best_iou and iou >= iou_threshold:
-                        best_iou = iou
-                        best_gt_idx = gt_idx
-            
-            if best_gt_idx != -1:
-                # 找到匹配的真实标注
-                class_stats[pred_cls]['tp'] += 1
-                matched_gt[best_gt_idx] = True
-            else:
-                # 未找到匹配的真实标注
-                class_stats[pred_cls]['fp'] += 1
-        
-        # 计算FN
-        for gt_idx, gt in enumerate(ground_truths):
-            if not matched_gt[gt_idx]:
-                gt_cls = gt['class']
-                class_stats[gt_cls]['fn'] += 1
-        
-        # 计算精确率和召回率
+        matches = match_detections(predictions, ground_truths, [iou_threshold])
+        return EvaluationMetrics._precision_recall_from_matches(matches, 0)
+    
+    @staticmethod
+    def _precision_recall_from_matches(matches: Dict, t: int) -> Tuple[Dict, Dict]:
+        """由逐类别匹配结果（第 t 个 IoU 阈值）计算精确率和召回率"""
         precision = {}
         recall = {}
-        for cls in all_classes:
-            tp = class_stats[cls]['tp']
-            fp = class_stats[cls]['fp']
-            fn = class_stats[cls]['fn']
+        total_tp = total_fp = total_fn = 0
+        for cls, match in matches.items():
+            tp = int(match.tp[t].sum())
+            fp = len(match.order) - tp
+            fn = match.n_gt - tp
+            total_tp += tp
+            total_fp += fp
+            total_fn += fn
             
             # 防止除以零
             precision[cls] = tp / (tp + fp) if (tp + fp) > 0 else 0.0
             recall[cls] = tp / (tp + fn) if (tp + fn) > 0 else 0.0
         
         # 计算总体指标
-        total_tp = sum(stats['tp'] for stats in class_stats.values())
-        total_fp = sum(stats['fp'] for stats in class_stats.values())
-        total_fn = sum(stats['fn'] for stats in class_stats.values())
-        
         precision['overall'] = total_tp / (total_tp + total_fp) if (total_tp + total_fp) > 0 else 0.0
         recall['overall'] = total_tp / (total_tp + total_fn) if (total_tp + total_fn) > 0 else 0.0
         
@@ -128,9 +93,8 @@ class EvaluationMetrics:
         precision = np.concatenate(([0.0], precision, [0.0]))
         recall = np.concatenate(([0.0], recall, [1.0]))
         
-        # 计算每个点的最大精度
-        for i in range(len(precision) - 2, -1, -1):
-            precision[i] = max(precision[i], precision[i + 1])
+        # 计算每个点的最大精度（从右向左的累计最大值）
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
         
         # 计算PR曲线下的面积
         indices = np.where(recall[1:] != recall[:-1])[0] + 1
@@ -151,72 +115,25 @@ class EvaluationMetrics:
             class_maps: 每个类别的mAP
         """
         if iou_thresholds is None:
-            iou_thresholds = [0.5] + [i/100 for i in range(55, 96, 5)]  # 0.5, 0.55, ..., 0.95
-        
-        # 获取所有类别
-        all_classes = set()
-        for pred in predictions:
-            all_classes.add(pred.get('class'))
-        for gt in ground_truths:
-            all_classes.add(gt.get('class'))
-        all_classes = list(all_classes)
+            iou_thresholds = DEFAULT_IOU_THRESHOLDS
         
-        # 按类别和IOU阈值计算AP
-        class_aps = {cls: [] for cls in all_classes}
-        
-        for iou in iou_thresholds:
-            # 按置信度排序所有预测
-            preds_sorted = sorted(predictions, key=lambda x: x.get('confidence', 0), reverse=True)
-            
-            for cls in all_classes:
-                # 筛选当前类别的预测和真实标注
-                cls_preds = [p for p in preds_sorted if p['class'] == cls]
-                cls_gts = [g for g in ground_truths if g['class'] == cls]
-                
-                # 计算每个预测的TP/FP
-                matched_gts = set()
-                precisions = []
-                recalls = []
-                tp_count = 0
-                fp_count = 0
-                
-                for pred in cls_preds:
-                    pred_box = pred['box']
-                    best_iou = 0
-                    best_gt_idx = -1
-                    
-                    # 寻找最佳匹配
-                    for gt_idx, gt in enumerate(cls_gts):
-                        if gt_idx not in matched_gts:
-                            current_iou = EvaluationMetrics.calculate_iou(pred_box, gt['box'])
-                            if current_iou > best_iou and current_iou >= iou:
-                                best_iou = current_iou
-                                best_gt_idx = gt_idx
-                    
-                    if best_gt_idx != -1:
-                        tp_count += 1
-                        matched_gts.add(best_gt_idx)
-                    else:
-                        fp_count += 1
-                    
-                    # 计算当前的精确率和召回率
-                    precision = tp_count / (tp_count + fp_count) if (tp_count + fp_count) > 0 else 0.0
-                    recall = tp_count / len(cls_gts) if len(cls_gts) > 0 else 0.0
-                    
-                    precisions.append(precision)
-                    recalls.append(recall)
-                
-                # 计算AP
-                ap = EvaluationMetrics.calculate_ap(precisions, recalls)
-                class_aps[cls].append(ap)
+        # 每个类别只分组、排序与计算 IoU 一次，一次匹配得到 [T, P] 的 TP 数组，各阈值的 AP 一起计算
+        matches = match_detections(predictions, ground_truths, iou_thresholds)
+        return EvaluationMetrics._map_from_matches(matches, range(len(iou_thresholds)))
+    
+    @staticmethod
+    def _map_from_matches(matches: Dict, rows: Sequence[int]) -> Tuple[float, float, Dict]:
+        """由逐类别匹配结果计算 mAP；rows 为参与 mAP 的 IoU 阈值所在行，第一个为 0.5"""
+        rows = list(rows)
+        class_aps = {cls: average_precision(match.tp[rows], match.n_gt) for cls, match in matches.items()}
         
         # 计算每个类别的mAP
         class_maps = {}
-        for cls in all_classes:
+        for cls in class_aps:
             class_maps[cls] = np.mean(class_aps[cls])
         
         # 计算mAP@0.5和mAP@0.5:0.95
-        map50 = np.mean([class_aps[cls][0] for cls in all_classes])  # 第一个是0.5阈值
+        map50 = np.mean([aps[0] for aps in class_aps.values()])  # 第一个是0.5阈值
         map50_95 = np.mean([np.mean(aps) for aps in class_aps.values()])
         
         return map50, map50_95, class_maps
@@ -230,93 +147,81 @@ class EvaluationMetrics:
         """
         生成PR曲线数据
         """
-        # 获取所有类别
-        all_classes = set()
-        for pred in predictions:
-            all_classes.add(pred.get('class'))
-        for gt in ground_truths:
-            all_classes.add(gt.get('class'))
-        all_classes = list(all_classes)
-        
-        pr_data = {'overall': {'precision': [], 'recall': []}}
-        
-        # 计算总体PR曲线
-        preds_sorted = sorted(predictions, key=lambda x: x.get('confidence', 0), reverse=True)
-        matched_gts = set()
-        tp_count = 0
-        fp_count = 0
-        total_gt = len(ground_truths)
-        
-        for pred in preds_sorted:
-            pred_box = pred['box']
-            best_iou = 0
-            best_gt_idx = -1
-            
-            # 寻找最佳匹配
-            for gt_idx, gt in enumerate(ground_truths):
-                if gt_idx not in matched_gts and gt['class'] == pred['class']:
-                    current_iou = EvaluationMetrics.calculate_iou(pred_box, gt['box'])
-                    if current_iou > best_iou and current_iou >= iou_threshold:
-                        best_iou = current_iou
-                        best_gt_idx = gt_idx
-            
-            if best_gt_idx != -1:
-                tp_count += 1
-                matched_gts.add(best_gt_idx)
-            else:
-                fp_count += 1
-            
-            # 计算当前的精确率和召回率
-            precision = tp_count / (tp_count + fp_count) if (tp_count + fp_count) > 0 else 0.0
-            recall = tp_count / total_gt if total_gt > 0 else 0.0
-            
-            pr_data['overall']['precision'].append(precision)
-            pr_data['overall']['recall'].append(recall)
+        matches = match_detections(predictions, ground_truths, [iou_threshold])
+        return EvaluationMetrics._pr_curve_from_matches(matches, 0, len(predictions), len(ground_truths))
+    
+    @staticmethod
+    def _pr_curve_from_matches(matches: Dict, t: int, n_predictions: int, n_ground_truths: int) -> Dict:
+        """由逐类别匹配结果（第 t 个 IoU 阈值）生成 PR 曲线数据"""
+        # 计算总体PR曲线：各类别的匹配互不影响，把各类别的 TP 标记按全体预测的置信度顺序合并即可
+        tp = np.zeros(n_predictions, dtype=bool)
+        confidence = np.zeros(n_predictions)
+        for match in matches.values():
+            tp[match.order] = match.tp[t]
+            confidence[match.order] = match.confidence
+        ranked = np.argsort(-confidence, kind="stable")
+        precision, recall = cumulative_pr(tp[ranked], n_ground_truths)
+        pr_data = {'overall': {'precision': precision.tolist(), 'recall': recall.tolist()}}
         
         # 为每个类别计算PR曲线
-        for cls in all_classes:
-            pr_data[cls] = {'precision': [], 'recall': []}
-            
-            # 筛选当前类别的预测和真实标注
-            cls_preds = [p for p in predictions if p['class'] == cls]
-            cls_gts = [g for g in ground_truths if g['class'] == cls]
-            
-            # 按置信度排序
-            cls_preds_sorted = sorted(cls_preds, key=lambda x: x.get('confidence', 0), reverse=True)
-            
-            matched_cls_gts = set()
-            tp_count_cls = 0
-            fp_count_cls = 0
-            total_cls_gt = len(cls_gts)
-            
-            for pred in cls_preds_sorted:
-                pred_box = pred['box']
-                best_iou = 0
-                best_gt_idx = -1
-                
-                # 寻找最佳匹配
-                for gt_idx, gt in enumerate(cls_gts):
-                    if gt_idx not in matched_cls_gts:
-                        current_iou = EvaluationMetrics.calculate_iou(pred_box, gt['box'])
-                        if current_iou > best_iou and current_iou >= iou_threshold:
-                            best_iou = current_iou
-                            best_gt_idx = gt_idx
-                
-                if best_gt_idx != -1:
-                    tp_count_cls += 1
-                    matched_cls_gts.add(best_gt_idx)
-                else:
-                    fp_count_cls += 1
-                
-                # 计算当前的精确率和召回率
-                precision = tp_count_cls / (tp_count_cls + fp_count_cls) if (tp_count_cls + fp_count_cls) > 0 else 0.0
-                recall = tp_count_cls / total_cls_gt if total_cls_gt > 0 else 0.0
-                
-                pr_data[cls]['precision'].append(precision)
-                pr_data[cls]['recall'].append(recall)
+        for cls, match in matches.items():
+            precision, recall = cumulative_pr(match.tp[t], match.n_gt)
+            pr_data[cls] = {'precision': precision.tolist(), 'recall': recall.tolist()}
         
         return pr_data
     
+    @staticmethod
+    def evaluate(
+        predictions: List[Dict],
+        ground_truths: List[Dict],
+        iou_threshold: float = 0.5,
+        iou_thresholds: Optional[List[float]] = None,
+        per_image: bool = False,
+        workers: Optional[int] = None
+    ) -> Dict:
+        """
+        一次匹配算出精确率 / 召回率、mAP 与 PR 曲线。
+        per_image 为 True 时按预测 / 真实标注的 image_id 分组（COCO 方式，只在同一张图片内匹配），
+        图片在进程池中分片并行匹配（见 per_image.match_detections_per_image）。
+        """
+        if iou_thresholds is None:
+            iou_thresholds = DEFAULT_IOU_THRESHOLDS
+        thresholds = list(dict.fromkeys([iou_threshold] + list(iou_thresholds)))
+        if per_image:
+            matches = match_detections_per_image(predictions, ground_truths, thresholds, workers)
+        else:
+            matches = match_detections(predictions, ground_truths, thresholds)
+        return EvaluationMetrics.summarize(
+            matches, thresholds, iou_thresholds, len(predictions), len(ground_truths)
+        )
+    
+    @staticmethod
+    def summarize(
+        matches: Dict,
+        thresholds: Sequence[float],
+        iou_thresholds: Sequence[float],
+        n_predictions: int,
+        n_ground_truths: int
+    ) -> Dict:
+        """
+        由逐类别匹配结果计算 evaluate 返回的各项指标。
+        thresholds 为匹配时使用的阈值列表（第 0 个用于精确率 / 召回率与 PR 曲线），iou_thresholds 为参与 mAP 平均的阈值。
+        """
+        thresholds = list(thresholds)
+        precision, recall = EvaluationMetrics._precision_recall_from_matches(matches, 0)
+        map50, map50_95, class_maps = EvaluationMetrics._map_from_matches(
+            matches, [thresholds.index(iou) for iou in iou_thresholds]
+        )
+        pr_curve_data = EvaluationMetrics._pr_curve_from_matches(matches, 0, n_predictions, n_ground_truths)
+        return {
+            'precision': precision,
+            'recall': recall,
+            'map50': map50,
+            'map50_95': map50_95,
+            'class_maps': class_maps,
+            'pr_curve_data': pr_curve_data,
+        }
+    
     @staticmethod
     def plot_pr_curve(pr_data: Dict, title: str = "Precision-Recall Curve") -> str:
         """
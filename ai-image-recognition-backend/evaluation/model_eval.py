@@ -0,0 +1,308 @@
+"""
+服务器端模型评估：加载训练得到的权重，在 YOLO data.yaml 的某个划分（默认 val）上批量推理，
+预测与标签文件中的真实框以数组形式直接送入 EvaluationAccumulator（逐批完成图片内匹配），
+结束后把指标写入 evaluation_results。框不经过 HTTP 与字典，内存只与预测数成正比。
+评估任务在 AI_EVAL_JOB_WORKERS 个线程的任务池中排队执行；训练任务完成后可自动提交评估。
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import uuid
+
+import numpy as np
+from ultralytics import YOLO
+
+from database import SessionLocal
+from inference.imaging import load_image
+from inference.postprocess import lookup_names, to_numpy
+from prelabel.service import PrelabelConfig, resolve_dataset
+from training.training_service import TrainingStatus
+from .accumulator import EvaluationAccumulator
+from .models import EvaluationResultDB
+from .results import store_failure, store_metrics
+
+# 同时运行的评估任务数，其余任务排队
+EVAL_JOB_WORKERS = int(os.getenv("AI_EVAL_JOB_WORKERS", "1"))
+# 每个评估任务并行解码图片 / 读取标签的线程数，以及提前解码的批数
+EVAL_DECODE_WORKERS = int(os.getenv("AI_EVAL_DECODE_WORKERS", "4"))
+EVAL_PREFETCH_BATCHES = int(os.getenv("AI_EVAL_PREFETCH_BATCHES", "2"))
+# 每批推理的图片数
+EVAL_BATCH_SIZE = int(os.getenv("AI_EVAL_BATCH_SIZE", "16"))
+# 训练任务（检测 / 分割）完成后是否自动在其 data.yaml 的 val 划分上评估
+EVAL_AUTO_TRAINING = os.getenv("AI_EVAL_AUTO_TRAINING", "true").lower() in ("1", "true", "yes")
+# 支持自动评估的训练任务类型：分割模型按检测框评估
+EVAL_TRAINING_TASKS = ("detect", "segment")
+
+
+class ModelEvaluationStatus(Enum):
+    """模型评估任务状态（与评估记录的 status 取值一致）"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class ModelEvaluationConfig:
+    """模型评估配置"""
+    weights: str  # 权重路径，例如 TrainingTask.result_path
+    data: str  # YOLO data.yaml 路径
+    split: str = "val"
+    conf: float = 0.001  # 推理置信度阈值：取低值让 PR 曲线覆盖完整召回范围（同 ultralytics val）
+    nms_iou: float = 0.7
+    imgsz: int = 640
+    batch_size: int = EVAL_BATCH_SIZE
+    iou_threshold: float = 0.5
+    iou_thresholds: Optional[List[float]] = None
+    training_task_id: Optional[str] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class ModelEvaluationJob:
+    """模型评估任务；job_id 即评估记录的 evaluation_id"""
+    job_id: str
+    model_id: str
+    config: ModelEvaluationConfig
+    status: ModelEvaluationStatus = ModelEvaluationStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    total_images: int = 0
+    processed_images: int = 0
+    failed_images: int = 0
+    predictions: int = 0
+    ground_truths: int = 0
+    images_per_second: Optional[float] = None
+    error_message: Optional[str] = None
+    cancel_requested: bool = False
+
+    def to_dict(self):
+        data = asdict(self)
+        data.pop("cancel_requested")
+        data["evaluation_id"] = data.pop("job_id")
+        data["status"] = self.status.value
+        for name in ("created_at", "started_at", "completed_at"):
+            if data[name]:
+                data[name] = data[name].isoformat()
+        data["progress"] = self.processed_images / self.total_images * 100 if self.total_images else 0.0
+        return data
+
+
+def read_yolo_labels(path: Path, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取 YOLO 标签文件，返回 (像素 xyxy 框 [N, 4], 类别 id [N])；文件不存在时视为没有目标。
+    检测标签为 "类别 cx cy w h"，分割标签为 "类别 x1 y1 x2 y2 ..."（取多边形的外接框），坐标均为 0~1。
+    """
+    boxes, class_ids = [], []
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            values = line.split()
+            if len(values) < 5:
+                continue
+            coords = [float(v) for v in values[1:]]
+            if len(coords) == 4:
+                cx, cy, w, h = coords
+                box = [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+            else:
+                xs, ys = coords[0::2], coords[1::2]
+                box = [min(xs), min(ys), max(xs), max(ys)]
+            boxes.append(box)
+            class_ids.append(int(float(values[0])))
+    scale = np.asarray([width, height, width, height], dtype=np.float64)
+    return (np.asarray(boxes, dtype=np.float64).reshape(-1, 4) * scale,
+            np.asarray(class_ids, dtype=np.int64))
+
+
+def _load_sample(image_path: Path, label_path: Path):
+    """在解码线程中读取一张图片及其标签"""
+    image = load_image(str(image_path))
+    height, width = image.shape[:2]
+    return image, read_yolo_labels(label_path, width, height)
+
+
+class ModelEvaluationService:
+    """模型评估任务管理"""
+
+    def __init__(self):
+        self.jobs: Dict[str, ModelEvaluationJob] = {}
+        self._pool = ThreadPoolExecutor(max_workers=EVAL_JOB_WORKERS, thread_name_prefix="model-eval")
+
+    def create_job(self, model_id: str, config: ModelEvaluationConfig) -> str:
+        """创建评估记录并把任务放入任务池；路径或阈值不合法时抛出 ValueError"""
+        if not os.path.isfile(config.weights):
+            raise ValueError(f"权重文件不存在: {config.weights}")
+        if not os.path.isfile(config.data):
+            raise ValueError(f"data.yaml 不存在: {config.data}")
+        if config.batch_size < 1:
+            raise ValueError("batch_size 应大于 0")
+        # 提前校验阈值，避免任务排队后才失败
+        EvaluationAccumulator(config.iou_threshold, config.iou_thresholds)
+
+        job_id = str(uuid.uuid4())
+        job = ModelEvaluationJob(job_id=job_id, model_id=model_id, config=config)
+        db = SessionLocal()
+        try:
+            db.add(EvaluationResultDB(
+                evaluation_id=job_id,
+                model_id=model_id,
+                status=job.status.value,
+                created_at=job.created_at,
+                config={**config.to_dict(), "per_image": True, "mode": "model"}
+            ))
+            db.commit()
+        finally:
+            db.close()
+        self.jobs[job_id] = job
+        self._pool.submit(self._run_job, job)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[ModelEvaluationJob]:
+        return self.jobs.get(job_id)
+
+    def cancel_job(self, job_id: str) -> bool:
+        """请求取消任务：排队中的任务不再执行，运行中的任务在当前批结束后停止"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in (ModelEvaluationStatus.PENDING, ModelEvaluationStatus.RUNNING):
+            return False
+        job.cancel_requested = True
+        return True
+
+    def training_task_config(self, task, split: str = "val") -> ModelEvaluationConfig:
+        """由训练任务得到评估配置：权重为 result_path，数据为训练使用的 data.yaml；任务不可评估时抛出 ValueError"""
+        config = task.config
+        if task.status != TrainingStatus.COMPLETED or not task.result_path:
+            raise ValueError("训练任务尚未完成，没有可评估的权重")
+        if config.task not in EVAL_TRAINING_TASKS:
+            raise ValueError(f"不支持评估 {config.task} 类型的训练任务")
+        return ModelEvaluationConfig(
+            weights=task.result_path,
+            data=config.data_path,
+            split=split,
+            imgsz=config.imgsz,
+            training_task_id=task.task_id,
+        )
+
+    def evaluate_training_task(self, task) -> Optional[str]:
+        """训练完成回调：检测 / 分割任务在训练使用的 data.yaml 的 val 划分上评估，model_id 为训练任务 ID"""
+        if not EVAL_AUTO_TRAINING or task.config.task not in EVAL_TRAINING_TASKS:
+            return None
+        job_id = self.create_job(task.task_id, self.training_task_config(task))
+        print(f"📊 训练任务 {task.task_id} 已完成，提交自动评估: {job_id}")
+        return job_id
+
+    def _run_job(self, job: ModelEvaluationJob):
+        config = job.config
+        db = SessionLocal()
+        try:
+            eval_result = db.query(EvaluationResultDB).filter(
+                EvaluationResultDB.evaluation_id == job.job_id
+            ).one()
+            if job.cancel_requested:
+                raise RuntimeError("Evaluation cancelled")
+            job.status = ModelEvaluationStatus.RUNNING
+            job.started_at = datetime.utcnow()
+            eval_result.status = job.status.value
+            db.commit()
+
+            _, images, dataset_names = resolve_dataset(PrelabelConfig(source=config.data, split=config.split))
+            job.total_images = len(images)
+            model = YOLO(config.weights)
+            # 预测与真实框按类别名匹配；data.yaml 没有类别表时真实框沿用模型的类别表
+            gt_names = dataset_names or model.names
+            accumulator = EvaluationAccumulator(config.iou_threshold, config.iou_thresholds)
+
+            started = time.perf_counter()
+            batches = (images[i:i + config.batch_size] for i in range(0, len(images), config.batch_size))
+            with ThreadPoolExecutor(max_workers=EVAL_DECODE_WORKERS, thread_name_prefix="model-eval-decode") as decoders:
+                def submit(batch):
+                    return [(image, decoders.submit(_load_sample, image.path, image.label_path)) for image in batch]
+
+                pending = deque(submit(batch) for _, batch in zip(range(EVAL_PREFETCH_BATCHES), batches))
+                while pending:
+                    if job.cancel_requested:
+                        raise RuntimeError("Evaluation cancelled")
+                    batch = pending.popleft()
+                    next_batch = next(batches, None)
+                    if next_batch:
+                        pending.append(submit(next_batch))
+
+                    loaded = []
+                    for image, future in batch:
+                        try:
+                            loaded.append(future.result())
+                        except Exception as e:
+                            print(f"评估读取图片失败 {image.path}: {e}")
+                            job.failed_images += 1
+                    if loaded:
+                        self._accumulate(model, config, gt_names, loaded, accumulator)
+                    job.processed_images += len(batch)
+                    job.predictions = accumulator.n_predictions
+                    job.ground_truths = accumulator.n_ground_truths
+                    elapsed = time.perf_counter() - started
+                    job.images_per_second = job.processed_images / elapsed if elapsed > 0 else None
+
+            store_metrics(eval_result, accumulator.metrics(), extra_logs=[
+                f"Weights: {config.weights}",
+                f"Dataset: {config.data} ({config.split}), images: {accumulator.images}, "
+                f"failed images: {job.failed_images}",
+                f"Predictions: {accumulator.n_predictions}, ground truths: {accumulator.n_ground_truths}, "
+                f"throughput: {job.images_per_second or 0:.1f} img/s"
+            ])
+            db.commit()
+            job.status = ModelEvaluationStatus.COMPLETED
+            print(f"✅ 模型评估 {job.job_id} 完成: mAP50={eval_result.mAP50:.4f} mAP50-95={eval_result.mAP50_95:.4f}，"
+                  f"{job.processed_images} 张，{job.images_per_second or 0:.1f} img/s")
+        except Exception as e:
+            db.rollback()
+            job.status = ModelEvaluationStatus.FAILED
+            job.error_message = str(e)
+            print(f"❌ 模型评估 {job.job_id} 失败: {e}")
+            eval_result = db.query(EvaluationResultDB).filter(
+                EvaluationResultDB.evaluation_id == job.job_id
+            ).first()
+            if eval_result is not None:
+                store_failure(eval_result, str(e))
+                db.commit()
+        finally:
+            job.completed_at = datetime.utcnow()
+            db.close()
+
+    @staticmethod
+    def _accumulate(model, config: ModelEvaluationConfig, gt_names, loaded, accumulator: EvaluationAccumulator):
+        """对一批图片做一次批量推理，预测与真实框整批拼接为数组后送入累加器"""
+        results = model.predict(
+            [image for image, _ in loaded], conf=config.conf, iou=config.nms_iou, imgsz=config.imgsz, verbose=False
+        )
+        pred_boxes, pred_conf, pred_cls, pred_counts = [], [], [], []
+        for result in results:
+            boxes = result.boxes
+            count = 0 if boxes is None else len(boxes)
+            if count:
+                pred_boxes.append(to_numpy(boxes.xyxy).reshape(-1, 4))
+                pred_conf.append(to_numpy(boxes.conf).reshape(-1))
+                pred_cls.append(to_numpy(boxes.cls).reshape(-1).astype(np.int64))
+            pred_counts.append(count)
+        pred_cls = np.concatenate(pred_cls) if pred_cls else np.zeros(0, np.int64)
+        gt_cls = np.concatenate([class_ids for _, (_, class_ids) in loaded])
+        accumulator.add_arrays(
+            np.concatenate(pred_boxes) if pred_boxes else np.zeros((0, 4)),
+            lookup_names(model.names, pred_cls),
+            np.concatenate(pred_conf) if pred_conf else np.zeros(0),
+            pred_counts,
+            np.concatenate([boxes for _, (boxes, _) in loaded]),
+            lookup_names(gt_names, gt_cls),
+            [len(class_ids) for _, (_, class_ids) in loaded],
+        )
+
+
+# 全局模型评估服务实例
+model_evaluation_service = ModelEvaluationService()
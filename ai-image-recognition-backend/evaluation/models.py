@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Float, ForeignKey, Index
 from database import Base
 from datetime import datetime
 from training.models import TrainingTaskDB
@@ -6,6 +6,11 @@ from training.models import TrainingTaskDB
 class EvaluationResultDB(Base):
     """评估结果数据库模型"""
     __tablename__ = "evaluation_results"
+    __table_args__ = (
+        # 按模型 / 状态列出评估记录并按创建时间倒序，见 migrations/versions.py
+        Index("ix_evaluation_results_model_id_created_at", "model_id", "created_at"),
+        Index("ix_evaluation_results_status_created_at", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     evaluation_id = Column(String, unique=True, index=True)  # 评估ID
@@ -0,0 +1,193 @@
+"""
+按图片分组的评估（COCO 方式）：预测只与同一张图片的同类真实框匹配，各图片的匹配互不依赖，
+因此把图片分片后交给进程池并行计算，再把各图片的 [T, P] TP 数组合并成数据集级别的匹配结果
+（与 matching.match_detections 的返回格式相同），后续的 AP / PR 计算与不分图片的模式共用。
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .matching import ClassMatches, CandidatePairs, match_thresholds, paired_iou
+
+# 进程池的进程数，0 表示按 CPU 核数，最多 EVAL_DEFAULT_MAX_WORKERS 个（评估与在线推理共用同一台机器）
+EVAL_DEFAULT_MAX_WORKERS = 4
+EVAL_WORKERS = int(os.getenv("AI_EVAL_WORKERS", "0")) or min(os.cpu_count() or 1, EVAL_DEFAULT_MAX_WORKERS)
+# 图片数少于该值时在当前进程中计算（进程间传输的开销大于并行的收益）
+EVAL_PARALLEL_MIN_IMAGES = int(os.getenv("AI_EVAL_PARALLEL_MIN_IMAGES", "2000"))
+# 每个进程分到的分片数，分片越多负载越均衡
+EVAL_SHARDS_PER_WORKER = 4
+# 分片内一次展开的 (预测, 真实框) 对数上限，控制临时数组的内存占用
+EVAL_PAIR_CHUNK = 4_000_000
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    进程池按需创建并复用；使用 spawn，子进程不继承服务进程中的模型与线程。
+    spawn 子进程会重新导入 __main__ 所在的文件：服务以 uvicorn main:app 或 python main.py 启动时
+    __main__ 为 uvicorn（main.py 作为 __main__ 运行时直接转给 uvicorn），子进程只导入 numpy 与评估模块。
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+class _Encoded:
+    """把预测 / 真实标注的字典列表转换为按图片排序的数组；offsets[i]:offsets[i+1] 为第 i 张图片的框"""
+
+    def __init__(self, items: List[Dict], image_ids: Dict[Any, int], class_ids: Dict[Any, int], with_confidence: bool):
+        image = np.asarray([image_ids[item.get('image_id')] for item in items], dtype=np.int64)
+        # 按图片稳定排序，同一图片内保持输入顺序
+        self.order = np.argsort(image, kind="stable")
+        self.boxes = np.asarray([item['box'] for item in items], dtype=np.float64).reshape(-1, 4)[self.order]
+        self.classes = np.asarray([class_ids[item.get('class')] for item in items], dtype=np.int64)[self.order]
+        self.confidence = (
+            np.asarray([item.get('confidence', 0) for item in items], dtype=np.float64)[self.order]
+            if with_confidence else None
+        )
+        counts = np.bincount(image, minlength=len(image_ids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+
+def match_shard(
+    pred_boxes: np.ndarray, pred_classes: np.ndarray, pred_confidence: np.ndarray, pred_offsets: np.ndarray,
+    gt_boxes: np.ndarray, gt_classes: np.ndarray, gt_offsets: np.ndarray, iou_thresholds: Sequence[float],
+) -> np.ndarray:
+    """
+    匹配一个分片中的所有图片（在进程池中执行，评估会话的每批图片也用它匹配），返回分片内全部预测的 [T, P] TP 数组。
+    不逐张图片循环：同一图片内的全部 (预测, 真实框) 对用下标运算一次展开，逐对向量化计算 IoU，
+    再按 (图片, 置信度名次) 给预测编号，对整个分片的候选对只做一次所有阈值的贪心匹配——
+    不同图片的预测与真实框互不相交，合并匹配与逐张匹配的结果相同。
+    """
+    n_pred = len(pred_boxes)
+    tp = np.zeros((len(iou_thresholds), n_pred), dtype=bool)
+    n_images = len(pred_offsets) - 1
+    pred_counts = np.diff(pred_offsets)
+    gt_counts = np.diff(gt_offsets)
+    pair_counts = pred_counts * gt_counts
+    if n_pred == 0 or not pair_counts.any():
+        return tp
+
+    # 图片内按置信度从高到低稳定排序：position[输入下标] = 在 (图片, 名次) 顺序中的位置
+    image_of_pred = np.repeat(np.arange(n_images), pred_counts)
+    ranked_to_input = np.lexsort((-pred_confidence, image_of_pred))
+    position = np.empty(n_pred, dtype=np.int64)
+    position[ranked_to_input] = np.arange(n_pred)
+
+    min_iou = min(iou_thresholds)
+    preds, gts, ious = [], [], []
+    pair_ends = np.cumsum(pair_counts)
+    start = 0
+    while start < n_images:
+        # 每块展开的候选对不超过 EVAL_PAIR_CHUNK 个（至少一张图片）
+        base = pair_ends[start - 1] if start > 0 else 0
+        end = max(start + 1, int(np.searchsorted(pair_ends, base + EVAL_PAIR_CHUNK, side="right")))
+        end = min(end, n_images)
+        counts = pair_counts[start:end]
+        total = int(counts.sum())
+        if total:
+            images = np.repeat(np.arange(start, end), counts)
+            local = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            p = pred_offsets[images] + local // gt_counts[images]
+            g = gt_offsets[images] + local % gt_counts[images]
+            same_class = pred_classes[p] == gt_classes[g]
+            p, g = p[same_class], g[same_class]
+            iou = paired_iou(pred_boxes[p], gt_boxes[g])
+            keep = iou >= min_iou if min_iou > 0 else iou > 0
+            preds.append(position[p[keep]])
+            gts.append(g[keep])
+            ious.append(iou[keep])
+        start = end
+
+    pred, gt, iou = np.concatenate(preds), np.concatenate(gts), np.concatenate(ious)
+    order = np.lexsort((gt, -iou, pred))
+    tp[:, ranked_to_input] = match_thresholds(CandidatePairs(pred[order], gt[order], iou[order]), n_pred, iou_thresholds)
+    return tp
+
+
+def _shards(n_images: int, workers: int) -> List[Tuple[int, int]]:
+    size = max(1, math.ceil(n_images / (workers * EVAL_SHARDS_PER_WORKER)))
+    return [(start, min(n_images, start + size)) for start in range(0, n_images, size)]
+
+
+def match_detections_per_image(
+    predictions: List[Dict], ground_truths: List[Dict], iou_thresholds: Sequence[float],
+    workers: Optional[int] = None,
+) -> Dict[Any, ClassMatches]:
+    """
+    按 image_id 分组匹配，返回与 match_detections 相同格式的逐类别结果。
+    workers 为进程数（默认 AI_EVAL_WORKERS）；为 1 或图片数少于 AI_EVAL_PARALLEL_MIN_IMAGES 时在当前进程计算。
+    """
+    iou_thresholds = list(iou_thresholds)
+    image_ids = {key: index for index, key in enumerate(dict.fromkeys(
+        [item.get('image_id') for item in predictions] + [item.get('image_id') for item in ground_truths]
+    ))}
+    class_ids = {key: index for index, key in enumerate(dict.fromkeys(
+        [item.get('class') for item in predictions] + [item.get('class') for item in ground_truths]
+    ))}
+    preds = _Encoded(predictions, image_ids, class_ids, with_confidence=True)
+    gts = _Encoded(ground_truths, image_ids, class_ids, with_confidence=False)
+
+    n_images = len(image_ids)
+    workers = workers or EVAL_WORKERS
+    if workers <= 1 or n_images < EVAL_PARALLEL_MIN_IMAGES:
+        tp_sorted = match_shard(
+            preds.boxes, preds.classes, preds.confidence, preds.offsets,
+            gts.boxes, gts.classes, gts.offsets, iou_thresholds,
+        )
+    else:
+        pool = _get_pool(workers)
+        futures = []
+        for start, end in _shards(n_images, workers):
+            p0, p1 = preds.offsets[start], preds.offsets[end]
+            g0, g1 = gts.offsets[start], gts.offsets[end]
+            futures.append(pool.submit(
+                match_shard,
+                preds.boxes[p0:p1], preds.classes[p0:p1], preds.confidence[p0:p1], preds.offsets[start:end + 1] - p0,
+                gts.boxes[g0:g1], gts.classes[g0:g1], gts.offsets[start:end + 1] - g0, iou_thresholds,
+            ))
+        tp_sorted = np.concatenate([future.result() for future in futures], axis=1) if futures else \
+            np.zeros((len(iou_thresholds), 0), dtype=bool)
+
+    # 还原为输入顺序，再按类别汇总：类别内按置信度从高到低稳定排序（与不分图片的模式一致）
+    tp = np.zeros_like(tp_sorted)
+    tp[:, preds.order] = tp_sorted
+    confidence = np.zeros(len(predictions))
+    confidence[preds.order] = preds.confidence
+    pred_classes = np.zeros(len(predictions), dtype=np.int64)
+    pred_classes[preds.order] = preds.classes
+    gt_counts = np.bincount(gts.classes, minlength=len(class_ids))
+
+    results = {}
+    for cls, class_id in class_ids.items():
+        index = np.nonzero(pred_classes == class_id)[0]
+        rank = np.argsort(-confidence[index], kind="stable")
+        order = index[rank]
+        results[cls] = ClassMatches(
+            confidence=confidence[order],
+            order=order,
+            tp=tp[:, order],
+            n_gt=int(gt_counts[class_id]),
+        )
+    return results
@@ -0,0 +1,77 @@
+"""
+把 EvaluationMetrics.evaluate / summarize 的结果写入 EvaluationResultDB 记录，
+一次性评估、评估会话等各种评估方式共用。
+"""
+import datetime
+import json
+from typing import Dict, List, Optional
+
+from .models import EvaluationResultDB
+
+
+def store_metrics(eval_result: EvaluationResultDB, metrics: Dict, extra_logs: Optional[List[str]] = None):
+    """把指标写入评估记录并标记为 completed（不提交事务）"""
+    precision, recall = metrics['precision'], metrics['recall']
+    map50, map50_95, class_maps = metrics['map50'], metrics['map50_95'], metrics['class_maps']
+
+    # 计算F1分数
+    f1_score = 2 * (precision['overall'] * recall['overall']) / \
+              (precision['overall'] + recall['overall'] + 1e-10)
+
+    # 组织类别评估指标(注意位置)
+    class_metrics = {}
+    all_classes = set(precision.keys()) - {'overall'}
+    for cls in all_classes:
+        class_f1 = 2 * (precision[cls] * recall[cls]) / \
+                  (precision[cls] + recall[cls] + 1e-10)
+
+        class_metrics[cls] = {
+            'precision': precision[cls],
+            'recall': recall[cls],
+            'f1_score': class_f1,
+            'ap': class_maps.get(cls, 0.0)
+        }
+
+    # 更新评估结果
+    eval_result.status = "completed"
+    eval_result.completed_at = datetime.datetime.utcnow()
+    eval_result.precision = precision['overall']
+    eval_result.recall = recall['overall']
+    eval_result.f1_score = f1_score
+    eval_result.mAP50 = map50
+    eval_result.mAP50_95 = map50_95
+    eval_result.class_metrics = class_metrics
+    eval_result.pr_curve_data = metrics['pr_curve_data']
+
+    # 添加日志
+    eval_result.logs = json.dumps([
+        f"Evaluation completed successfully at {datetime.datetime.utcnow()}",
+        *(extra_logs or []),
+        f"mAP@0.5: {map50:.4f}",
+        f"mAP@0.5:0.95: {map50_95:.4f}",
+        f"Overall precision: {precision['overall']:.4f}",
+        f"Overall recall: {recall['overall']:.4f}",
+        f"Overall F1 score: {f1_score:.4f}"
+    ])
+
+
+def store_failure(eval_result: EvaluationResultDB, error: str):
+    """把评估记录标记为 failed（不提交事务）"""
+    eval_result.status = "failed"
+    eval_result.error_message = error
+    eval_result.logs = json.dumps([
+        f"Evaluation failed at {datetime.datetime.utcnow()}",
+        f"Error: {error}"
+    ])
+
+
+def fail_interrupted(db) -> int:
+    """
+    服务启动时调用：评估都在服务进程内执行（后台线程、评估会话、模型评估任务），
+    上次仍为 pending / running 的评估记录已无法继续，标记为 failed，返回标记的条数
+    """
+    rows = db.query(EvaluationResultDB).filter(EvaluationResultDB.status.in_(("pending", "running"))).all()
+    for row in rows:
+        store_failure(row, "Evaluation interrupted by service restart")
+    db.commit()
+    return len(rows)
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+import asyncio
 import uuid
-import datetime
 import threading
-import json
 
 from .models import EvaluationResultDB
 from .metrics import EvaluationMetrics
+from .results import store_failure, store_metrics
+from .sessions import EVAL_SESSION_BATCH_IMAGES, EvaluationSession, evaluation_session_service
+from .model_eval import EVAL_BATCH_SIZE, ModelEvaluationConfig, model_evaluation_service
 from training.models import TrainingTaskDB
+from training.training_service import training_service
 from database import get_db  # 假设main.py中有获取数据库会话的函数
 
 router = APIRouter()
@@ -19,10 +22,12 @@ class Prediction(BaseModel):
     class_name: str
     box: List[float]  # [x1, y1, x2, y2]
     confidence: float
+    image_id: Optional[str] = None  # 所属图片；提供时只与同一张图片的真实框匹配
 
 class GroundTruth(BaseModel):
     class_name: str
     box: List[float]  # [x1, y1, x2, y2]
+    image_id: Optional[str] = None
 
 class EvaluationRequest(BaseModel):
     model_id: str
@@ -31,11 +36,32 @@ class EvaluationRequest(BaseModel):
     ground_truths: List[GroundTruth]
     iou_threshold: float = 0.5
 
+class EvaluationSessionRequest(BaseModel):
+    task_id: Optional[str] = None
+    iou_threshold: float = 0.5
+    iou_thresholds: Optional[List[float]] = None  # 参与 mAP 平均的阈值，默认 0.5:0.95
+
+class ModelEvaluationRequest(BaseModel):
+    weights: str  # 服务器上的权重路径，例如训练任务的 result_path
+    data: str  # 服务器上的 YOLO data.yaml 路径
+    split: str = "val"
+    conf: float = 0.001
+    nms_iou: float = 0.7
+    imgsz: int = 640
+    batch_size: int = EVAL_BATCH_SIZE
+    iou_threshold: float = 0.5
+    iou_thresholds: Optional[List[float]] = None
+
 class EvaluationResponse(BaseModel):
     evaluation_id: str
     status: str
     message: str
 
+def _is_per_image(eval_request: EvaluationRequest) -> bool:
+    """任一预测或真实标注带有 image_id 时按图片分组评估（COCO 方式）"""
+    return any(item.image_id is not None for item in eval_request.predictions) or \
+        any(item.image_id is not None for item in eval_request.ground_truths)
+
 # 评估服务类
 class EvaluationService:
     def __init__(self):
@@ -52,7 +78,8 @@ class EvaluationService:
             task_id=eval_request.task_id,
             status="pending",
             config={
-                "iou_threshold": eval_request.iou_threshold
+                "iou_threshold": eval_request.iou_threshold,
+                "per_image": _is_per_image(eval_request)
             }
         )
         
@@ -92,7 +119,8 @@ class EvaluationService:
                 {
                     'class': pred.class_name,
                     'box': pred.box,
-                    'confidence': pred.confidence
+                    'confidence': pred.confidence,
+                    'image_id': pred.image_id
                 }
                 for pred in eval_request.predictions
             ]
@@ -100,75 +128,23 @@ class EvaluationService:
             ground_truths = [
                 {
                     'class': gt.class_name,
-                    'box': gt.box
+                    'box': gt.box,
+                    'image_id': gt.image_id
                 }
                 for gt in eval_request.ground_truths
             ]
             
-            # 计算评估指标
-            precision, recall = EvaluationMetrics.calculate_precision_recall(
-                predictions, ground_truths, eval_request.iou_threshold
-            )
-            
-            # 计算mAP
-            map50, map50_95, class_maps = EvaluationMetrics.calculate_map(
-                predictions, ground_truths
+            # 一次匹配算出精确率 / 召回率、mAP 与 PR 曲线；带 image_id 时按图片分组并行匹配
+            metrics = EvaluationMetrics.evaluate(
+                predictions, ground_truths, eval_request.iou_threshold,
+                per_image=_is_per_image(eval_request)
             )
-            
-            # 计算F1分数
-            f1_score = 2 * (precision['overall'] * recall['overall']) / \
-                      (precision['overall'] + recall['overall'] + 1e-10)
-            
-            # 生成PR曲线数据
-            pr_curve_data = EvaluationMetrics.generate_pr_curve_data(
-                predictions, ground_truths, eval_request.iou_threshold
-            )
-            
-            # 组织类别评估指标(注意位置)
-            class_metrics = {}
-            all_classes = set(precision.keys()) - {'overall'}
-            for cls in all_classes:
-                class_f1 = 2 * (precision[cls] * recall[cls]) / \
-                          (precision[cls] + recall[cls] + 1e-10)
-                
-                class_metrics[cls] = {
-                    'precision': precision[cls],
-                    'recall': recall[cls],
-                    'f1_score': class_f1,
-                    'ap': class_maps.get(cls, 0.0)
-                }
-            
-            # 更新评估结果
-            eval_result.status = "completed"
-            eval_result.completed_at = datetime.datetime.utcnow()
-            eval_result.precision = precision['overall']
-            eval_result.recall = recall['overall']
-            eval_result.f1_score = f1_score
-            eval_result.mAP50 = map50
-            eval_result.mAP50_95 = map50_95
-            eval_result.class_metrics = class_metrics
-            eval_result.pr_curve_data = pr_curve_data
-            
-            # 添加日志
-            eval_result.logs = json.dumps([
-                f"Evaluation completed successfully at {datetime.datetime.utcnow()}",
-                f"mAP@0.5: {map50:.4f}",
-                f"mAP@0.5:0.95: {map50_95:.4f}",
-                f"Overall precision: {precision['overall']:.4f}",
-                f"Overall recall: {recall['overall']:.4f}",
-                f"Overall F1 score: {f1_score:.4f}"
-            ])
-            
+            store_metrics(eval_result, metrics)
             db.commit()
             
         except Exception as e:
             # 处理错误
-            eval_result.status = "failed"
-            eval_result.error_message = str(e)
-            eval_result.logs = json.dumps([
-                f"Evaluation failed at {datetime.datetime.utcnow()}",
-                f"Error: {str(e)}"
-            ])
+            store_failure(eval_result, str(e))
             db.commit()
         finally:
             if evaluation_id in self.running_evaluations:
@@ -266,4 +242,161 @@ def get_model_evaluations(
             }
         }
         for eval_result in evaluations
-    ]
\ No newline at end of file
+    ]
+
+# 评估会话：大规模验证集分多次以 NDJSON 推送，服务端只保存逐预测的紧凑数组
+def _get_session(model_id: str, evaluation_id: str) -> EvaluationSession:
+    session = evaluation_session_service.get_session(evaluation_id, model_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Evaluation session not found or already closed")
+    return session
+
+@router.post("/api/models/{model_id}/evaluation-sessions")
+def open_evaluation_session(
+    model_id: str,
+    session_request: EvaluationSessionRequest,
+    db: Session = Depends(get_db)
+):
+    """创建评估会话，返回的 evaluation_id 用于推送数据与 finalize"""
+    try:
+        session = evaluation_session_service.open_session(
+            db, model_id, session_request.task_id,
+            session_request.iou_threshold, session_request.iou_thresholds
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session.to_dict()
+
+@router.post("/api/models/{model_id}/evaluation-sessions/{evaluation_id}/images")
+async def push_evaluation_images(model_id: str, evaluation_id: str, request: Request):
+    """
+    以 NDJSON 请求体推送一批图片，每行一张：
+    {"image_id": "...", "predictions": [{"class_name", "box", "confidence"}], "ground_truths": [{"class_name", "box"}]}
+    请求体边接收边解析，每 AI_EVAL_SESSION_BATCH_IMAGES 行在工作线程中匹配一次；同一张图片必须在同一行内给出。
+    某行不合法时返回 400，该行所在的一批不计入，此前的批次已计入（见 accepted_images）。
+    """
+    session = _get_session(model_id, evaluation_id)
+    accepted = 0
+    line_number = 1
+    buffer = bytearray()
+    lines: List[bytes] = []
+
+    async def flush():
+        nonlocal accepted, line_number, lines
+        batch, first_line = lines, line_number
+        lines, line_number = [], line_number + len(batch)
+        try:
+            accepted += await asyncio.to_thread(evaluation_session_service.add_lines, session, batch, first_line)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}（本次请求已计入 {accepted} 张图片）")
+
+    async for chunk in request.stream():
+        buffer.extend(chunk)
+        end = buffer.rfind(b"\n")
+        if end < 0:
+            continue
+        lines.extend(bytes(buffer[:end]).split(b"\n"))
+        del buffer[:end + 1]
+        if len(lines) >= EVAL_SESSION_BATCH_IMAGES:
+            await flush()
+    if buffer.strip():
+        lines.append(bytes(buffer))
+    if lines:
+        await flush()
+    return {"accepted_images": accepted, **session.to_dict()}
+
+@router.get("/api/models/{model_id}/evaluation-sessions/{evaluation_id}")
+def get_evaluation_session(model_id: str, evaluation_id: str):
+    """查看评估会话已接收的图片、预测、真实框数量与累加器内存占用"""
+    return _get_session(model_id, evaluation_id).to_dict()
+
+@router.post("/api/models/{model_id}/evaluation-sessions/{evaluation_id}/finalize")
+def finalize_evaluation_session(
+    model_id: str,
+    evaluation_id: str,
+    db: Session = Depends(get_db)
+):
+    """结束会话并计算指标，结果写入评估记录（之后可用 /api/models/{model_id}/evaluation/{evaluation_id} 查询）"""
+    session = _get_session(model_id, evaluation_id)
+    try:
+        eval_result = evaluation_session_service.finalize(db, session)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "evaluation_id": eval_result.evaluation_id,
+        "status": eval_result.status,
+        "images": session.accumulator.images,
+        "metrics": {
+            "mAP50": eval_result.mAP50,
+            "mAP50_95": eval_result.mAP50_95,
+            "precision": eval_result.precision,
+            "recall": eval_result.recall,
+            "f1_score": eval_result.f1_score,
+            "class_metrics": eval_result.class_metrics
+        },
+        "error_message": eval_result.error_message
+    }
+
+@router.delete("/api/models/{model_id}/evaluation-sessions/{evaluation_id}")
+def cancel_evaluation_session(
+    model_id: str,
+    evaluation_id: str,
+    db: Session = Depends(get_db)
+):
+    """取消评估会话，评估记录标记为 failed"""
+    session = _get_session(model_id, evaluation_id)
+    try:
+        evaluation_session_service.cancel(db, session)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"evaluation_id": evaluation_id, "status": "failed", "message": "Evaluation session cancelled"}
+
+
+# 服务器端模型评估：在服务器上加载权重并在 data.yaml 的划分上推理，预测直接送入累加器
+@router.post("/api/models/{model_id}/evaluate/dataset", response_model=EvaluationResponse)
+def evaluate_model_on_dataset(model_id: str, eval_request: ModelEvaluationRequest):
+    """用权重文件在 YOLO 数据集划分上推理并评估，任务排队执行，结果写入评估记录"""
+    try:
+        evaluation_id = model_evaluation_service.create_job(model_id, ModelEvaluationConfig(**eval_request.dict()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "evaluation_id": evaluation_id,
+        "status": "pending",
+        "message": "Evaluation job queued"
+    }
+
+@router.get("/api/models/{model_id}/evaluation-jobs/{evaluation_id}")
+def get_model_evaluation_job(model_id: str, evaluation_id: str):
+    """查看模型评估任务的进度与吞吐（img/s）"""
+    job = model_evaluation_service.get_job(evaluation_id)
+    if job is None or job.model_id != model_id:
+        raise HTTPException(status_code=404, detail="Evaluation job not found")
+    return job.to_dict()
+
+@router.delete("/api/models/{model_id}/evaluation-jobs/{evaluation_id}")
+def cancel_model_evaluation_job(model_id: str, evaluation_id: str):
+    """取消排队中或运行中的模型评估任务"""
+    job = model_evaluation_service.get_job(evaluation_id)
+    if job is None or job.model_id != model_id:
+        raise HTTPException(status_code=404, detail="Evaluation job not found")
+    if not model_evaluation_service.cancel_job(evaluation_id):
+        raise HTTPException(status_code=409, detail="Evaluation job already finished")
+    return {"evaluation_id": evaluation_id, "message": "Cancellation requested"}
+
+@router.post("/api/training/tasks/{task_id}/evaluate", response_model=EvaluationResponse)
+def evaluate_training_task(task_id: str, split: str = "val"):
+    """在训练任务使用的 data.yaml 上评估其结果权重（model_id 为训练任务 ID）"""
+    task = training_service.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="训练任务不存在")
+    try:
+        config = model_evaluation_service.training_task_config(task, split)
+        evaluation_id = model_evaluation_service.create_job(task_id, config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "evaluation_id": evaluation_id,
+        "status": "pending",
+        "message": "Evaluation job queued"
+    }
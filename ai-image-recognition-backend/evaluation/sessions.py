@@ -0,0 +1,182 @@
+"""
+评估会话：创建会话后分多次推送 NDJSON（每行一张图片的预测与真实标注），最后 finalize 计算指标并写入 evaluation_results。
+每批图片推送时即完成匹配，会话只保存 EvaluationAccumulator 中的紧凑数组，不保留请求体、框坐标或字典。
+会话的 evaluation_id 即评估记录的 ID，finalize 之后可用 /api/models/{model_id}/evaluation/{evaluation_id} 查询。
+有未结束的会话时，后台线程定期结束过期会话，释放其累加器并把评估记录标记为 failed。
+"""
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from .accumulator import EvaluationAccumulator
+from .models import EvaluationResultDB
+from .results import store_failure, store_metrics
+
+# 会话超过该时长（秒）没有推送即过期，评估记录标记为 failed
+EVAL_SESSION_TTL_SECONDS = int(os.getenv("AI_EVAL_SESSION_TTL_SECONDS", "3600"))
+# 推送时每解析多少行（图片）匹配一次，控制单批临时数组的大小
+EVAL_SESSION_BATCH_IMAGES = int(os.getenv("AI_EVAL_SESSION_BATCH_IMAGES", "1000"))
+# 后台检查过期会话的间隔（秒）
+EVAL_SESSION_REAP_SECONDS = int(os.getenv("AI_EVAL_SESSION_REAP_SECONDS", "60"))
+
+
+@dataclass
+class EvaluationSession:
+    """一个进行中的评估会话"""
+    evaluation_id: str
+    model_id: str
+    accumulator: EvaluationAccumulator
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    closed: bool = False
+    # 同一会话的推送与 finalize 串行执行
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def to_dict(self):
+        accumulator = self.accumulator
+        return {
+            "evaluation_id": self.evaluation_id,
+            "model_id": self.model_id,
+            "status": "closed" if self.closed else "open",
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "images": accumulator.images,
+            "predictions": accumulator.n_predictions,
+            "ground_truths": accumulator.n_ground_truths,
+            "classes": len(accumulator.class_ids),
+            "memory_bytes": accumulator.nbytes,
+        }
+
+
+class EvaluationSessionService:
+    """评估会话管理"""
+
+    def __init__(self):
+        self.sessions: Dict[str, EvaluationSession] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def open_session(
+        self, db: Session, model_id: str, task_id: Optional[str] = None,
+        iou_threshold: float = 0.5, iou_thresholds: Optional[Sequence[float]] = None,
+    ) -> EvaluationSession:
+        """创建会话与状态为 running 的评估记录；阈值不合法时抛出 ValueError"""
+        self.expire_sessions(db)
+        accumulator = EvaluationAccumulator(iou_threshold, iou_thresholds)
+        evaluation_id = str(uuid.uuid4())
+        db.add(EvaluationResultDB(
+            evaluation_id=evaluation_id,
+            model_id=model_id,
+            task_id=task_id,
+            status="running",
+            config={
+                "iou_threshold": iou_threshold,
+                "iou_thresholds": accumulator.iou_thresholds,
+                "per_image": True,
+                "mode": "session"
+            }
+        ))
+        db.commit()
+        session = EvaluationSession(evaluation_id=evaluation_id, model_id=model_id, accumulator=accumulator)
+        with self._lock:
+            self.sessions[evaluation_id] = session
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="eval-session-reaper", daemon=True)
+                self._reaper.start()
+        return session
+
+    def get_session(self, evaluation_id: str, model_id: str) -> Optional[EvaluationSession]:
+        """返回未结束、未过期的会话"""
+        session = self.sessions.get(evaluation_id)
+        if session is None or session.model_id != model_id or session.closed or self._is_expired(session):
+            return None
+        return session
+
+    def add_lines(self, session: EvaluationSession, lines: List[bytes], first_line: int = 1) -> int:
+        """追加一批 NDJSON 行（在工作线程中调用），返回图片数；行不合法或会话已结束时抛出 ValueError"""
+        with session.lock:
+            if session.closed:
+                raise ValueError("评估会话已结束")
+            images = session.accumulator.add_lines(lines, first_line)
+            session.updated_at = datetime.utcnow()
+            return images
+
+    def finalize(self, db: Session, session: EvaluationSession) -> EvaluationResultDB:
+        """结束会话，计算指标并写入评估记录；会话已结束时抛出 ValueError"""
+        self._close(session)
+        eval_result = self._result(db, session)
+        accumulator = session.accumulator
+        try:
+            store_metrics(eval_result, accumulator.metrics(), extra_logs=[
+                f"Images: {accumulator.images}, predictions: {accumulator.n_predictions}, "
+                f"ground truths: {accumulator.n_ground_truths}"
+            ])
+        except Exception as e:
+            store_failure(eval_result, str(e))
+        db.commit()
+        db.refresh(eval_result)
+        print(f"✅ 评估会话 {session.evaluation_id} 结束: {eval_result.status}，{accumulator.images} 张图片")
+        return eval_result
+
+    def cancel(self, db: Session, session: EvaluationSession):
+        self._close(session)
+        store_failure(self._result(db, session), "Evaluation session cancelled")
+        db.commit()
+
+    def expire_sessions(self, db: Session):
+        """结束超时未推送的会话，评估记录标记为 failed"""
+        for session in [session for session in list(self.sessions.values()) if self._is_expired(session)]:
+            try:
+                self._close(session)
+            except ValueError:
+                continue
+            store_failure(self._result(db, session), "Evaluation session expired")
+            db.commit()
+            print(f"⚠️ 评估会话 {session.evaluation_id} 超过 {EVAL_SESSION_TTL_SECONDS} 秒未推送，已过期")
+
+    def _reap_loop(self):
+        """后台线程：每 EVAL_SESSION_REAP_SECONDS 秒结束过期会话，没有会话时退出（下次创建会话时重新启动）"""
+        while True:
+            time.sleep(min(EVAL_SESSION_REAP_SECONDS, EVAL_SESSION_TTL_SECONDS))
+            with self._lock:
+                if not self.sessions:
+                    self._reaper = None
+                    return
+            db = SessionLocal()
+            try:
+                self.expire_sessions(db)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ 清理过期评估会话失败: {e}")
+            finally:
+                db.close()
+
+    def _close(self, session: EvaluationSession):
+        # 等待进行中的推送完成后再结束会话
+        with session.lock:
+            if session.closed:
+                raise ValueError("评估会话已结束")
+            session.closed = True
+        with self._lock:
+            self.sessions.pop(session.evaluation_id, None)
+
+    @staticmethod
+    def _is_expired(session: EvaluationSession) -> bool:
+        return datetime.utcnow() - session.updated_at > timedelta(seconds=EVAL_SESSION_TTL_SECONDS)
+
+    @staticmethod
+    def _result(db: Session, session: EvaluationSession) -> EvaluationResultDB:
+        return db.query(EvaluationResultDB).filter(
+            EvaluationResultDB.evaluation_id == session.evaluation_id
+        ).one()
+
+
+# 全局评估会话服务实例
+evaluation_session_service = EvaluationSessionService()
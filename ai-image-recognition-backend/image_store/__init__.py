@@ -0,0 +1 @@
+# 图片去重与按内容寻址的原图存储模块初始化文件
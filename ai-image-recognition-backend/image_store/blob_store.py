@@ -0,0 +1,50 @@
+"""
+按内容寻址的原图存储：文件路径由内容的 SHA-256 决定（{root}/ab/cd/abcd...），
+同一内容只写一次；先写临时文件再原子改名，并发写入同一内容也不会得到半个文件。
+"""
+import os
+import tempfile
+from typing import Optional
+
+# 原图存储目录；AI_IMAGE_STORE_ENABLED=false 时只记录哈希，不保存原图
+IMAGE_STORE_DIR = os.getenv("AI_IMAGE_STORE_DIR", "image_store_data")
+IMAGE_STORE_ENABLED = os.getenv("AI_IMAGE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class BlobStore:
+    def __init__(self, root: str = IMAGE_STORE_DIR, enabled: bool = IMAGE_STORE_ENABLED):
+        self.root = root
+        self.enabled = enabled
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path_for(content_hash))
+
+    def put(self, content_hash: str, data: bytes) -> bool:
+        """保存原图，已存在时不重复写入；返回本次是否写入了新文件"""
+        if not self.enabled:
+            return False
+        path = self.path_for(content_hash)
+        if os.path.exists(path):
+            return False
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def get_path(self, content_hash: str) -> Optional[str]:
+        path = self.path_for(content_hash)
+        return path if os.path.exists(path) else None
+
+
+blob_store = BlobStore()
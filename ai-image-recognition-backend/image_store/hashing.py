@@ -0,0 +1,64 @@
+"""
+图片指纹：内容哈希（SHA-256，判断完全相同）与 64 位差异哈希 dHash（判断近重复，如重新压缩、缩放后的同一张图）。
+dHash 按 4 段 16 位拆分：汉明距离不超过 3 的两个哈希至少有一段完全相同（抽屉原理），
+因此近重复查找只需按各段做等值查询（有索引）再精确计算距离，不必扫描全部图片。
+"""
+import io
+from typing import List, NamedTuple, Optional
+
+from PIL import Image as PILImage
+
+from inference.result_cache import image_digest
+
+# dHash 的分段数与每段位数；可保证查全的最大汉明距离为 HASH_BANDS - 1
+HASH_BANDS = 4
+BAND_BITS = 16
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+
+class Fingerprint(NamedTuple):
+    content_hash: str
+    size_bytes: int
+    width: Optional[int]
+    height: Optional[int]
+    dhash: Optional[int]  # 0 ~ 2^64-1，无法解码的图片为 None
+
+
+def dhash(image: PILImage.Image) -> int:
+    """缩放为 9x8 灰度图，比较每行相邻像素的明暗，得到 64 位哈希"""
+    pixels = list(image.convert("L").resize((9, 8), PILImage.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def fingerprint(image_bytes: bytes) -> Fingerprint:
+    """计算图片指纹；JPEG 用 draft 模式按缩小的尺寸解码，比完整解码快得多"""
+    try:
+        with PILImage.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+            image.draft("L", (64, 64))
+            value = dhash(image)
+    except Exception:
+        width = height = value = None
+    return Fingerprint(image_digest(image_bytes), len(image_bytes), width, height, value)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def hash_bands(value: int) -> List[int]:
+    """从高位到低位的 4 段 16 位"""
+    return [(value >> (BAND_BITS * (HASH_BANDS - 1 - i))) & _BAND_MASK for i in range(HASH_BANDS)]
+
+
+def to_signed64(value: int) -> int:
+    """数据库的 BIGINT / SQLite INTEGER 是有符号 64 位"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
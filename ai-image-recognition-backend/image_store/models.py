@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, ForeignKey, Index, UniqueConstraint
+from database import Base
+from datetime import datetime
+
+class ImageBlob(Base):
+    """
+    按内容寻址的原图：同一内容（SHA-256）只存一份，不同文件名的图片记录通过 images.content_hash 引用它。
+    dhash 为 64 位差异哈希（按有符号 64 位整数存储），band0~band3 为它的 4 段 16 位，用于近重复查找
+    """
+    __tablename__ = "image_blobs"
+    __table_args__ = tuple(Index(f"ix_image_blobs_band{i}", f"band{i}") for i in range(4))
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    size_bytes = Column(Integer)
+    width = Column(Integer)
+    height = Column(Integer)
+    dhash = Column(BigInteger, nullable=True)
+    band0 = Column(Integer, nullable=True)
+    band1 = Column(Integer, nullable=True)
+    band2 = Column(Integer, nullable=True)
+    band3 = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class BlobResult(Base):
+    """某张原图用某个工具、模型与权重版本推理的结果，内容相同（或近重复）的图片再次上传时直接复用"""
+    __tablename__ = "image_blob_results"
+    __table_args__ = (UniqueConstraint("blob_id", "tool", "model_name", "model_version", name="uq_image_blob_results_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    blob_id = Column(Integer, ForeignKey("image_blobs.id"), nullable=False)
+    tool = Column(String, nullable=False)
+    model_name = Column(String, nullable=False)
+    model_version = Column(String, nullable=False)
+    result = Column(JSON)  # {"annotations": [...], "render_boxes": {...} 或 null}
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,56 @@
+import asyncio
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from .blob_store import blob_store
+from .models import BlobResult, ImageBlob
+from .service import dedup_service
+
+router = APIRouter(prefix="/api/image-store", tags=["image-store"])
+
+_CONTENT_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+
+@router.get("/blobs/{content_hash}")
+async def get_blob(content_hash: str):
+    """按内容哈希下载原图"""
+    if not _CONTENT_HASH.match(content_hash):
+        raise HTTPException(status_code=400, detail="content_hash 应为 64 位十六进制 SHA-256")
+    path = await asyncio.to_thread(blob_store.get_path, content_hash)
+    if path is None:
+        raise HTTPException(status_code=404, detail="原图不存在")
+    return FileResponse(path, media_type="application/octet-stream")
+
+
+@router.get("/images/{image_id}/duplicates")
+async def get_image_duplicates(
+    image_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """列出与某张图片内容相同（exact）和近重复（near，含 dHash 汉明距离）的其他图片"""
+    result = await db.run_sync(dedup_service.duplicates, image_id, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return result
+
+
+@router.get("/stats")
+async def image_store_stats(db: AsyncSession = Depends(get_async_db)):
+    """原图与已保存推理结果的数量"""
+    blobs = await db.scalar(select(func.count()).select_from(ImageBlob))
+    total_bytes = await db.scalar(select(func.coalesce(func.sum(ImageBlob.size_bytes), 0)))
+    results = await db.scalar(select(func.count()).select_from(BlobResult))
+    return {
+        "blobs": blobs,
+        "total_bytes": total_bytes,
+        "results": results,
+        "store_enabled": blob_store.enabled,
+        "max_distance": dedup_service.max_distance,
+        "reuse_near": dedup_service.reuse_near,
+    }
@@ -0,0 +1,217 @@
+"""
+图片去重服务：登记上传图片的内容哈希与 dHash，查找完全相同与近重复的已有图片，
+并按原图保存 / 复用推理结果。数据库操作均为同步函数且不提交，由调用方（AsyncSession.run_sync）放在同一事务中。
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from annotations.models import Image
+from .hashing import HASH_BANDS, Fingerprint, from_signed64, hamming, hash_bands, to_signed64
+from .models import BlobResult, ImageBlob
+
+# 是否登记图片指纹并复用重复图片的推理结果
+DEDUP_ENABLED = os.getenv("AI_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# 近重复的最大汉明距离（64 位 dHash），受分段数限制最大为 HASH_BANDS - 1
+DEDUP_MAX_DISTANCE = min(int(os.getenv("AI_DEDUP_MAX_DISTANCE", "3")), HASH_BANDS - 1)
+# 近重复图片是否也复用推理结果（检测框按两张图片的尺寸比例换算）；
+# 近重复的图片内容仍可能不同（裁剪、局部修改），默认关闭，只复用内容完全相同的图片的结果
+DEDUP_REUSE_NEAR = os.getenv("AI_DEDUP_REUSE_NEAR", "false").lower() in ("1", "true", "yes")
+# 单次近重复查找最多比较的候选数（纯色等低信息量图片的哈希会集中在少数分段上）
+DEDUP_CANDIDATE_LIMIT = int(os.getenv("AI_DEDUP_CANDIDATE_LIMIT", "10000"))
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+@dataclass
+class NearMatch:
+    blob_id: int
+    content_hash: str
+    distance: int
+    width: Optional[int]
+    height: Optional[int]
+
+
+@dataclass
+class DedupResult:
+    """一次上传的去重结果"""
+    blob_id: int
+    content_hash: str
+    width: Optional[int]
+    height: Optional[int]
+    exact: bool  # 相同内容此前已上传过
+    created: bool  # 本次新登记的原图（需要写入原图存储）
+    near: Optional[NearMatch] = None  # 最相近的另一张原图（仅新内容时查找）
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "content_hash": self.content_hash,
+            "duplicate": "exact" if self.exact else ("near" if self.near else None),
+            "near_duplicate_of": self.near.content_hash if self.near else None,
+            "distance": self.near.distance if self.near else None,
+        }
+
+
+class DedupService:
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE, reuse_near: bool = DEDUP_REUSE_NEAR):
+        self.max_distance = max_distance
+        self.reuse_near = reuse_near
+
+    def find_near(
+        self, db: Session, value: int, max_distance: Optional[int] = None, exclude_id: Optional[int] = None
+    ) -> List[NearMatch]:
+        """按 dHash 分段的等值索引取候选，再精确计算汉明距离，按距离从小到大返回"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        bands = hash_bands(value)
+        stmt = select(
+            ImageBlob.id, ImageBlob.content_hash, ImageBlob.dhash, ImageBlob.width, ImageBlob.height
+        ).where(
+            or_(*[getattr(ImageBlob, f"band{i}") == band for i, band in enumerate(bands)])
+        ).limit(DEDUP_CANDIDATE_LIMIT)
+        matches = []
+        for blob_id, content_hash, stored, width, height in db.execute(stmt):
+            if blob_id == exclude_id or stored is None:
+                continue
+            distance = hamming(value, from_signed64(stored))
+            if distance <= max_distance:
+                matches.append(NearMatch(blob_id, content_hash, distance, width, height))
+        matches.sort(key=lambda match: (match.distance, match.blob_id))
+        return matches
+
+    def register(self, db: Session, fp: Fingerprint) -> DedupResult:
+        """登记原图（不提交）：内容已存在时返回已有记录，否则新建记录并查找最相近的近重复图片"""
+        existing = db.execute(
+            select(ImageBlob.id, ImageBlob.width, ImageBlob.height).where(ImageBlob.content_hash == fp.content_hash)
+        ).first()
+        if existing is not None:
+            return DedupResult(existing.id, fp.content_hash, existing.width, existing.height, exact=True, created=False)
+
+        near = None
+        if fp.dhash is not None:
+            matches = self.find_near(db, fp.dhash)
+            near = matches[0] if matches else None
+        values = {
+            "content_hash": fp.content_hash,
+            "size_bytes": fp.size_bytes,
+            "width": fp.width,
+            "height": fp.height,
+        }
+        if fp.dhash is not None:
+            values["dhash"] = to_signed64(fp.dhash)
+            values.update({f"band{i}": band for i, band in enumerate(hash_bands(fp.dhash))})
+
+        dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            # 并发上传同一内容时只有一个请求插入成功，其他请求按已存在处理
+            stmt = dialect_insert(ImageBlob).values(**values).on_conflict_do_nothing(index_elements=[ImageBlob.content_hash])
+            created = db.execute(stmt.returning(ImageBlob.id)).scalar() is not None
+            blob_id = db.scalar(select(ImageBlob.id).where(ImageBlob.content_hash == fp.content_hash))
+        else:
+            blob = ImageBlob(**values)
+            db.add(blob)
+            db.flush()
+            blob_id, created = blob.id, True
+        return DedupResult(blob_id, fp.content_hash, fp.width, fp.height, exact=not created, created=created, near=near)
+
+    def find_result(
+        self, db: Session, dedup: DedupResult, tool: str, model_name: str, version: str
+    ) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """查找可复用的推理结果，返回 (结果, 是否来自近重复图片)；近重复的检测框已换算到本图尺寸"""
+        candidates = [dedup.blob_id]
+        if dedup.near is not None and self.reuse_near:
+            candidates.append(dedup.near.blob_id)
+        rows = dict(db.execute(
+            select(BlobResult.blob_id, BlobResult.result).where(
+                BlobResult.blob_id.in_(candidates),
+                BlobResult.tool == tool,
+                BlobResult.model_name == model_name,
+                BlobResult.model_version == version,
+            )
+        ).all())
+        if dedup.blob_id in rows:
+            return rows[dedup.blob_id], False
+        if dedup.near is not None and dedup.near.blob_id in rows:
+            result = dict(rows[dedup.near.blob_id])
+            result["render_boxes"] = scale_render_boxes(
+                result.get("render_boxes"), (dedup.near.width, dedup.near.height), (dedup.width, dedup.height)
+            )
+            return result, True
+        return None
+
+    def save_result(self, db: Session, blob_id: int, tool: str, model_name: str, version: str, result: Dict[str, Any]):
+        """保存原图的推理结果（不提交）；同一键已有结果时保留已有的"""
+        values = {"blob_id": blob_id, "tool": tool, "model_name": model_name, "model_version": version, "result": result}
+        dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            db.execute(dialect_insert(BlobResult).values(**values).on_conflict_do_nothing(
+                index_elements=["blob_id", "tool", "model_name", "model_version"]
+            ))
+            return
+        exists = db.scalar(select(BlobResult.id).where(
+            BlobResult.blob_id == blob_id, BlobResult.tool == tool,
+            BlobResult.model_name == model_name, BlobResult.model_version == version,
+        ))
+        if exists is None:
+            db.add(BlobResult(**values))
+            db.flush()
+
+    def duplicates(self, db: Session, image_id: int, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """列出与某张图片内容相同和近重复的其他图片记录；图片不存在时返回 None"""
+        image = db.get(Image, image_id)
+        if image is None:
+            return None
+        result = {"image_id": image.id, "filename": image.filename, "content_hash": image.content_hash, "exact": [], "near": []}
+        if not image.content_hash:
+            return result
+        result["exact"] = [
+            {"image_id": other_id, "filename": filename}
+            for other_id, filename in db.execute(
+                select(Image.id, Image.filename)
+                .where(Image.content_hash == image.content_hash, Image.id != image.id)
+                .order_by(Image.id).limit(limit)
+            )
+        ]
+        blob = db.execute(
+            select(ImageBlob.id, ImageBlob.dhash).where(ImageBlob.content_hash == image.content_hash)
+        ).first()
+        if blob is None or blob.dhash is None:
+            return result
+        matches = self.find_near(db, from_signed64(blob.dhash), exclude_id=blob.id)[:limit]
+        distances = {match.content_hash: match.distance for match in matches}
+        if distances:
+            rows = db.execute(
+                select(Image.id, Image.filename, Image.content_hash)
+                .where(Image.content_hash.in_(list(distances)))
+                .order_by(Image.id).limit(limit)
+            )
+            result["near"] = sorted(
+                (
+                    {"image_id": other_id, "filename": filename, "content_hash": content_hash,
+                     "distance": distances[content_hash]}
+                    for other_id, filename, content_hash in rows
+                ),
+                key=lambda item: (item["distance"], item["image_id"]),
+            )
+        return result
+
+
+def scale_render_boxes(
+    render_boxes: Optional[Dict[str, Any]], source_size: Sequence[Optional[int]], target_size: Sequence[Optional[int]]
+) -> Optional[Dict[str, Any]]:
+    """把检测绘制数据的像素坐标从一张图片的尺寸换算到另一张（近重复图片可能被缩放过）"""
+    if not render_boxes or None in source_size or None in target_size or tuple(source_size) == tuple(target_size):
+        return render_boxes
+    sx = target_size[0] / source_size[0]
+    sy = target_size[1] / source_size[1]
+    return {
+        **render_boxes,
+        "xyxy": [[x1 * sx, y1 * sy, x2 * sx, y2 * sy] for x1, y1, x2, y2 in render_boxes["xyxy"]],
+    }
+
+
+dedup_service = DedupService()
@@ -0,0 +1 @@
+# 推理基础设施：模型注册表（按需加载）、模型缓存、微批调度、推理线程池、分类引擎与推理结果缓存
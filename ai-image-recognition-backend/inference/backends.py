@@ -0,0 +1,214 @@
+"""
+推理后端：把已登记的 PyTorch 模型导出为 ONNX 或 TorchScript，按权重哈希缓存到磁盘，
+再用 onnxruntime / TorchScript 提供 CPU 推理；导出或一致性校验失败时回退到 eager PyTorch。
+
+AI_INFERENCE_BACKEND=eager|onnx|torchscript 选择后端，默认 eager（不导出）。
+"""
+import hashlib
+import inspect
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+
+from .executor import THREADS_PER_WORKER
+
+_BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+INFERENCE_BACKEND = os.getenv("AI_INFERENCE_BACKEND", "eager").lower()
+# 导出产物的缓存目录，文件名带权重哈希，权重变化后会重新导出
+EXPORT_CACHE_DIR = Path(os.getenv("AI_EXPORT_CACHE_DIR", str(_BACKEND_ROOT / "models" / "exported")))
+# onnxruntime 的 intra-op 线程数（只作用于各自的会话），默认按推理线程数平均分配 CPU 核
+ORT_INTRA_OP_THREADS = int(os.getenv("AI_ORT_INTRA_OP_THREADS", str(THREADS_PER_WORKER)))
+# 导出模型与 eager 模型输出的允许误差：|导出 - eager| <= atol + rtol * |eager|
+PARITY_ATOL = float(os.getenv("AI_EXPORT_PARITY_ATOL", "1e-3"))
+PARITY_RTOL = float(os.getenv("AI_EXPORT_PARITY_RTOL", "1e-3"))
+
+# 每个模型实际使用的后端、导出产物与一致性校验结果
+BACKEND_INFO: Dict[str, Dict[str, Any]] = {}
+_export_lock = threading.Lock()
+
+
+def weight_hash(module: torch.nn.Module) -> str:
+    """按 state_dict 的参数名与数值计算权重哈希"""
+    digest = hashlib.sha256()
+    for key, tensor in module.state_dict().items():
+        digest.update(key.encode("utf-8"))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _first_tensor(output):
+    """检测模型可能返回 (tensor, ...) 元组，一致性校验只比较第一个张量。"""
+    while isinstance(output, (list, tuple)):
+        output = output[0]
+    return output
+
+
+class OnnxModule:
+    """用 onnxruntime 执行导出的 ONNX 图，调用方式与 nn.Module 相同（输入输出均为 torch 张量）"""
+
+    def __init__(self, path: Path, intra_op_threads: int = ORT_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.memory_bytes = path.stat().st_size
+        # 产物文件名带权重哈希，直接作为权重版本号
+        self.weight_version = path.stem
+
+    def __call__(self, input_batch: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(None, {self.input_name: input_batch.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+    def eval(self):
+        return self
+
+
+def _artifact_path(name: str, digest: str, suffix: str) -> Path:
+    EXPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return EXPORT_CACHE_DIR / f"{name}-{digest}{suffix}"
+
+
+def export_onnx(module: torch.nn.Module, name: str, sample_input: torch.Tensor) -> Path:
+    """导出为 ONNX（批次维度为动态），已存在相同权重哈希的产物时直接复用。"""
+    path = _artifact_path(name, weight_hash(module), ".onnx")
+    with _export_lock:
+        if not path.exists():
+            tmp_path = path.with_suffix(".onnx.tmp")
+            export_kwargs = {}
+            if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                # 新版 torch 默认走 dynamo 导出器（依赖 onnxscript），这里固定使用基于 trace 的导出器
+                export_kwargs["dynamo"] = False
+            torch.onnx.export(
+                module, sample_input, str(tmp_path),
+                input_names=["input"], output_names=["output"],
+                dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+                opset_version=17,
+                **export_kwargs,
+            )
+            os.replace(tmp_path, path)
+    return path
+
+
+def export_torchscript(module: torch.nn.Module, name: str, sample_input: torch.Tensor) -> Path:
+    """用 torch.jit.trace 导出 TorchScript，已存在相同权重哈希的产物时直接复用。"""
+    path = _artifact_path(name, weight_hash(module), ".ts")
+    with _export_lock:
+        if not path.exists():
+            tmp_path = path.with_suffix(".ts.tmp")
+            with torch.no_grad():
+                torch.jit.trace(module, sample_input).save(str(tmp_path))
+            os.replace(tmp_path, path)
+    return path
+
+
+def check_parity(
+    eager, exported, sample_input: torch.Tensor, atol: float = PARITY_ATOL, rtol: float = PARITY_RTOL
+) -> Dict[str, Any]:
+    """对同一输入比较 eager 与导出模型的输出，返回最大绝对误差及是否在容差内。"""
+    with torch.no_grad():
+        expected = _first_tensor(eager(sample_input)).detach().cpu().numpy()
+        actual = _first_tensor(exported(sample_input)).detach().cpu().numpy()
+    if expected.shape != actual.shape:
+        return {"passed": False, "max_abs_diff": None, "reason": f"输出形状不一致: {expected.shape} vs {actual.shape}"}
+    max_abs_diff = float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+    passed = bool(np.allclose(actual, expected, rtol=rtol, atol=atol))
+    return {"passed": passed, "max_abs_diff": max_abs_diff, "atol": atol, "rtol": rtol}
+
+
+def _record(name: str, backend: str, artifact: Optional[Path] = None, parity: Optional[Dict] = None, error: Optional[str] = None):
+    BACKEND_INFO[name] = {
+        "backend": backend,
+        "artifact": str(artifact) if artifact else None,
+        "parity": parity,
+        "error": error,
+    }
+
+
+def _export_allowed(name: str, backend: str) -> bool:
+    if backend == "eager":
+        _record(name, "eager")
+        return False
+    if torch.cuda.is_available():
+        # 导出后端只针对 CPU 推理节点
+        _record(name, "eager", error="检测到 CUDA，保持 eager 推理")
+        return False
+    return True
+
+
+def serve_module(name: str, module: torch.nn.Module, sample_input: torch.Tensor, backend: str = INFERENCE_BACKEND):
+    """
+    为普通 nn.Module（如分类模型）选择推理后端。
+    返回可直接调用的模型：导出成功且通过一致性校验时为导出模型，否则为原 eager 模型。
+    """
+    if not _export_allowed(name, backend):
+        return module
+    module = module.eval()
+    try:
+        if backend == "onnx":
+            artifact = export_onnx(module, name, sample_input)
+            exported = OnnxModule(artifact)
+        elif backend == "torchscript":
+            artifact = export_torchscript(module, name, sample_input)
+            exported = torch.jit.load(str(artifact)).eval()
+        else:
+            raise ValueError(f"未知的推理后端: {backend}")
+
+        parity = check_parity(module, exported, sample_input)
+        if not parity["passed"]:
+            raise ValueError(f"导出模型与 eager 输出不一致: {parity}")
+        _record(name, backend, artifact, parity)
+        print(f"✅ {name} 使用 {backend} 后端推理 ({artifact.name})")
+        return exported
+    except Exception as e:
+        _record(name, "eager", error=str(e))
+        print(f"⚠️ {name} 导出 {backend} 失败，回退到 eager PyTorch: {e}")
+        return module
+
+
+def serve_yolo(name: str, yolo_model, backend: str = INFERENCE_BACKEND, imgsz: int = 640):
+    """
+    为 ultralytics YOLO 模型选择推理后端：用 ultralytics 自带的导出器导出，
+    产物按权重哈希缓存，再以 YOLO(产物路径) 加载，调用接口与原模型一致。
+    """
+    if not _export_allowed(name, backend):
+        return yolo_model
+    try:
+        from ultralytics import YOLO
+
+        if backend not in ("onnx", "torchscript"):
+            raise ValueError(f"未知的推理后端: {backend}")
+        eager_module = yolo_model.model.eval()
+        suffix = ".onnx" if backend == "onnx" else ".torchscript"
+        artifact = _artifact_path(name, weight_hash(eager_module), suffix)
+        with _export_lock:
+            if not artifact.exists():
+                exported_path = yolo_model.export(format=backend, imgsz=imgsz, dynamic=True)
+                shutil.move(str(exported_path), str(artifact))
+
+        sample_input = torch.rand(1, 3, imgsz, imgsz)
+        if backend == "onnx":
+            parity = check_parity(eager_module, OnnxModule(artifact), sample_input)
+        else:
+            parity = check_parity(eager_module, torch.jit.load(str(artifact)).eval(), sample_input)
+        if not parity["passed"]:
+            raise ValueError(f"导出模型与 eager 输出不一致: {parity}")
+
+        exported = YOLO(str(artifact), task=yolo_model.task)
+        exported.memory_bytes = artifact.stat().st_size
+        exported.weight_version = artifact.stem
+        _record(name, backend, artifact, parity)
+        print(f"✅ {name} 使用 {backend} 后端推理 ({artifact.name})")
+        return exported
+    except Exception as e:
+        _record(name, "eager", error=str(e))
+        print(f"⚠️ {name} 导出 {backend} 失败，回退到 eager PyTorch: {e}")
+        return yolo_model
@@ -0,0 +1,129 @@
+"""
+动态微批调度：按模型分别排队并发请求，凑满 max_batch_size 张或等待超过 max_wait_ms
+后合成一个批次，只做一次前向推理，再把结果分发回各个请求。
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+# 单个批次的最大图片数与最长等待时间（毫秒）
+BATCH_MAX_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("AI_BATCH_MAX_WAIT_MS", "10"))
+
+
+class _BatchStats:
+    """单个模型队列的批次统计"""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.errors = 0
+
+    def record(self, size: int, delays: List[float]):
+        self.batches += 1
+        self.items += size
+        self.total_queue_delay += sum(delays)
+        self.max_queue_delay = max(self.max_queue_delay, max(delays))
+
+    def to_dict(self, max_batch_size: int, pending: int) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "pending": pending,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_fill_ratio": self.items / (self.batches * max_batch_size) if self.batches else 0.0,
+            "avg_queue_delay_ms": self.total_queue_delay / self.items * 1000 if self.items else 0.0,
+            "max_queue_delay_ms": self.max_queue_delay * 1000,
+        }
+
+
+class BatchScheduler:
+    """
+    按 key（通常是模型名）分队列的微批调度器。
+
+    batch_fn(key, items) 接收同一模型的一批输入，按相同顺序返回结果列表。
+    每个 key 由一个后台线程负责组批与推理，调用方拿到 Future 等待结果。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[str, List[Any]], List[Any]],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queues: Dict[str, queue.Queue] = {}
+        self._stats: Dict[str, _BatchStats] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, item: Any) -> Future:
+        """把一条请求放入 key 对应的队列，返回可等待的 Future。"""
+        future = Future()
+        self._get_queue(key).put((item, future, time.perf_counter()))
+        return future
+
+    def _get_queue(self, key: str) -> queue.Queue:
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                q = queue.Queue()
+                self._queues[key] = q
+                self._stats[key] = _BatchStats()
+                worker = threading.Thread(target=self._dispatch_loop, args=(key, q), daemon=True)
+                worker.start()
+            return q
+
+    def _collect_batch(self, q: queue.Queue) -> List[tuple]:
+        """阻塞等待第一条请求，然后在等待窗口内继续收集，直到批次满或超时。"""
+        batch = [q.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(q.get_nowait())
+                else:
+                    batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self, key: str, q: queue.Queue):
+        stats = self._stats[key]
+        while True:
+            batch = self._collect_batch(q)
+            started = time.perf_counter()
+            stats.record(len(batch), [started - enqueued for _, _, enqueued in batch])
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(key, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"批处理返回 {len(results)} 个结果，期望 {len(items)} 个")
+            except Exception as e:
+                stats.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回每个模型队列的批次填充率与排队延迟。"""
+        with self._lock:
+            keys = list(self._queues.keys())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queues": {
+                key: self._stats[key].to_dict(self.max_batch_size, self._queues[key].qsize())
+                for key in keys
+            },
+        }
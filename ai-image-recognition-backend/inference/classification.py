@@ -0,0 +1,102 @@
+"""
+图像分类引擎：ImageNet 标签与预处理流水线只构建一次，模型常驻推理设备并处于 eval 模式，
+支持一次前向推理处理多张图片。
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import cv2
+import torch
+from PIL import Image
+
+from .imaging import load_image
+
+_BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+# ImageNet 类别标签文件，默认使用后端目录下的 imagenet_classes.txt（不依赖启动时的工作目录）
+IMAGENET_CLASSES_PATH = os.getenv("IMAGENET_CLASSES_PATH", str(_BACKEND_ROOT / "imagenet_classes.txt"))
+
+
+def build_preprocess():
+    """ImageNet 分类模型的标准预处理流水线"""
+    import torchvision.transforms as transforms
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+
+def bgr_to_pil(image) -> Image.Image:
+    """把图片（BGR ndarray、字节或路径）转为 RGB 的 PIL 图像"""
+    return Image.fromarray(cv2.cvtColor(load_image(image), cv2.COLOR_BGR2RGB))
+
+
+class ClassificationEngine:
+    """分类推理引擎"""
+
+    def __init__(self, registry, device, labels_path: str = IMAGENET_CLASSES_PATH, default_model: str = "ResNet"):
+        self.registry = registry
+        self.device = device
+        self.labels_path = labels_path
+        self.default_model = default_model
+        self._labels: Optional[List[str]] = None
+        self._preprocess = None
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self) -> List[str]:
+        """ImageNet 类别标签，首次访问时读取一次；文件不存在时抛出 FileNotFoundError。"""
+        if self._labels is None:
+            with self._lock:
+                if self._labels is None:
+                    with open(self.labels_path, 'r') as f:
+                        self._labels = [s.strip() for s in f.readlines()]
+        return self._labels
+
+    @property
+    def preprocess(self):
+        """图像预处理流水线，只构建一次"""
+        if self._preprocess is None:
+            self._preprocess = build_preprocess()
+        return self._preprocess
+
+    def get_model(self, model_name: Optional[str] = None):
+        """取分类模型，未登记的模型名回退到默认模型；加载失败时抛出 RuntimeError。"""
+        if not self.registry.has(model_name, "classification"):
+            model_name = self.default_model
+        model = self.registry.get(model_name)
+        if model is None:
+            raise RuntimeError(f"分类模型 {model_name} 不可用")
+        return model
+
+    def to_batch(self, images: List[Any], device=None) -> torch.Tensor:
+        """把图片（BGR ndarray、字节或路径）预处理并堆叠为一个批次张量"""
+        tensors = [self.preprocess(bgr_to_pil(image)) for image in images]
+        return torch.stack(tensors).to(device or self.device)
+
+    def classify_batch(self, images: List[Any], model_name: Optional[str] = None, top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """一次前向推理处理 N 张图片，返回每张图片的 top-k 分类结果。"""
+        if not images:
+            return []
+        labels = self.labels
+        model = self.get_model(model_name)
+        # INT8 量化模型只能在 CPU 上运行，通过 input_device 指定输入所在设备
+        input_batch = self.to_batch(images, getattr(model, "input_device", None))
+
+        with torch.no_grad():
+            probabilities = torch.nn.functional.softmax(model(input_batch), dim=1)
+        top_prob, top_catid = torch.topk(probabilities, min(top_k, probabilities.size(1)), dim=1)
+        top_prob = top_prob.cpu().tolist()
+        top_catid = top_catid.cpu().tolist()
+
+        return [
+            [
+                {"class_name": labels[cat_id], "confidence": float(prob)}
+                for prob, cat_id in zip(image_probs, image_cats)
+            ]
+            for image_probs, image_cats in zip(top_prob, top_catid)
+        ]
@@ -0,0 +1,119 @@
+"""
+推理执行器：把阻塞的模型推理从 asyncio 事件循环移到有界线程池中执行。
+- 线程池大小可配置；设置 AI_TORCH_THREADS 时按它设置 torch 的 intra-op 线程数，避免多个工作线程抢占同一批 CPU 核
+- 每个模型单独限制并发数
+- 准入队列有上限，排满后直接拒绝（HTTP 503），而不是无限堆积请求
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+_CPU_COUNT = os.cpu_count() or 1
+
+# 推理线程池大小
+INFERENCE_WORKERS = int(os.getenv("AI_INFERENCE_WORKERS", str(min(4, _CPU_COUNT))))
+# 每个模型同时执行的推理数
+MODEL_CONCURRENCY = int(os.getenv("AI_MODEL_CONCURRENCY", "1"))
+# 已准入（排队中 + 执行中）请求数上限
+INFERENCE_QUEUE_SIZE = int(os.getenv("AI_INFERENCE_QUEUE_SIZE", "64"))
+# 按推理线程数平均分配的 CPU 核数（onnxruntime 会话线程数的默认值）
+THREADS_PER_WORKER = max(1, _CPU_COUNT // max(1, INFERENCE_WORKERS))
+# torch intra-op 线程数，默认 0 表示不修改。torch.set_num_threads 作用于整个进程：
+# 同一进程中的训练任务和线程池空闲时的单个推理也会被限制在这个线程数，需要时再显式设置（例如 THREADS_PER_WORKER 的值）
+TORCH_THREADS = int(os.getenv("AI_TORCH_THREADS", "0"))
+
+
+class InferenceQueueFull(Exception):
+    """推理准入队列已满"""
+    status_code = 503
+
+
+def configure_torch_threads(num_threads: int = TORCH_THREADS):
+    """设置了 AI_TORCH_THREADS 时设置 torch intra-op 线程数（进程级），防止线程池中的多个推理互相抢占核心。"""
+    if num_threads <= 0:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(num_threads)
+
+
+class InferenceExecutor:
+    """有界推理线程池"""
+
+    def __init__(
+        self,
+        max_workers: int = INFERENCE_WORKERS,
+        model_concurrency: int = MODEL_CONCURRENCY,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.model_concurrency = max(1, model_concurrency)
+        self.queue_size = max(1, queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        configure_torch_threads()
+
+    @asynccontextmanager
+    async def admit(self):
+        """准入控制：队列已满时抛出 InferenceQueueFull。"""
+        with self._lock:
+            if self._admitted >= self.queue_size:
+                self.rejected += 1
+                raise InferenceQueueFull(f"推理队列已满（{self.queue_size}），请稍后重试")
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._admitted -= 1
+                self.completed += 1
+
+    def _semaphore(self, model_key: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.model_concurrency)
+            self._semaphores[model_key] = semaphore
+        return semaphore
+
+    def _call(self, fn: Callable, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, model_key: Optional[str], fn: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行 fn，同一 model_key 的并发数不超过 model_concurrency。"""
+        async with self.admit():
+            async with self._semaphore(model_key or "default"):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, self._call, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "model_concurrency": self.model_concurrency,
+                "queue_size": self.queue_size,
+                "torch_threads": TORCH_THREADS or None,
+                "admitted": self._admitted,
+                "running": self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+# 全局推理执行器
+inference_executor = InferenceExecutor()
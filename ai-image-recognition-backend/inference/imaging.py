@@ -0,0 +1,40 @@
+"""
+图像输入的统一解码：推理方法接受文件路径、图片字节或已解码的 BGR ndarray。
+"""
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def is_image_file(name) -> bool:
+    return Path(str(name)).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def list_images(folder: str, limit: Optional[int] = None) -> List[Path]:
+    """递归列出目录下的图片，按路径排序保证结果可复现"""
+    paths = sorted(p for p in Path(folder).rglob("*") if p.is_file() and is_image_file(p))
+    return paths[:limit] if limit else paths
+
+
+def decode_image(image_bytes):
+    """把上传的图片字节在内存中解码为 BGR ndarray（与 cv2.imread 的结果一致）"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("无法解码图像数据")
+    return image
+
+
+def load_image(image):
+    """接受文件路径、图片字节或已解码的 BGR ndarray，统一返回 BGR ndarray"""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return decode_image(image)
+    decoded = cv2.imread(image)
+    if decoded is None:
+        raise ValueError(f"无法读取图像: {image}")
+    return decoded
@@ -0,0 +1,91 @@
+"""
+常驻模型缓存：按内存预算做 LRU 淘汰，检测 / 分割 / 分类三类模型共享同一预算。
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 常驻模型的内存预算（MB），0 表示不限制
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("AI_MODEL_MEMORY_BUDGET_MB", "0"))
+
+
+class ModelCache:
+    """带内存预算的 LRU 模型缓存"""
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        if budget_bytes is None:
+            budget_bytes = int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name: str):
+        """命中时把模型移到最近使用端；未命中返回 None。"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, name: str):
+        """读取模型但不更新 LRU 顺序与命中计数。"""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry[0] if entry else None
+
+    def put(self, name: str, model: Any, size_bytes: int) -> List[str]:
+        """放入模型，超出预算时淘汰最久未使用的模型，返回被淘汰的模型名。"""
+        with self._lock:
+            self._entries[name] = (model, size_bytes)
+            self._entries.move_to_end(name)
+            evicted = []
+            if self.budget_bytes > 0:
+                # 刚放入的模型即使单独超出预算也保留，否则无法提供服务
+                while self._total_bytes() > self.budget_bytes and len(self._entries) > 1:
+                    victim, _ = self._entries.popitem(last=False)
+                    evicted.append(victim)
+                    self.evictions += 1
+            return evicted
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            return self._entries.pop(name, None) is not None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def names(self) -> List[str]:
+        """按从最久未使用到最近使用的顺序返回常驻模型名。"""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def size_of(self, name: str) -> int:
+        entry = self._entries.get(name)
+        return entry[1] if entry else 0
+
+    def _total_bytes(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self._total_bytes(),
+                "resident_models": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,142 @@
+"""
+检测 / 分割结果的批量后处理：每个结果张量只搬到 CPU 一次，坐标换算全部用 NumPy 数组运算完成，
+最后一次性生成标注列表，避免逐框调用 .item() / .tolist()。
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class DetectionArrays(NamedTuple):
+    """单张图片的检测结果（数组形式）"""
+    xyxy: np.ndarray  # (N, 4) int，像素坐标
+    confidence: np.ndarray  # (N,) float
+    class_id: np.ndarray  # (N,) int
+    class_name: List[str]
+
+    def __len__(self):
+        return len(self.confidence)
+
+
+def to_numpy(value) -> np.ndarray:
+    """torch 张量或数组统一转为 NumPy 数组（张量只做一次设备到 CPU 的拷贝）"""
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+def lookup_names(names, class_ids: np.ndarray, fallback: str = "class_{}") -> List[str]:
+    """按类别 id 取类别名；names 可为 dict（ultralytics）或 list（torchvision），不存在的 id 使用 fallback。"""
+    if isinstance(names, dict):
+        return [names.get(cid, fallback.format(cid)) for cid in class_ids.tolist()]
+    count = len(names)
+    return [names[cid] if 0 <= cid < count else fallback.format(cid) for cid in class_ids.tolist()]
+
+
+def detection_arrays(
+    xyxy, confidence, class_id, names, threshold: Optional[float] = None, fallback: str = "class_{}"
+) -> DetectionArrays:
+    """把模型输出的框、置信度与类别张量整理为 DetectionArrays，可按置信度阈值过滤。"""
+    xyxy = to_numpy(xyxy).reshape(-1, 4)
+    confidence = to_numpy(confidence).reshape(-1).astype(np.float64)
+    class_id = to_numpy(class_id).reshape(-1).astype(np.int64)
+    if threshold is not None:
+        keep = confidence >= threshold
+        xyxy, confidence, class_id = xyxy[keep], confidence[keep], class_id[keep]
+    # 与 int() 一致：向零截断为整数像素坐标
+    xyxy = np.trunc(xyxy).astype(np.int64)
+    return DetectionArrays(xyxy, confidence, class_id, lookup_names(names, class_id, fallback))
+
+
+def from_yolo_boxes(boxes, names) -> DetectionArrays:
+    """ultralytics Results.boxes -> DetectionArrays"""
+    if boxes is None or len(boxes) == 0:
+        return detection_arrays(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names)
+    return detection_arrays(boxes.xyxy, boxes.conf, boxes.cls, names)
+
+
+def fractional_boxes(xyxy: np.ndarray, width: int, height: int) -> np.ndarray:
+    """(N, 4) 像素 xyxy -> (N, 4) 相对图片尺寸的 [x, y, w, h]（0~1）"""
+    xyxy = xyxy.astype(np.float64)
+    out = np.empty_like(xyxy)
+    out[:, 0] = xyxy[:, 0] / width
+    out[:, 1] = xyxy[:, 1] / height
+    out[:, 2] = (xyxy[:, 2] - xyxy[:, 0]) / width
+    out[:, 3] = (xyxy[:, 3] - xyxy[:, 1]) / height
+    return out
+
+
+def detection_dicts(detections: DetectionArrays, width: int, height: int) -> List[Dict[str, Any]]:
+    """检测结果列表：bbox 为像素坐标，bbox_percent 为 0~1 的 [x, y, w, h]"""
+    bbox = detections.xyxy.tolist()
+    bbox_percent = fractional_boxes(detections.xyxy, width, height).tolist()
+    confidence = detections.confidence.tolist()
+    class_id = detections.class_id.tolist()
+    return [
+        {
+            'bbox': box,
+            'bbox_percent': percent,
+            'confidence': conf,
+            'class_id': cid,
+            'class_name': name
+        }
+        for box, percent, conf, cid, name in zip(bbox, bbox_percent, confidence, class_id, detections.class_name)
+    ]
+
+
+def detection_labels(detections: DetectionArrays) -> List[str]:
+    """绘图与矩形标注使用的标签文字，例如 "person (0.91)" """
+    return [f"{name} ({conf:.2f})" for name, conf in zip(detections.class_name, detections.confidence.tolist())]
+
+
+def rectangle_annotations(detections: DetectionArrays, width: int, height: int, labels: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Label Studio 风格的矩形标注，坐标为百分比（0~100）"""
+    labels = labels if labels is not None else detection_labels(detections)
+    percent = (fractional_boxes(detections.xyxy, width, height) * 100).tolist()
+    return [
+        {
+            "from_name": "tag",
+            "to_name": "img",
+            "type": "rectanglelabels",
+            "value": {
+                "rectanglelabels": [label],
+                "x": x,
+                "y": y,
+                "width": w,
+                "height": h
+            }
+        }
+        for label, (x, y, w, h) in zip(labels, percent)
+    ]
+
+
+def segment_dicts(
+    polygons: Sequence[Any], confidence, class_id, names, width: int, height: int, min_points: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    分割结果列表：polygons 为每个实例的 (K, 2) 像素轮廓（ultralytics masks.xy），
+    轮廓整体按图片尺寸换算为百分比坐标，少于 min_points 个点的实例被丢弃。
+    """
+    count = len(polygons)
+    confidence = to_numpy(confidence).reshape(-1).astype(np.float64) if confidence is not None else np.zeros(0)
+    class_id = to_numpy(class_id).reshape(-1).astype(np.int64) if class_id is not None else np.zeros(0, np.int64)
+    # 框数量少于轮廓数量时，缺失的类别为 0、置信度为 0.0
+    if len(confidence) < count:
+        confidence = np.concatenate([confidence, np.zeros(count - len(confidence))])
+    if len(class_id) < count:
+        class_id = np.concatenate([class_id, np.zeros(count - len(class_id), np.int64)])
+    class_names = lookup_names(names, class_id[:count])
+    confidence = confidence[:count].tolist()
+
+    scale = np.array([100.0 / width, 100.0 / height])
+    segments = []
+    for xy, conf, name in zip(polygons, confidence, class_names):
+        xy = to_numpy(xy).reshape(-1, 2)
+        if len(xy) < min_points:
+            continue
+        segments.append({
+            "class_name": name,
+            "confidence": conf,
+            "points": (xy.astype(np.float64) * scale).tolist()
+        })
+    return segments
@@ -0,0 +1,110 @@
+"""
+INT8 量化推理：为分类与检测模型生成 INT8 版本，以 "<模型名>-int8" 的名称登记，按需选择。
+- ResNet：配置了校准图片目录时使用静态量化（torchvision 可量化 ResNet50 结构 + 校准），否则动态量化
+- EfficientNet / FasterRCNN：对全连接层做动态量化
+量化后的权重按原始权重哈希缓存到原始权重旁（torch hub 的 checkpoints 目录），权重变化后会重新量化。
+量化模型只在 CPU 上运行。
+"""
+import os
+import warnings
+from pathlib import Path
+from typing import Callable, List
+
+import torch
+
+from .backends import weight_hash
+from .classification import bgr_to_pil, build_preprocess
+from .imaging import list_images
+
+# 量化权重缓存目录，默认与 torchvision 预训练权重放在一起
+QUANTIZED_DIR = Path(os.getenv("AI_QUANTIZED_DIR", str(Path(torch.hub.get_dir()) / "checkpoints")))
+# 静态量化的校准图片目录与最多使用的校准图片数
+CALIBRATION_DIR = os.getenv("AI_QUANT_CALIBRATION_DIR", "")
+CALIBRATION_SAMPLES = int(os.getenv("AI_QUANT_CALIBRATION_SAMPLES", "64"))
+# 量化算子后端：x86 用 fbgemm，ARM 用 qnnpack
+QUANTIZATION_ENGINE = os.getenv("AI_QUANT_ENGINE", "fbgemm")
+
+QUANTIZED_SUFFIX = "-int8"
+CPU = torch.device("cpu")
+
+
+def _cache_path(name: str, mode: str, digest: str) -> Path:
+    QUANTIZED_DIR.mkdir(parents=True, exist_ok=True)
+    return QUANTIZED_DIR / f"{name}{QUANTIZED_SUFFIX}-{mode}-{digest}.pt"
+
+
+def quantize_dynamic_model(model: torch.nn.Module) -> torch.nn.Module:
+    """对全连接层做动态 INT8 量化（权重离线量化，激活在运行时量化）"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _prepare_static_resnet50(fp32_model: torch.nn.Module) -> torch.nn.Module:
+    """构建可量化的 ResNet50，载入 fp32 权重、融合 Conv+BN+ReLU 并插入观察器"""
+    from torchvision.models.quantization import resnet50 as quantizable_resnet50
+
+    torch.backends.quantized.engine = QUANTIZATION_ENGINE
+    model = quantizable_resnet50(weights=None, quantize=False)
+    model.load_state_dict(fp32_model.state_dict())
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.ao.quantization.get_default_qconfig(QUANTIZATION_ENGINE)
+    torch.ao.quantization.prepare(model, inplace=True)
+    return model
+
+
+def quantize_static_resnet50(fp32_model: torch.nn.Module, calibration_images: List[Path]) -> torch.nn.Module:
+    """静态 INT8 量化：用校准图片统计激活范围后转换"""
+    model = _prepare_static_resnet50(fp32_model)
+    preprocess = build_preprocess()
+    with torch.no_grad():
+        for path in calibration_images:
+            model(preprocess(bgr_to_pil(str(path))).unsqueeze(0))
+    torch.ao.quantization.convert(model, inplace=True)
+    return model
+
+
+def load_quantized(
+    name: str,
+    build_fp32: Callable[[], torch.nn.Module],
+    static: bool = False,
+    calibration_dir: str = CALIBRATION_DIR,
+) -> torch.nn.Module:
+    """
+    返回 name 对应模型的 INT8 版本。缓存命中时只重建量化结构并载入缓存权重，
+    否则量化后写入缓存。static=True 且提供了校准目录时使用静态量化。
+    """
+    fp32_model = build_fp32().eval().to(CPU)
+    use_static = static and bool(calibration_dir)
+    mode = "static" if use_static else "dynamic"
+    path = _cache_path(name, mode, weight_hash(fp32_model))
+
+    if path.exists():
+        if use_static:
+            # 未校准的结构只用于承载缓存中的量化参数，转换时观察器为空的警告可以忽略
+            model = _prepare_static_resnet50(fp32_model)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                torch.ao.quantization.convert(model, inplace=True)
+        else:
+            model = quantize_dynamic_model(fp32_model)
+        model.load_state_dict(torch.load(str(path), map_location=CPU))
+        print(f"✅ 载入缓存的 INT8 权重: {path.name}")
+    else:
+        if use_static:
+            calibration_images = list_images(calibration_dir, CALIBRATION_SAMPLES)
+            if not calibration_images:
+                raise FileNotFoundError(f"校准目录中没有图片: {calibration_dir}")
+            print(f"正在用 {len(calibration_images)} 张图片校准 {name} 静态量化")
+            model = quantize_static_resnet50(fp32_model, calibration_images)
+        else:
+            model = quantize_dynamic_model(fp32_model)
+        tmp_path = path.with_suffix(".pt.tmp")
+        torch.save(model.state_dict(), str(tmp_path))
+        os.replace(tmp_path, path)
+        print(f"✅ INT8 权重已缓存: {path.name}")
+
+    model.eval()
+    # 量化算子只支持 CPU，推理时输入需放在 CPU 上
+    model.input_device = CPU
+    model.quantization_mode = mode
+    return model
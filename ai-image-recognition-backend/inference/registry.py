@@ -0,0 +1,225 @@
+"""
+模型注册表：登记每个模型的加载函数，首次被请求时才真正加载（按需加载）。
+每个模型持有独立的锁，并发的首次请求只会触发一次加载。
+已加载的模型放在共享内存预算的 LRU 缓存中，超出预算时淘汰最久未使用的模型。
+每次加载都会计算权重版本号，版本变化时通知监听者（如推理结果缓存）失效旧结果。
+加载失败的模型在 AI_MODEL_RETRY_SECONDS 秒内直接返回 None，之后的请求重新尝试加载（下载 / IO 等临时错误可恢复）。
+"""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .model_cache import ModelCache
+
+
+def _parse_name_list(value: Optional[str]) -> List[str]:
+    """解析逗号分隔的模型名列表，忽略空项。"""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# 启动时需要预加载的模型白名单，例如 AI_PRELOAD_MODELS=YOLO,YOLO-Seg
+PRELOAD_MODELS = _parse_name_list(os.getenv("AI_PRELOAD_MODELS", ""))
+# 模型加载失败后等待多少秒再重试，期间的请求不再尝试加载
+MODEL_RETRY_SECONDS = float(os.getenv("AI_MODEL_RETRY_SECONDS", "30"))
+
+
+def _find_torch_module(model: Any):
+    """从模型对象中找出底层的 torch.nn.Module（YOLO、SamPredictor 等都包了一层）。"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    if isinstance(model, torch.nn.Module):
+        return model
+    inner = getattr(model, "model", None)
+    if isinstance(inner, torch.nn.Module):
+        return inner
+    return None
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """按参数与缓冲区的字节数估算模型常驻内存；导出后端的模型使用其自报的 memory_bytes。"""
+    explicit = getattr(model, "memory_bytes", None)
+    if isinstance(explicit, int):
+        return explicit
+    module = _find_torch_module(model)
+    if module is None:
+        return 0
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def weight_version(model: Any, sample_per_tensor: int = 1024) -> Optional[str]:
+    """
+    计算模型权重的版本号。导出后端的模型使用其自带的 weight_version；
+    否则对每个张量的名称、形状与等间隔抽样的数值做哈希，避免为 GB 级模型遍历全部权重。
+    """
+    explicit = getattr(model, "weight_version", None)
+    if isinstance(explicit, str):
+        return explicit
+    module = _find_torch_module(model)
+    if module is None:
+        return None
+    digest = hashlib.sha256()
+    for key, value in module.state_dict().items():
+        digest.update(key.encode("utf-8"))
+        # 量化模型的 state_dict 中可能含有 (weight, bias) 形式的打包参数
+        for tensor in (value if isinstance(value, (list, tuple)) else (value,)):
+            if not hasattr(tensor, "flatten"):
+                continue
+            if tensor.is_quantized:
+                tensor = tensor.dequantize()
+            flat = tensor.detach().flatten()
+            step = max(1, flat.numel() // sample_per_tensor)
+            digest.update(str(tuple(tensor.shape)).encode("utf-8"))
+            digest.update(flat[::step].cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+@dataclass
+class ModelSpec:
+    """注册表中的一个模型条目"""
+    name: str
+    family: str  # detection, segmentation, classification
+    loader: Callable[[], Any]
+
+
+class ModelRegistry:
+    """按需加载的模型注册表"""
+
+    def __init__(self, cache: Optional[ModelCache] = None):
+        self._specs: Dict[str, ModelSpec] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.cache = cache or ModelCache()
+        self._load_seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        # 最近一次加载失败的时间（time.monotonic），加载成功后清除
+        self._failed_at: Dict[str, float] = {}
+        self._versions: Dict[str, Optional[str]] = {}
+        self._version_listeners: List[Callable[[str, Optional[str]], None]] = []
+
+    def register(self, name: str, family: str, loader: Callable[[], Any]):
+        """登记模型及其加载函数，此时不会加载模型。"""
+        self._specs[name] = ModelSpec(name=name, family=family, loader=loader)
+        self._locks[name] = threading.Lock()
+
+    def names(self, family: Optional[str] = None) -> List[str]:
+        """返回已登记的模型名，可按模型族过滤。"""
+        return [spec.name for spec in self._specs.values() if family is None or spec.family == family]
+
+    def has(self, name: Optional[str], family: Optional[str] = None) -> bool:
+        """模型是否已登记（不代表已加载）。"""
+        spec = self._specs.get(name) if name else None
+        return spec is not None and (family is None or spec.family == family)
+
+    def add_version_listener(self, listener: Callable[[str, Optional[str]], None]):
+        """登记权重版本监听者：每次加载模型后以 (模型名, 版本号) 调用。"""
+        self._version_listeners.append(listener)
+
+    def version(self, name: str) -> Optional[str]:
+        """返回模型当前的权重版本号（必要时先加载模型）；模型不可用或无法计算时返回 None。"""
+        if self.get(name) is None:
+            return None
+        return self._versions.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.cache
+
+    def get(self, name: str):
+        """获取模型；未加载或已被淘汰时加载它。加载失败返回 None，MODEL_RETRY_SECONDS 秒后的请求再重试。"""
+        if name not in self._specs:
+            raise KeyError(f"未登记的模型: {name}")
+        model = self.cache.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            # 双重检查：等待锁期间其他请求可能已完成加载
+            model = self.cache.peek(name)
+            if model is not None:
+                return model
+            if name in self._failed_at and time.monotonic() - self._failed_at[name] < MODEL_RETRY_SECONDS:
+                return None
+
+            spec = self._specs[name]
+            start = time.perf_counter()
+            try:
+                model = spec.loader()
+            except Exception as e:
+                self._errors[name] = str(e)
+                self._failed_at[name] = time.monotonic()
+                print(f"❌ {name} 模型加载失败（{MODEL_RETRY_SECONDS:.0f} 秒后重试）: {e}")
+                return None
+
+            self._errors.pop(name, None)
+            self._failed_at.pop(name, None)
+            self._load_seconds[name] = time.perf_counter() - start
+            size_bytes = estimate_model_bytes(model)
+            print(f"✅ {name} 模型加载成功 ({self._load_seconds[name]:.1f}s, {size_bytes / 1024 / 1024:.1f}MB)")
+            self._update_version(name, model)
+            for victim in self.cache.put(name, model, size_bytes):
+                print(f"♻️ 超出模型内存预算，淘汰 {victim}")
+            return model
+
+    def _update_version(self, name: str, model: Any):
+        try:
+            version = weight_version(model)
+        except Exception as e:
+            print(f"⚠️ 无法计算 {name} 的权重版本: {e}")
+            version = None
+        previous = self._versions.get(name)
+        self._versions[name] = version
+        if previous is not None and previous != version:
+            print(f"🔄 {name} 权重已变化: {previous} -> {version}")
+        for listener in self._version_listeners:
+            try:
+                listener(name, version)
+            except Exception as e:
+                print(f"⚠️ 权重版本监听者执行失败: {e}")
+
+    def _retry_in(self, name: str) -> Optional[float]:
+        """加载失败的模型距离下次重试的秒数，可以立即重试时为 0；没有失败记录时为 None"""
+        failed_at = self._failed_at.get(name)
+        if failed_at is None:
+            return None
+        return max(0.0, MODEL_RETRY_SECONDS - (time.monotonic() - failed_at))
+
+    def evict(self, name: str) -> bool:
+        """手动把模型移出内存，下次请求时重新加载。"""
+        return self.cache.remove(name)
+
+    def preload(self, names: Optional[List[str]] = None):
+        """预加载白名单中的模型，默认使用 AI_PRELOAD_MODELS。"""
+        for name in (PRELOAD_MODELS if names is None else names):
+            if name in self._specs:
+                self.get(name)
+            else:
+                print(f"⚠️ 预加载列表中的模型未登记: {name}")
+
+    def status(self) -> Dict[str, Any]:
+        """返回每个模型是否常驻内存及其估算内存占用。"""
+        models = []
+        for spec in self._specs.values():
+            models.append({
+                "name": spec.name,
+                "family": spec.family,
+                "loaded": spec.name in self.cache,
+                "memory_bytes": self.cache.size_of(spec.name),
+                "load_seconds": self._load_seconds.get(spec.name),
+                "weight_version": self._versions.get(spec.name),
+                "error": self._errors.get(spec.name),
+                "retry_in_seconds": self._retry_in(spec.name),
+            })
+        return {
+            "preload": PRELOAD_MODELS,
+            "resident_bytes": self.cache.total_bytes(),
+            "cache": self.cache.stats(),
+            "models": models,
+        }
@@ -0,0 +1,188 @@
+"""
+检测结果的可视化渲染：在图片上绘制检测框与标签并编码为 JPEG / WebP。
+- inline：渲染后以 Base64 data URL 放入 JSON 响应（原有行为）
+- deferred：JSON 只带标注与渲染图地址 /api/renders/{id}.jpg，首次访问时才渲染，渲染结果缓存
+- none：不渲染
+"""
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+
+from .imaging import load_image
+
+RENDER_MODES = ("inline", "deferred", "none")
+# 渲染图编码格式（jpeg / webp）与质量（1~100）
+RENDER_FORMAT = os.getenv("AI_RENDER_FORMAT", "jpeg").lower()
+RENDER_QUALITY = int(os.getenv("AI_RENDER_QUALITY", "95"))
+# 延迟渲染任务与渲染结果的缓存上限（MB）与有效期（秒）
+RENDER_CACHE_MB = float(os.getenv("AI_RENDER_CACHE_MB", "256"))
+RENDER_TTL = float(os.getenv("AI_RENDER_TTL", "600"))
+
+# 格式 -> (文件扩展名, MIME 类型, cv2 质量参数)
+FORMATS = {
+    "jpeg": ("jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": ("webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+_FORMAT_ALIASES = {"jpg": "jpeg"}
+
+BOX_COLOR = (255, 255, 0)  # BGR
+TEXT_COLOR = (0, 0, 0)
+
+
+def normalize_format(fmt: Optional[str] = None) -> str:
+    """返回规范化的格式名，未指定时使用 AI_RENDER_FORMAT；不支持的格式抛出 ValueError。"""
+    fmt = (fmt or RENDER_FORMAT).lower()
+    fmt = _FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的渲染格式: {fmt}（可选 jpeg / webp）")
+    return fmt
+
+
+def extension(fmt: str) -> str:
+    return FORMATS[normalize_format(fmt)][0]
+
+
+def draw_boxes(bgr_image, xyxy: List[List[int]], labels: List[str]):
+    """在图片副本上绘制检测框与标签，返回新的 BGR ndarray"""
+    draw_img = bgr_image.copy()
+    for (x1, y1, x2, y2), label in zip(xyxy, labels):
+        # 绘制边界框
+        cv2.rectangle(draw_img, (x1, y1), (x2, y2), BOX_COLOR, 2)
+
+        # 绘制标签背景
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        cv2.rectangle(draw_img, (x1, y1 - 20), (x1 + w, y1), BOX_COLOR, -1)
+        # 绘制标签文字
+        cv2.putText(draw_img, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, TEXT_COLOR, 2)
+    return draw_img
+
+
+def encode_image(bgr_image, fmt: Optional[str] = None, quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """把 BGR 图片编码为指定格式，返回 (图片字节, MIME 类型)"""
+    ext, media_type, quality_flag = FORMATS[normalize_format(fmt)]
+    quality = RENDER_QUALITY if quality is None else quality
+    ok, buffer = cv2.imencode(f".{ext}", bgr_image, [quality_flag, int(quality)])
+    if not ok:
+        raise ValueError(f"图像编码失败: {ext}")
+    return buffer.tobytes(), media_type
+
+
+def render_detections(image, boxes: Dict[str, List], fmt: Optional[str] = None, quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    渲染检测结果。image 可为 BGR ndarray、图片字节或路径；
+    boxes 为 {"xyxy": [[x1, y1, x2, y2], ...], "labels": [...]}（AIModelService.detect_batch 的绘制数据）。
+    """
+    return encode_image(draw_boxes(load_image(image), boxes["xyxy"], boxes["labels"]), fmt, quality)
+
+
+def to_data_url(data: bytes, media_type: str) -> str:
+    return f"data:{media_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+class RenderStore:
+    """
+    延迟渲染：登记时只保存原图（上传的压缩字节即可）与绘制数据，首次读取时渲染并缓存编码结果。
+    按总字节数做 LRU 淘汰，条目超过有效期后失效。
+    """
+
+    def __init__(self, max_bytes: int = int(RENDER_CACHE_MB * 1024 * 1024), ttl: float = RENDER_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # id -> {"source", "boxes", "format", "quality", "rendered", "media_type", "expires_at", "size"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _source_size(source) -> int:
+        return source.nbytes if hasattr(source, "nbytes") else len(source)
+
+    def add(self, render_id: str, source, boxes: Dict[str, List], fmt: Optional[str] = None, quality: Optional[int] = None) -> str:
+        """登记延迟渲染任务，返回渲染图的文件名（{id}.{ext}）"""
+        fmt = normalize_format(fmt)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(render_id)
+            if entry is not None and entry["expires_at"] > now:
+                entry["expires_at"] = now + self.ttl
+                self._entries.move_to_end(render_id)
+            else:
+                self._set(render_id, {
+                    "source": source,
+                    "boxes": boxes,
+                    "format": fmt,
+                    "quality": quality,
+                    "rendered": None,
+                    "media_type": None,
+                    "expires_at": now + self.ttl,
+                    "size": self._source_size(source),
+                })
+        return f"{render_id}.{extension(fmt)}"
+
+    def _set(self, render_id: str, entry: Dict[str, Any]):
+        self._discard(render_id)
+        self._entries[render_id] = entry
+        self._bytes += entry["size"]
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            victim = next(iter(self._entries))
+            self._discard(victim)
+            self.evictions += 1
+
+    def _discard(self, render_id: str):
+        entry = self._entries.pop(render_id, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+
+    def get(self, render_id: str, fmt: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """返回 (图片字节, MIME 类型)；首次读取时渲染。不存在、已过期或格式不符时返回 None。"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(render_id)
+            if entry is None or entry["expires_at"] <= now:
+                self._discard(render_id)
+                return None
+            if fmt is not None and normalize_format(fmt) != entry["format"]:
+                return None
+            self._entries.move_to_end(render_id)
+            if entry["rendered"] is not None:
+                self.hits += 1
+                return entry["rendered"], entry["media_type"]
+            source, boxes, fmt, quality = entry["source"], entry["boxes"], entry["format"], entry["quality"]
+
+        # 渲染在锁外进行；并发的首次读取可能重复渲染，结果相同
+        data, media_type = render_detections(source, boxes, fmt, quality)
+        with self._lock:
+            self.renders += 1
+            entry = self._entries.get(render_id)
+            if entry is not None:
+                # 渲染完成后不再需要原图，只保留编码结果
+                self._set(render_id, dict(
+                    entry, source=None, rendered=data, media_type=media_type, size=len(data)
+                ))
+        return data, media_type
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "renders": self.renders,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "format": normalize_format(),
+                "quality": RENDER_QUALITY,
+            }
+
+
+# 全局延迟渲染存储
+render_store = RenderStore()
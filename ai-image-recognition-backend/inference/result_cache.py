@@ -0,0 +1,213 @@
+"""
+推理结果缓存：以 (图片字节 SHA-256, 工具, 模型名, 权重版本, 请求参数) 为键缓存推理结果，
+同一张图片用同一工具与模型重复提交时直接返回缓存结果，不再重新推理。
+- 进程内 LRU 层：条目数与总字节数上限
+- 可选的磁盘层（sqlite）：进程重启后仍可命中，条目数上限
+- 两层都有 TTL；模型加载后权重版本变化时，自动删除该模型旧版本的结果
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# 进程内缓存的条目数上限与总大小上限（MB），条目数为 0 表示关闭缓存
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("AI_RESULT_CACHE_MAX_ENTRIES", "512"))
+RESULT_CACHE_MAX_MB = float(os.getenv("AI_RESULT_CACHE_MAX_MB", "256"))
+# 缓存结果的有效期（秒），0 表示不过期
+RESULT_CACHE_TTL = float(os.getenv("AI_RESULT_CACHE_TTL", "86400"))
+# 磁盘层 sqlite 文件路径，为空时只使用进程内缓存
+RESULT_CACHE_DB = os.getenv("AI_RESULT_CACHE_DB", "")
+RESULT_CACHE_DISK_MAX_ENTRIES = int(os.getenv("AI_RESULT_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+
+def image_digest(image_bytes: bytes) -> str:
+    """图片内容的 SHA-256"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ResultCache:
+    """两级推理结果缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+        ttl: float = RESULT_CACHE_TTL,
+        disk_path: str = RESULT_CACHE_DB,
+        disk_max_entries: int = RESULT_CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        # key -> (序列化结果, 模型名, 权重版本, 过期时间)
+        self._entries: "OrderedDict[str, Tuple[str, str, str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk = self._open_disk(disk_path) if disk_path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(
+        image_bytes: bytes, tool: str, model_name: str, version: str, params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """缓存键：图片内容哈希与工具、模型、权重版本及影响结果的请求参数共同决定"""
+        payload = json.dumps(
+            [image_digest(image_bytes), tool, model_name, version, params or {}],
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _open_disk(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS inference_results ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, version TEXT NOT NULL, "
+            "value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_inference_results_model ON inference_results (model, version)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_inference_results_accessed ON inference_results (accessed_at)")
+        conn.commit()
+        return conn
+
+    def _expires_at(self, now: float) -> float:
+        return now + self.ttl if self.ttl > 0 else float("inf")
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中时返回缓存的结果（每次返回新的对象副本）；未命中或已过期返回 None。"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[3] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[0])
+                self._remove(key)
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, model, version, expires_at FROM inference_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[3] > now:
+                    self._disk.execute("UPDATE inference_results SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._disk.commit()
+                    self._insert(key, row[0], row[1], row[2], row[3])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model_name: str, version: str, value: Any):
+        """写入结果；value 需可 JSON 序列化。"""
+        if not self.enabled:
+            return
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        expires_at = self._expires_at(now)
+        with self._lock:
+            self._insert(key, data, model_name, version, expires_at)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO inference_results (key, model, version, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_name, version, data, expires_at, now),
+                )
+                self._trim_disk(now)
+                self._disk.commit()
+
+    def _insert(self, key: str, data: str, model_name: str, version: str, expires_at: float):
+        self._remove(key)
+        self._entries[key] = (data, model_name, version, expires_at)
+        self._bytes += len(data)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            victim = next(iter(self._entries))
+            self._remove(victim)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def _trim_disk(self, now: float):
+        self._disk.execute("DELETE FROM inference_results WHERE expires_at <= ?", (now,))
+        count = self._disk.execute("SELECT COUNT(*) FROM inference_results").fetchone()[0]
+        if count > self.disk_max_entries:
+            self._disk.execute(
+                "DELETE FROM inference_results WHERE key IN ("
+                "SELECT key FROM inference_results ORDER BY accessed_at LIMIT ?)",
+                (count - self.disk_max_entries,),
+            )
+
+    def invalidate_model(self, model_name: str, current_version: Optional[str] = None) -> int:
+        """删除某模型的缓存结果；给出 current_version 时只删除其他权重版本的结果。返回删除的条目数。"""
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry[1] == model_name and entry[2] != current_version
+            ]
+            for key in stale:
+                self._remove(key)
+            removed = len(stale)
+            if self._disk is not None:
+                cursor = self._disk.execute(
+                    "DELETE FROM inference_results WHERE model = ? AND version IS NOT ?",
+                    (model_name, current_version),
+                )
+                self._disk.commit()
+                removed += cursor.rowcount
+        if removed:
+            print(f"♻️ {model_name} 权重版本变化，已清除 {removed} 条缓存结果")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM inference_results")
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            disk_entries = None
+            if self._disk is not None:
+                disk_entries = self._disk.execute("SELECT COUNT(*) FROM inference_results").fetchone()[0]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "disk_entries": disk_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+# 全局推理结果缓存
+result_cache = ResultCache()
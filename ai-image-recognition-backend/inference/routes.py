@@ -0,0 +1,77 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from ai_models import ai_service, detection_scheduler
+from .backends import BACKEND_INFO, INFERENCE_BACKEND
+from .executor import inference_executor
+from .render import RENDER_TTL, normalize_format, render_store
+from .result_cache import result_cache
+
+router = APIRouter(tags=["inference"])
+
+
+class QuantizationReportRequest(BaseModel):
+    model_name: str  # 例如 ResNet-int8
+    validation_dir: str
+    limit: int = 200
+
+
+@router.get("/api/models/status")
+async def get_models_status():
+    """返回各推理模型是否已加载到内存及其内存占用"""
+    return JSONResponse(content=ai_service.registry.status())
+
+
+@router.get("/api/models/backends")
+async def get_model_backends():
+    """返回每个已加载模型实际使用的推理后端、导出产物与一致性校验结果"""
+    return JSONResponse(content={
+        "configured_backend": INFERENCE_BACKEND,
+        "models": BACKEND_INFO
+    })
+
+@router.post("/api/models/quantization/report")
+async def get_quantization_report(request: QuantizationReportRequest):
+    """在服务器上的验证集目录上比较 INT8 模型与 fp32 模型的精度差异与延迟"""
+    try:
+        report = await inference_executor.run(
+            request.model_name, ai_service.quantization_report,
+            request.model_name, request.validation_dir, request.limit
+        )
+        return JSONResponse(content=report)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"生成量化报告失败: {str(e)}")
+
+@router.get("/api/inference/metrics")
+async def get_inference_metrics():
+    """返回推理线程池状态、微批调度的批次填充率与排队延迟，以及推理结果缓存命中率"""
+    return JSONResponse(content={
+        "executor": inference_executor.stats(),
+        "detection_batching": detection_scheduler.metrics(),
+        "result_cache": result_cache.stats(),
+        "renders": render_store.stats()
+    })
+
+@router.delete("/api/inference/result-cache")
+async def clear_result_cache():
+    """清空推理结果缓存（进程内与磁盘）"""
+    result_cache.clear()
+    return JSONResponse(content={"success": True})
+
+@router.get("/api/renders/{render_id}.{ext}")
+async def get_render(render_id: str, ext: str):
+    """返回 deferred 模式登记的标注图，首次访问时渲染并缓存"""
+    try:
+        fmt = normalize_format(ext)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="渲染图不存在")
+    result = await asyncio.to_thread(render_store.get, render_id, fmt)
+    if result is None:
+        raise HTTPException(status_code=404, detail="渲染图不存在或已过期")
+    data, media_type = result
+    return Response(content=data, media_type=media_type, headers={"Cache-Control": f"private, max-age={int(RENDER_TTL)}"})
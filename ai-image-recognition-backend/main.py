@@ -1,54 +1,57 @@
+import sys
+
+if __name__ == "__main__":
+    # python main.py 等同于 python -m uvicorn main:app：应用以模块名 main 导入，本文件作为 __main__ 不执行下面的初始化。
+    # 评估进程池（spawn）的子进程会重新导入 __main__ 所在的文件；以 uvicorn 为 __main__ 时，
+    # 子进程不会再导入本文件（建表 / 迁移、torch、ultralytics 与模型服务）
+    import runpy
+    sys.argv = [sys.argv[0], "main:app", "--host", "0.0.0.0", "--port", "8000"]
+    runpy.run_module("uvicorn", run_name="__main__", alter_sys=True)
+    sys.exit(0)
+
 from typing import Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey
-from sqlalchemy.orm import Session, relationship
-from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 import os
+import asyncio
 
 # 导入数据库设置
-from database import Base, engine, get_db
+from database import Base, SessionLocal, engine, get_async_db, get_async_engine, pool_metrics, async_pool_metrics
 
 # 导入AI模型服务
-from ai_models import ai_service
-
-# 数据库模型
-class Image(Base):
-    __tablename__ = "images"
-    id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, unique=True, index=True)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
-    annotations = relationship("AutoAnnotation", back_populates="image")
-    manual_annotations = relationship("ManualAnnotation", back_populates="image")
-
-class AutoAnnotation(Base):
-    __tablename__ = "auto_annotations"
-    id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"))
-    tool_type = Column(String)
-    annotation_data = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    image = relationship("Image", back_populates="annotations")
-
-class ManualAnnotation(Base):
-    __tablename__ = "manual_annotations"
-    id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"))
-    tool_type = Column(String)
-    annotation_data = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    image = relationship("Image", back_populates="manual_annotations")
+from ai_models import ai_service, detection_scheduler, decode_image, is_fallback
+from inference.executor import inference_executor, InferenceQueueFull
+from inference.render import RENDER_MODES, normalize_format, render_detections, render_store, to_data_url
+from inference.result_cache import result_cache
+
+# 数据库模型（图片、自动标注、手动标注）
+from annotations.models import Image, AutoAnnotation, ManualAnnotation
+from annotations.store import insert_annotations, list_images_page, upsert_image, upsert_image_content
+
+# 图片去重：内容哈希 / dHash 指纹、按内容寻址的原图存储与推理结果复用
+from image_store.blob_store import blob_store
+from image_store.hashing import fingerprint
+from image_store.service import DEDUP_ENABLED, dedup_service
 
 # 导入其他模块的模型，确保它们在创建表之前被加载
 from training import models as training_models
 from evaluation import models as evaluation_models
 from visiofirm import models as visiofirm_models
 from settings import models as settings_models
+from prelabel import models as prelabel_models
+from image_store import models as image_store_models
 
-# 创建数据库表
+# 创建数据库表，再执行结构迁移（给已有的表补索引 / 加列）
 Base.metadata.create_all(bind=engine)
+from migrations.runner import run_migrations
+run_migrations(engine)
+
+# /api/images/list 每页最多返回的图片数
+IMAGES_LIST_MAX_LIMIT = int(os.getenv("AI_IMAGES_LIST_MAX_LIMIT", "1000"))
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -88,6 +91,26 @@ app.include_router(visiofirm_router)
 from settings.api import router as settings_router
 app.include_router(settings_router)
 
+# 导入并包含批量自动标注路由
+from annotations.routes import router as annotations_router
+app.include_router(annotations_router)
+
+# 导入并包含数据集预标注任务路由
+from prelabel.routes import router as prelabel_router
+app.include_router(prelabel_router)
+
+# 导入并包含数据集导出路由
+from dataset_export.routes import router as export_router
+app.include_router(export_router)
+
+# 导入并包含图片去重 / 原图存储路由
+from image_store.routes import router as image_store_router
+app.include_router(image_store_router)
+
+# 导入并包含推理模型状态路由
+from inference.routes import router as inference_router
+app.include_router(inference_router)
+
 # 智能体数据增广 API：在 main 中直接注册，避免子模块导入失败导致 404
 try:
     from augmentation.routes import router as augmentation_router
@@ -107,6 +130,39 @@ except Exception as e:
             content={"detail": "增广模块未加载。请：1) 在 ai-image-recognition-backend 目录下启动；2) pip install openai；3) 配置 .augmentation_api_key 或 DASHSCOPE_API_KEY"}
         )
 
+# 在应用启动时创建异步数据库引擎：异步驱动未安装时直接启动失败并给出安装提示，而不是每个请求都报错
+@app.on_event("startup")
+async def check_async_database():
+    get_async_engine()
+
+# 在应用启动时预加载白名单中的模型（AI_PRELOAD_MODELS），其余模型首次请求时再加载
+@app.on_event("startup")
+async def preload_models():
+    import asyncio
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, ai_service.preload_models)
+
+# 在应用启动时处理上次未完成的预标注任务（标记为中断，按 AI_PRELABEL_AUTO_RESUME 决定是否续跑）
+@app.on_event("startup")
+async def recover_prelabel_jobs():
+    from prelabel.service import prelabel_service
+    prelabel_service.recover(asyncio.get_running_loop())
+
+# 在应用启动时把上次未完成的评估记录标记为失败，并登记训练完成后的自动评估（AI_EVAL_AUTO_TRAINING）
+@app.on_event("startup")
+async def setup_evaluations():
+    from evaluation.model_eval import model_evaluation_service
+    from evaluation.results import fail_interrupted
+    from training.training_service import training_service
+    db = SessionLocal()
+    try:
+        interrupted = fail_interrupted(db)
+    finally:
+        db.close()
+    if interrupted:
+        print(f"⚠️ {interrupted} 条评估记录在上次服务停止时未完成，已标记为 failed")
+    training_service.add_completion_listener(model_evaluation_service.evaluate_training_task)
+
 # 在应用启动时打印已注册路由，便于部署环境排障
 @app.on_event("startup")
 async def log_registered_routes():
@@ -173,84 +229,161 @@ def generate_keypoint_annotation():
         }
     }
 
+async def _run_auto_annotation(tool, model, model_name, image_bytes):
+    """对一张图片执行推理，返回 (标注列表, 检测框绘制数据, 解码后的图片)；非检测工具的绘制数据为 None"""
+    # 在内存中解码一次，所有工具共用同一份解码结果（不再写临时文件）
+    decoded_image = await asyncio.to_thread(decode_image, image_bytes)
+
+    if tool == "object_detection":
+        # 交给微批调度器：与同一模型的并发请求合并推理，等待本图片的结果（不含渲染）
+        async with inference_executor.admit():
+            annotations, render_boxes = await asyncio.wrap_future(
+                detection_scheduler.submit(model_name, decoded_image)
+            )
+        return annotations, render_boxes, decoded_image
+    if tool == "image_classification":
+        # 调用分类方法，传入前端选择的模型名；推理在线程池中执行，不阻塞事件循环
+        classification_results = await inference_executor.run(
+            model_name, ai_service.classify_image, decoded_image, model_name=model
+        )
+        return classification_results, None, decoded_image
+    # 图像分割
+    print(f"[分割] 收到 model={repr(model)}, 使用 seg_model={model_name}")
+    segmentation_results = await inference_executor.run(
+        model_name, ai_service.segment_objects, decoded_image, model_name=model_name
+    )
+    return segmentation_results, None, decoded_image
+
 @app.post("/api/auto_annotate")
 async def auto_annotate(
     image: UploadFile = File(...),
     tool: str = Form(...),
     model: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    render: str = Form("inline"),
+    render_format: Optional[str] = Form(None),
+    render_quality: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    自动标注一张图片。目标检测的标注图由 render 控制：
+    - inline（默认）：Base64 图片放在 annotated_image 中
+    - deferred：annotated_image_url 给出 /api/renders/{id}.jpg，首次访问时才渲染
+    - none：不渲染
+    render_format（jpeg / webp）与 render_quality 默认取 AI_RENDER_FORMAT / AI_RENDER_QUALITY。
+    """
+    render = (render or "inline").lower()
+    if render not in RENDER_MODES:
+        return JSONResponse(status_code=400, content={"detail": f"render 取值应为 {', '.join(RENDER_MODES)}"})
+    try:
+        render_format = normalize_format(render_format)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
     try:
         # 1. 读取图片数据
         image_bytes = await image.read()
         
-        # 2. 保存图片信息到数据库
-        db_image = db.query(Image).filter(Image.filename == image.filename).first()
-        if not db_image:
-            db_image = Image(filename=image.filename)
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-
-        # 3. 使用AI模型生成标注
-        annotations = []
-        annotated_image_base64 = None
-        
-        # 保存上传的图片到临时文件
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_file.write(image_bytes)
-            temp_file_path = temp_file.name
-        
+        # 2. 使用AI模型生成标注
         try:
-            if tool == "object_detection":
-                # 调用带可视化的检测方法，传入前端选择的模型名
-                annotations, annotated_image_base64 = ai_service.detect_objects_with_visualization(
-                    image_bytes, model_name=model or "YOLO"
-                )
-            elif tool == "image_classification":
-                # 调用分类方法，传入前端选择的模型名
-                classification_results = ai_service.classify_image(temp_file_path, model_name=model)
-                annotations = classification_results
-            elif tool == "image_segmentation":
-                # 调用分割方法；未传 model 时默认用 YOLO-Seg，避免走模拟数据
-                seg_model = (model and str(model).strip()) or "YOLO-Seg"
-                print(f"[分割] 收到 model={repr(model)}, 使用 seg_model={seg_model}")
-                segmentation_results = ai_service.segment_objects(temp_file_path, model_name=seg_model)
-                annotations = segmentation_results
-            else:
-                raise HTTPException(status_code=400, detail=f"Tool type '{tool}' is not supported.")
-        finally:
-            # 清理临时文件
-            import os
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-
-        # 4. 保存所有标注到数据库
-        for annotation in annotations:
-            db_annotation = AutoAnnotation(
-                image_id=db_image.id,
-                tool_type=tool,
-                annotation_data=annotation
-            )
-            db.add(db_annotation)
-        
-        db.commit()
+            model_name = ai_service.resolve_tool_model(tool, model)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 同一图片、工具、模型与权重版本的结果直接取缓存；未登记的模型（模拟数据）不缓存
+        cache_key = None
+        version = await asyncio.to_thread(ai_service.model_version, model_name)
+        if version and result_cache.enabled:
+            cache_key = result_cache.make_key(image_bytes, tool, model_name, version, {"endpoint": "auto_annotate"})
+        cached = result_cache.get(cache_key) if cache_key else None
+
+        # 登记图片指纹：内容已存在或与已有图片近重复时，复用该原图已保存的推理结果
+        # reused 只表示复用了去重登记中保存的结果；命中进程内 / 磁盘结果缓存单独用 cached 标明
+        dedup = None
+        reused = None
+        from_cache = cached is not None
+        if DEDUP_ENABLED:
+            fp = await asyncio.to_thread(fingerprint, image_bytes)
+            dedup = await db.run_sync(dedup_service.register, fp)
+            if cached is None and version:
+                found = await db.run_sync(dedup_service.find_result, dedup, tool, model_name, version)
+                if found is not None:
+                    cached, near = found
+                    reused = "near" if near else "exact"
+                    # 近重复复用的结果（已换算到本图尺寸）也保存到本图名下，之后的相同内容直接命中
+                    if near:
+                        await db.run_sync(dedup_service.save_result, dedup.blob_id, tool, model_name, version, cached)
+
+        decoded_image = None
+        if cached is not None:
+            annotations, render_boxes = cached["annotations"], cached["render_boxes"]
+        else:
+            annotations, render_boxes, decoded_image = await _run_auto_annotation(tool, model, model_name, image_bytes)
+            # 模型不可用或推理出错时返回的是模拟 / 空结果，不写入缓存，也不写入没有过期时间的 image_blob_results
+            if version and not is_fallback(annotations):
+                result = {"annotations": annotations, "render_boxes": render_boxes}
+                if cache_key:
+                    result_cache.put(cache_key, model_name, version, result)
+                if dedup is not None:
+                    await db.run_sync(dedup_service.save_result, dedup.blob_id, tool, model_name, version, result)
+
+        # 3. 按 render 模式生成标注图（只有目标检测有标注图）
+        annotated_image_base64 = None
+        annotated_image_url = None
+        if render_boxes is not None and render == "inline":
+            source = decoded_image if decoded_image is not None else image_bytes
+            annotated_image_base64 = to_data_url(*await asyncio.to_thread(
+                render_detections, source, render_boxes, render_format, render_quality
+            ))
+        elif render_boxes is not None and render == "deferred":
+            # 只登记原图（压缩字节）与绘制数据，首次访问时才渲染
+            render_id = uuid.uuid4().hex
+            render_file = render_store.add(render_id, image_bytes, render_boxes, render_format, render_quality)
+            annotated_image_url = f"/api/renders/{render_file}"
+
+        # 4. 在一个事务中保存图片记录与所有标注（批量写入）
+        # 同名但内容不同的图片另存为新的文件名（见 upsert_image_content）
+        stored_filename = image.filename
+        if dedup is not None:
+            image_id, stored_filename = await db.run_sync(upsert_image_content, image.filename, dedup.content_hash)
+        else:
+            image_id = await db.run_sync(upsert_image, image.filename)
+        await db.run_sync(insert_annotations, AutoAnnotation, tool, [(image_id, annotation) for annotation in annotations])
+        await db.commit()
+
+        # 事务提交后再保存原图，回滚的请求不会留下没有记录的原图文件；
+        # 原图已存在时 put 不重复写入，之前提交后写入失败的原图也会在再次上传时补上
+        if dedup is not None:
+            try:
+                await asyncio.to_thread(blob_store.put, dedup.content_hash, image_bytes)
+            except OSError as e:
+                print(f"⚠️ 保存原图 {dedup.content_hash} 失败: {e}")
 
         # 5. 封装响应数据
         response_data = {
             "annotations": annotations,
             "annotated_image": annotated_image_base64, # 添加标注后的图片
+            "annotated_image_url": annotated_image_url, # deferred 模式下的标注图地址
+            "cached": from_cache, # 是否命中推理结果缓存
             "database_info": {
-                "image_id": db_image.id,
+                "image_id": image_id,
+                "filename": stored_filename,
                 "annotation_count": len(annotations)
             }
         }
+        if dedup is not None:
+            response_data["dedup"] = {**dedup.to_dict(), "reused_result": reused}
 
         return JSONResponse(content=response_data)
 
+    except InferenceQueueFull as e:
+        await db.rollback()
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": str(e)},
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=500,
             content={"detail": f"Error processing image: {str(e)}"}
@@ -286,94 +419,70 @@ class MultipleAnnotationRequest(BaseModel):
     annotations: List[AnnotationItem]
 
 @app.post("/api/annotations/single")
-async def submit_single_annotation(request: SingleAnnotationRequest, db: Session = Depends(get_db)):
+async def submit_single_annotation(request: SingleAnnotationRequest, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"收到单标注保存请求: {request}")
         print(f"请求数据类型: imageName={type(request.imageName)}, tool={type(request.tool)}, annotation={type(request.annotation)}")
         print(f"标注数据: {request.annotation.dict()}")
         
-        # 查找或创建图片记录
-        db_image = db.query(Image).filter(Image.filename == request.imageName).first()
-        if not db_image:
-            db_image = Image(filename=request.imageName)
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-        
-        # 保存手动标注
-        db_annotation = ManualAnnotation(
-            image_id=db_image.id,
-            tool_type=request.tool,
-            annotation_data=request.annotation.dict()
+        # 在一个事务中查找或创建图片记录并保存手动标注
+        image_id = await db.run_sync(upsert_image, request.imageName)
+        annotation_ids = await db.run_sync(
+            insert_annotations, ManualAnnotation, request.tool, [(image_id, request.annotation.dict())]
         )
-        db.add(db_annotation)
-        db.commit()
-        db.refresh(db_annotation)
+        await db.commit()
         
         return JSONResponse(content={
             "success": True,
             "message": "Annotation saved successfully",
-            "annotation_id": db_annotation.id,
-            "image_id": db_image.id
+            "annotation_id": annotation_ids[0],
+            "image_id": image_id
         })
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=500,
             content={"detail": f"Error saving annotation: {str(e)}"}
         )
 
 @app.post("/api/annotations/batch")
-async def submit_batch_annotations(request: MultipleAnnotationRequest, db: Session = Depends(get_db)):
+async def submit_batch_annotations(request: MultipleAnnotationRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        # 查找或创建图片记录
-        db_image = db.query(Image).filter(Image.filename == request.imageName).first()
-        if not db_image:
-            db_image = Image(filename=request.imageName)
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-        
-        # 保存多个手动标注
-        created_annotations = []
-        for annotation in request.annotations:
-            db_annotation = ManualAnnotation(
-                image_id=db_image.id,
-                tool_type=request.tool,
-                annotation_data=annotation.dict()
-            )
-            db.add(db_annotation)
-            created_annotations.append(db_annotation)
-        
-        db.commit()
+        # 在一个事务中查找或创建图片记录并批量保存手动标注
+        image_id = await db.run_sync(upsert_image, request.imageName)
+        annotation_ids = await db.run_sync(
+            insert_annotations, ManualAnnotation, request.tool,
+            [(image_id, annotation.dict()) for annotation in request.annotations]
+        )
+        await db.commit()
         
         return JSONResponse(content={
             "success": True,
             "message": "Annotations saved successfully",
-            "annotation_ids": [ann.id for ann in created_annotations],
-            "image_id": db_image.id,
-            "count": len(created_annotations)
+            "annotation_ids": annotation_ids,
+            "image_id": image_id,
+            "count": len(annotation_ids)
         })
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=500,
             content={"detail": f"Error saving annotations: {str(e)}"}
         )
 
 @app.delete("/api/annotations/{annotation_id}")
-async def delete_annotation(annotation_id: int, db: Session = Depends(get_db)):
+async def delete_annotation(annotation_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
         # 查找标注
-        db_annotation = db.query(ManualAnnotation).filter(ManualAnnotation.id == annotation_id).first()
+        db_annotation = await db.get(ManualAnnotation, annotation_id)
         if not db_annotation:
             raise HTTPException(status_code=404, detail="Annotation not found")
         
         # 删除标注
-        db.delete(db_annotation)
-        db.commit()
+        await db.delete(db_annotation)
+        await db.commit()
         
         return JSONResponse(content={
             "success": True,
@@ -383,7 +492,7 @@ async def delete_annotation(annotation_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=500,
             content={"detail": f"Error deleting annotation: {str(e)}"}
@@ -391,7 +500,7 @@ async def delete_annotation(annotation_id: int, db: Session = Depends(get_db)):
 
 # 保留原有API以确保向后兼容性
 @app.post("/api/annotations")
-async def submit_annotation(annotation_data: dict, db: Session = Depends(get_db)):
+async def submit_annotation(annotation_data: dict, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"收到标注保存请求: {annotation_data}")
         
@@ -404,32 +513,18 @@ async def submit_annotation(annotation_data: dict, db: Session = Depends(get_db)
             print(f"缺少必需字段: image_name={image_name}, tool_type={tool_type}, annotation={annotation}")
             raise HTTPException(status_code=400, detail="Missing required fields")
         
-        # 查找或创建图片记录
-        db_image = db.query(Image).filter(Image.filename == image_name).first()
-        if not db_image:
-            print(f"创建新图片记录: {image_name}")
-            db_image = Image(filename=image_name)
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-        
-        # 保存手动标注
-        print(f"保存标注到数据库，图片ID: {db_image.id}, 工具类型: {tool_type}")
-        db_annotation = ManualAnnotation(
-            image_id=db_image.id,
-            tool_type=tool_type,
-            annotation_data=annotation
-        )
-        db.add(db_annotation)
-        db.commit()
-        db.refresh(db_annotation)
+        # 在一个事务中查找或创建图片记录并保存手动标注
+        image_id = await db.run_sync(upsert_image, image_name)
+        print(f"保存标注到数据库，图片ID: {image_id}, 工具类型: {tool_type}")
+        annotation_ids = await db.run_sync(insert_annotations, ManualAnnotation, tool_type, [(image_id, annotation)])
+        await db.commit()
         
-        print(f"标注保存成功，ID: {db_annotation.id}")
+        print(f"标注保存成功，ID: {annotation_ids[0]}")
         return JSONResponse(content={
             "success": True,
             "message": "Annotation saved successfully",
-            "annotation_id": db_annotation.id,
-            "image_id": db_image.id
+            "annotation_id": annotation_ids[0],
+            "image_id": image_id
         })
         
     except HTTPException as http_exc:
@@ -440,39 +535,46 @@ async def submit_annotation(annotation_data: dict, db: Session = Depends(get_db)
         error_trace = traceback.format_exc()
         print(f"保存标注时出错: {str(e)}")
         print(f"错误堆栈: {error_trace}")
-        db.rollback()
+        await db.rollback()
         return JSONResponse(
             status_code=500,
             content={"success": False, "detail": f"Error saving annotation: {str(e)}"}
         )
 
+async def _image_annotations(db: AsyncSession, db_image: Image) -> dict:
+    """查询一张图片的自动 / 手动标注（各一条按 (image_id, tool_type) 索引的查询）"""
+    auto_annotations = (await db.scalars(
+        select(AutoAnnotation).where(AutoAnnotation.image_id == db_image.id)
+    )).all()
+    manual_annotations = (await db.scalars(
+        select(ManualAnnotation).where(ManualAnnotation.image_id == db_image.id)
+    )).all()
+    return {
+        "image_id": db_image.id,
+        "filename": db_image.filename,
+        "auto_annotations": [{
+            "id": ann.id,
+            "tool_type": ann.tool_type,
+            "annotation_data": ann.annotation_data,
+            "created_at": ann.created_at.isoformat()
+        } for ann in auto_annotations],
+        "manual_annotations": [{
+            "id": ann.id,
+            "tool_type": ann.tool_type,
+            "annotation_data": ann.annotation_data,
+            "created_at": ann.created_at.isoformat()
+        } for ann in manual_annotations]
+    }
+
 # 获取图片的所有标注
 @app.get("/api/images/{image_id}/annotations")
-async def get_image_annotations(image_id: int, db: Session = Depends(get_db)):
+async def get_image_annotations(image_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        db_image = db.query(Image).filter(Image.id == image_id).first()
+        db_image = await db.get(Image, image_id)
         if not db_image:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        auto_annotations = db.query(AutoAnnotation).filter(AutoAnnotation.image_id == image_id).all()
-        manual_annotations = db.query(ManualAnnotation).filter(ManualAnnotation.image_id == image_id).all()
-        
-        return JSONResponse(content={
-            "image_id": image_id,
-            "filename": db_image.filename,
-            "auto_annotations": [{
-                "id": ann.id,
-                "tool_type": ann.tool_type,
-                "annotation_data": ann.annotation_data,
-                "created_at": ann.created_at.isoformat()
-            } for ann in auto_annotations],
-            "manual_annotations": [{
-                "id": ann.id,
-                "tool_type": ann.tool_type,
-                "annotation_data": ann.annotation_data,
-                "created_at": ann.created_at.isoformat()
-            } for ann in manual_annotations]
-        })
+        return JSONResponse(content=await _image_annotations(db, db_image))
         
     except Exception as e:
         return JSONResponse(
@@ -481,9 +583,9 @@ async def get_image_annotations(image_id: int, db: Session = Depends(get_db)):
         )
 
 @app.get("/api/annotations/{image_name}")
-async def get_annotations_by_image_name(image_name: str, db: Session = Depends(get_db)):
+async def get_annotations_by_image_name(image_name: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        db_image = db.query(Image).filter(Image.filename == image_name).first()
+        db_image = await db.scalar(select(Image).where(Image.filename == image_name))
         if not db_image:
             return JSONResponse(content={
                 "image_id": None,
@@ -492,25 +594,7 @@ async def get_annotations_by_image_name(image_name: str, db: Session = Depends(g
                 "manual_annotations": []
             })
 
-        auto_annotations = db.query(AutoAnnotation).filter(AutoAnnotation.image_id == db_image.id).all()
-        manual_annotations = db.query(ManualAnnotation).filter(ManualAnnotation.image_id == db_image.id).all()
-
-        return JSONResponse(content={
-            "image_id": db_image.id,
-            "filename": db_image.filename,
-            "auto_annotations": [{
-                "id": ann.id,
-                "tool_type": ann.tool_type,
-                "annotation_data": ann.annotation_data,
-                "created_at": ann.created_at.isoformat()
-            } for ann in auto_annotations],
-            "manual_annotations": [{
-                "id": ann.id,
-                "tool_type": ann.tool_type,
-                "annotation_data": ann.annotation_data,
-                "created_at": ann.created_at.isoformat()
-            } for ann in manual_annotations]
-        })
+        return JSONResponse(content=await _image_annotations(db, db_image))
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -538,30 +622,34 @@ async def list_routes():
     return {"count": len(routes), "routes": routes}
 
 @app.get("/api/images/list")
-async def get_images_list(db: Session = Depends(get_db)):
+async def get_images_list(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    获取所有已上传图片的列表
+    获取已上传图片的列表（含自动 / 手动标注数量）
+    - after_id: 键集分页游标，传上一页返回的 next_after_id
+    - limit: 每页数量（最大 IMAGES_LIST_MAX_LIMIT），不传时返回全部
+    - prefix: 按文件名前缀过滤
     """
+    if limit is not None and not 1 <= limit <= IMAGES_LIST_MAX_LIMIT:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": f"limit 取值范围为 1~{IMAGES_LIST_MAX_LIMIT}"}
+        )
     try:
-        images = db.query(Image).all()
-        
-        # 为每个图片统计标注数量
-        result = []
-        for image in images:
-            auto_count = db.query(AutoAnnotation).filter(AutoAnnotation.image_id == image.id).count()
-            manual_count = db.query(ManualAnnotation).filter(ManualAnnotation.image_id == image.id).count()
-            
-            result.append({
-                "id": image.id,
-                "filename": image.filename,
-                "uploaded_at": image.uploaded_at.isoformat() if image.uploaded_at else None,
-                "auto_annotation_count": auto_count,
-                "manual_annotation_count": manual_count
-            })
+        # 多取一条用于判断是否还有下一页
+        result = await db.run_sync(list_images_page, after_id=after_id, limit=limit + 1 if limit else None, prefix=prefix)
+        has_more = limit is not None and len(result) > limit
+        result = result[:limit]
         
         return JSONResponse(content={
             "success": True,
-            "images": result
+            "images": result,
+            "next_after_id": result[-1]["id"] if has_more else None,
+            "has_more": has_more
         })
         
     except Exception as e:
@@ -578,6 +666,11 @@ async def health_check():
     import datetime
     return {"status": "healthy", "timestamp": datetime.datetime.utcnow().isoformat()}
 
+# 数据库连接池指标：取出 / 归还次数、当前与峰值占用、单次占用时长
+@app.get("/api/db/metrics")
+async def db_metrics():
+    return {"sync": pool_metrics.stats(), "async": async_pool_metrics()}
+
 # 调试接口：返回版本与环境信息
 @app.get("/api/version")
 async def version_info():
@@ -595,7 +688,3 @@ def pipeline_test():
     这是一个用于测试CI/CD流水线的API接口。
     """
     return {"message": "CI/CD pipeline test successful! The code has been updated."}
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1 @@
+# 数据库结构迁移模块初始化文件
@@ -0,0 +1,73 @@
+"""
+轻量的数据库结构迁移：create_all 只会建缺失的表，不会给已有的表补索引或加列。
+迁移按版本号顺序执行，已执行的版本记录在 schema_migrations 表中；每个迁移在独立事务中执行并记录版本。
+迁移函数应当可重复执行（建索引 / 加列前先检查是否已存在），这样新库在 create_all 已建好索引后执行迁移也不会出错。
+"""
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+def create_index(conn: Connection, index: Index):
+    """创建索引（已存在时跳过）"""
+    index.create(bind=conn, checkfirst=True)
+
+
+def drop_index(conn: Connection, table_name: str, index_name: str):
+    """删除索引（不存在时跳过）"""
+    if any(index["name"] == index_name for index in inspect(conn).get_indexes(table_name)):
+        conn.execute(text(f"DROP INDEX {conn.dialect.identifier_preparer.quote(index_name)}"))
+
+
+def add_column(conn: Connection, table_name: str, column: Column):
+    """给已有的表加列（已存在时跳过）；列必须可为空或带服务器端默认值"""
+    if any(existing["name"] == column.name for existing in inspect(conn).get_columns(table_name)):
+        return
+    preparer = conn.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(
+        f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+    ))
+
+
+def applied_versions(engine: Engine) -> List[int]:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return [row.version for row in conn.execute(schema_migrations.select().order_by(schema_migrations.c.version))]
+
+
+def run_migrations(engine: Engine, migrations: List[Migration] = None) -> List[int]:
+    """执行所有未执行的迁移，返回本次执行的版本号"""
+    if migrations is None:
+        from .versions import MIGRATIONS
+        migrations = MIGRATIONS
+    done = set(applied_versions(engine))
+    executed = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+            ))
+        print(f"数据库迁移 {migration.version:04d}_{migration.name} 已执行")
+        executed.append(migration.version)
+    return executed
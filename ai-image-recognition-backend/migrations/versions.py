@@ -0,0 +1,50 @@
+"""
+迁移列表：只追加，不修改已发布的迁移。索引的名称与列需和各模型 __table_args__ 中的声明保持一致，
+这样新库由 create_all 建好的索引与旧库由迁移补建的索引相同。
+"""
+from sqlalchemy import Column, Index, String
+from sqlalchemy.engine import Connection
+
+from .runner import Migration, add_column, create_index, drop_index
+
+
+def _annotation_lookup_indexes(conn: Connection):
+    """
+    按图片查标注（get_image_annotations、get_annotations_by_image_name、/api/images/list 的计数）
+    使用 (image_id, tool_type) 复合索引；它同样覆盖只按 image_id 过滤的查询，因此删除单列的 image_id 索引。
+    """
+    from annotations.models import AutoAnnotation, ManualAnnotation
+    for model in (AutoAnnotation, ManualAnnotation):
+        table = model.__table__
+        drop_index(conn, table.name, f"ix_{table.name}_image_id")
+        create_index(conn, Index(f"ix_{table.name}_image_id_tool_type", table.c.image_id, table.c.tool_type))
+
+
+def _visiofirm_filename_index(conn: Connection):
+    from visiofirm.models import VisioFirmAnnotation
+    table = VisioFirmAnnotation.__table__
+    create_index(conn, Index("ix_visiofirm_annotations_filename", table.c.filename))
+
+
+def _evaluation_indexes(conn: Connection):
+    """模型评估记录按 model_id / status 过滤并按 created_at 倒序排列"""
+    from evaluation.models import EvaluationResultDB
+    table = EvaluationResultDB.__table__
+    create_index(conn, Index("ix_evaluation_results_model_id_created_at", table.c.model_id, table.c.created_at))
+    create_index(conn, Index("ix_evaluation_results_status_created_at", table.c.status, table.c.created_at))
+
+
+def _image_content_hash(conn: Connection):
+    """images 表加内容哈希列（已有图片为空，重新上传时补上），image_blobs 等新表由 create_all 创建"""
+    from annotations.models import Image
+    table = Image.__table__
+    add_column(conn, table.name, Column("content_hash", String(64), nullable=True))
+    create_index(conn, Index("ix_images_content_hash", table.c.content_hash))
+
+
+MIGRATIONS = [
+    Migration(1, "annotation_lookup_indexes", _annotation_lookup_indexes),
+    Migration(2, "visiofirm_filename_index", _visiofirm_filename_index),
+    Migration(3, "evaluation_status_created_at_indexes", _evaluation_indexes),
+    Migration(4, "image_content_hash", _image_content_hash),
+]
@@ -0,0 +1 @@
+# 服务器端数据集预标注任务模块初始化文件
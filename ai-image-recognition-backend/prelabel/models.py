@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Float
+from database import Base
+from datetime import datetime
+
+class PrelabelJobDB(Base):
+    """数据集预标注任务数据库模型（同时作为断点续跑的检查点）"""
+    __tablename__ = "prelabel_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True)
+    status = Column(String)  # pending, running, completed, failed, cancelled, interrupted
+    config = Column(JSON)  # 任务配置（数据源、工具、模型、输出方式）
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    total_images = Column(Integer, default=0)
+    processed_images = Column(Integer, default=0)  # 已处理（含失败）的图片数
+    failed_images = Column(Integer, default=0)
+    skipped_images = Column(Integer, default=0)  # 已有标签文件而跳过的图片数
+    annotation_count = Column(Integer, default=0)
+    images_per_second = Column(Float, nullable=True)
+    # 检查点：最后一张已处理图片的相对路径；图片按相对路径排序，续跑时从其后一张开始
+    cursor = Column(String, nullable=True)
+    error_message = Column(Text, nullable=True)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from .service import PrelabelConfig, prelabel_service
+
+router = APIRouter(prefix="/api/prelabel", tags=["prelabel"])
+
+
+class PrelabelJobRequest(BaseModel):
+    """预标注任务请求模型"""
+    source: str  # 服务器上的图片目录或 data.yaml 路径
+    split: str = "train"
+    tool: str = "object_detection"
+    model: Optional[str] = None
+    write_labels: bool = True
+    write_db: bool = False
+    labels_dir: Optional[str] = None
+    overwrite: bool = False
+
+
+@router.post("/jobs", response_model=dict)
+async def create_prelabel_job(request: PrelabelJobRequest):
+    """创建并启动预标注任务"""
+    try:
+        job_id = await asyncio.to_thread(prelabel_service.create_job, PrelabelConfig(**request.dict()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建预标注任务失败: {str(e)}")
+    if not prelabel_service.start_job(job_id, asyncio.get_running_loop()):
+        raise HTTPException(status_code=400, detail="启动预标注任务失败")
+    return {"job_id": job_id, "message": "预标注任务已启动"}
+
+
+@router.get("/jobs")
+async def list_prelabel_jobs():
+    """获取所有预标注任务"""
+    jobs = await asyncio.to_thread(prelabel_service.get_all_jobs)
+    return [job.to_dict() for job in jobs]
+
+
+@router.get("/jobs/{job_id}")
+async def get_prelabel_job(job_id: str):
+    """获取预标注任务进度"""
+    job = await asyncio.to_thread(prelabel_service.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="预标注任务不存在")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_prelabel_job(job_id: str):
+    """取消预标注任务（当前批完成并保存检查点后停止）"""
+    if prelabel_service.cancel_job(job_id):
+        return {"message": "预标注任务正在取消"}
+    raise HTTPException(status_code=400, detail="无法取消预标注任务")
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_prelabel_job(job_id: str):
+    """从检查点续跑中断、失败或已取消的预标注任务"""
+    if prelabel_service.start_job(job_id, asyncio.get_running_loop()):
+        return {"job_id": job_id, "message": "预标注任务已续跑"}
+    raise HTTPException(status_code=400, detail="无法续跑预标注任务")
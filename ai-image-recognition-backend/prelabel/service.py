@@ -0,0 +1,489 @@
+"""
+服务器端数据集预标注：遍历图片目录或 YOLO data.yaml 的某个划分，
+按 解码（多线程并行）→ 批量推理 → 后处理 的流水线处理，输出 YOLO 标签文件和 / 或数据库标注记录。
+每批处理完成后把进度与游标（最后一张已处理图片的相对路径）写入数据库，进程崩溃后可从游标处续跑。
+"""
+import asyncio
+import bisect
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from ai_models import ai_service
+from annotations.models import AutoAnnotation
+from annotations.store import insert_annotations, upsert_image_content, upsert_images
+from database import SessionLocal
+from image_store.blob_store import blob_store
+from image_store.hashing import fingerprint
+from image_store.service import DEDUP_ENABLED, dedup_service
+from inference.batching import BATCH_MAX_SIZE
+from inference.executor import InferenceQueueFull, inference_executor
+from inference.imaging import decode_image, is_image_file, list_images, load_image
+from .models import PrelabelJobDB
+
+# 并行解码图片的线程数
+PRELABEL_DECODE_WORKERS = int(os.getenv("AI_PRELABEL_DECODE_WORKERS", "4"))
+# 每批推理的图片数，以及提前解码的批数
+PRELABEL_CHUNK_SIZE = int(os.getenv("AI_PRELABEL_CHUNK_SIZE", str(BATCH_MAX_SIZE)))
+PRELABEL_PREFETCH_CHUNKS = int(os.getenv("AI_PRELABEL_PREFETCH_CHUNKS", "2"))
+# 服务启动时是否自动续跑上次中断的任务
+PRELABEL_AUTO_RESUME = os.getenv("AI_PRELABEL_AUTO_RESUME", "false").lower() in ("1", "true", "yes")
+# 推理队列已满时的重试间隔（秒）
+QUEUE_RETRY_SECONDS = 0.2
+# 与检查点一起提交的进度字段；某批提交失败时回退到上一次成功提交的值，续跑不会跳过该批
+PROGRESS_FIELDS = ("processed_images", "failed_images", "skipped_images", "annotation_count", "images_per_second", "cursor")
+
+
+class PrelabelStatus(Enum):
+    """预标注任务状态"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    INTERRUPTED = "interrupted"  # 服务重启时仍在运行，可续跑
+
+
+@dataclass
+class PrelabelConfig:
+    """预标注配置"""
+    source: str  # 图片目录或 data.yaml 路径
+    split: str = "train"  # data.yaml 的划分：train / val / test
+    tool: str = "object_detection"  # object_detection, image_segmentation, image_classification
+    model: Optional[str] = None
+    write_labels: bool = True  # 写 YOLO 标签文件（分类不支持）
+    write_db: bool = False  # 写 auto_annotations 记录
+    labels_dir: Optional[str] = None  # 标签输出目录，默认按 YOLO 约定把路径中的 images 换成 labels
+    overwrite: bool = False  # 是否覆盖已存在的标签文件（默认跳过，避免覆盖人工标注）
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class PrelabelJob:
+    """预标注任务"""
+    job_id: str
+    config: PrelabelConfig
+    status: PrelabelStatus = PrelabelStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    total_images: int = 0
+    processed_images: int = 0
+    failed_images: int = 0
+    skipped_images: int = 0
+    annotation_count: int = 0
+    images_per_second: Optional[float] = None
+    cursor: Optional[str] = None
+    error_message: Optional[str] = None
+    cancel_requested: bool = False
+
+    def to_dict(self):
+        data = asdict(self)
+        data.pop("cancel_requested")
+        data["status"] = self.status.value
+        for name in ("created_at", "started_at", "updated_at", "completed_at"):
+            if data[name]:
+                data[name] = data[name].isoformat()
+        data["progress"] = (
+            (self.processed_images + self.skipped_images) / self.total_images * 100 if self.total_images else 0.0
+        )
+        return data
+
+    @classmethod
+    def from_db(cls, row: PrelabelJobDB) -> "PrelabelJob":
+        return cls(
+            job_id=row.job_id,
+            config=PrelabelConfig(**row.config),
+            status=PrelabelStatus(row.status),
+            created_at=row.created_at,
+            started_at=row.started_at,
+            updated_at=row.updated_at,
+            completed_at=row.completed_at,
+            total_images=row.total_images or 0,
+            processed_images=row.processed_images or 0,
+            failed_images=row.failed_images or 0,
+            skipped_images=row.skipped_images or 0,
+            annotation_count=row.annotation_count or 0,
+            images_per_second=row.images_per_second,
+            cursor=row.cursor,
+            error_message=row.error_message,
+        )
+
+
+@dataclass
+class DatasetImage:
+    """数据集中的一张图片"""
+    path: Path
+    relative: str  # 相对数据集根目录的 posix 路径，作为排序键、游标与数据库中的文件名
+    label_path: Path
+
+
+def _relative(path: Path, root: Path) -> str:
+    try:
+        return path.resolve().relative_to(root.resolve()).as_posix()
+    except ValueError:
+        return path.resolve().as_posix()
+
+
+def _default_label_path(path: Path, root: Path) -> Path:
+    """YOLO 约定：把路径中最后一个 images 目录换成 labels；没有 images 目录时放在 <根目录>/labels 下"""
+    parts = list(path.parts)
+    for i in range(len(parts) - 2, -1, -1):
+        if parts[i] == "images":
+            parts[i] = "labels"
+            return Path(*parts).with_suffix(".txt")
+    return (root / "labels" / _relative(path, root)).with_suffix(".txt")
+
+
+def _split_images(root: Path, entry: Any) -> List[Path]:
+    """data.yaml 中一个划分的取值：目录、图片列表 txt 文件，或它们的列表"""
+    entries = entry if isinstance(entry, (list, tuple)) else [entry]
+    paths: List[Path] = []
+    for item in entries:
+        p = Path(str(item))
+        p = p if p.is_absolute() else root / p
+        if p.is_dir():
+            paths.extend(list_images(str(p)))
+        elif p.is_file() and p.suffix == ".txt":
+            for line in p.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if line and is_image_file(line):
+                    image_path = Path(line)
+                    paths.append(image_path if image_path.is_absolute() else (p.parent / image_path).resolve())
+        else:
+            raise FileNotFoundError(f"数据集划分路径不存在: {p}")
+    return paths
+
+
+def resolve_dataset(config: PrelabelConfig) -> Tuple[Path, List[DatasetImage], Optional[Dict[int, str]]]:
+    """解析数据源，返回 (数据集根目录, 按相对路径排序的图片列表, data.yaml 中的类别表)"""
+    source = Path(config.source)
+    names = None
+    if source.is_file() and source.suffix in (".yaml", ".yml"):
+        with source.open("r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        root = Path(data.get("path") or source.parent)
+        if not root.is_absolute():
+            root = (source.parent / root).resolve()
+        if config.split not in data:
+            raise ValueError(f"data.yaml 中没有划分: {config.split}")
+        paths = _split_images(root, data[config.split])
+        if isinstance(data.get("names"), dict):
+            names = {int(k): v for k, v in data["names"].items()}
+        elif isinstance(data.get("names"), list):
+            names = dict(enumerate(data["names"]))
+    elif source.is_dir():
+        root = source
+        paths = list_images(str(source))
+    else:
+        raise FileNotFoundError(f"数据源不存在或不是目录 / data.yaml: {config.source}")
+
+    labels_dir = Path(config.labels_dir) if config.labels_dir else None
+    images = {}
+    for path in paths:
+        relative = _relative(path, root)
+        label_path = (labels_dir / relative).with_suffix(".txt") if labels_dir else _default_label_path(path, root)
+        images[relative] = DatasetImage(path=path, relative=relative, label_path=label_path)
+    return root, [images[key] for key in sorted(images)], names
+
+
+def _clip(value: float) -> float:
+    return min(1.0, max(0.0, value))
+
+
+def yolo_label_lines(tool: str, records: List[Dict[str, Any]], name_to_id: Dict[str, int]) -> List[str]:
+    """把结构化推理结果转换为 YOLO 标签行；类别不在类别表中的结果被丢弃"""
+    lines = []
+    for record in records:
+        class_id = name_to_id.get(record["class_name"])
+        if class_id is None:
+            continue
+        if tool == "object_detection":
+            x, y, w, h = record["bbox_percent"]
+            values = [_clip(x + w / 2), _clip(y + h / 2), _clip(w), _clip(h)]
+        else:
+            values = [_clip(coord / 100) for point in record["points"] for coord in point]
+        lines.append(" ".join([str(class_id)] + [f"{v:.6f}" for v in values]))
+    return lines
+
+
+def _read_image(path: Path, keep_bytes: bool) -> Tuple[Optional[bytes], Any]:
+    """解码图片，返回 (原始字节, BGR ndarray)；写库且开启去重时保留原始字节，用于登记指纹与保存原图"""
+    if not keep_bytes:
+        return None, load_image(str(path))
+    data = path.read_bytes()
+    return data, decode_image(data)
+
+
+class PrelabelService:
+    """预标注任务管理"""
+
+    def __init__(self):
+        self.jobs: Dict[str, PrelabelJob] = {}
+        self.running_jobs: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def create_job(self, config: PrelabelConfig) -> str:
+        """创建任务并写入数据库；配置不合法时抛出 ValueError"""
+        ai_service.resolve_tool_model(config.tool, config.model)
+        if not config.write_labels and not config.write_db:
+            raise ValueError("write_labels 与 write_db 至少开启一个")
+        if config.write_labels and config.tool == "image_classification":
+            raise ValueError("分类任务没有 YOLO 标签文件格式，请使用 write_db")
+
+        job_id = f"Prelabel_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        job = PrelabelJob(job_id=job_id, config=config)
+        db = SessionLocal()
+        try:
+            db.add(PrelabelJobDB(
+                job_id=job_id, status=job.status.value, config=config.to_dict(), created_at=job.created_at
+            ))
+            db.commit()
+        finally:
+            db.close()
+        self.jobs[job_id] = job
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[PrelabelJob]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        db = SessionLocal()
+        try:
+            row = db.query(PrelabelJobDB).filter(PrelabelJobDB.job_id == job_id).first()
+            return PrelabelJob.from_db(row) if row else None
+        finally:
+            db.close()
+
+    def get_all_jobs(self) -> List[PrelabelJob]:
+        """数据库中的所有任务（运行中的任务使用内存中的最新进度）"""
+        db = SessionLocal()
+        try:
+            rows = db.query(PrelabelJobDB).order_by(PrelabelJobDB.created_at.desc()).all()
+            return [self.jobs.get(row.job_id) or PrelabelJob.from_db(row) for row in rows]
+        finally:
+            db.close()
+
+    def start_job(self, job_id: str, loop: asyncio.AbstractEventLoop) -> bool:
+        """启动（或续跑）任务。推理通过 loop 提交到全局推理执行器，与在线请求共享并发限制。"""
+        with self._lock:
+            job = self.get_job(job_id)
+            resumable = (PrelabelStatus.PENDING, PrelabelStatus.INTERRUPTED, PrelabelStatus.FAILED, PrelabelStatus.CANCELLED)
+            if job is None or job.status not in resumable or job_id in self.running_jobs:
+                return False
+            job.status = PrelabelStatus.RUNNING
+            job.cancel_requested = False
+            job.error_message = None
+            job.started_at = datetime.utcnow()
+            job.completed_at = None
+            self.jobs[job_id] = job
+            thread = threading.Thread(target=self._run_job, args=(job, loop), daemon=True)
+            self.running_jobs[job_id] = thread
+            thread.start()
+            return True
+
+    def cancel_job(self, job_id: str) -> bool:
+        """请求取消任务，当前批处理完并保存检查点后停止"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in (PrelabelStatus.PENDING, PrelabelStatus.RUNNING):
+            return False
+        job.cancel_requested = True
+        if job_id not in self.running_jobs:
+            job.status = PrelabelStatus.CANCELLED
+            self._save(job)
+        return True
+
+    def recover(self, loop: asyncio.AbstractEventLoop):
+        """服务启动时调用：上次仍在运行的任务标记为 interrupted，开启 AI_PRELABEL_AUTO_RESUME 时自动续跑"""
+        db = SessionLocal()
+        try:
+            rows = db.query(PrelabelJobDB).filter(PrelabelJobDB.status == PrelabelStatus.RUNNING.value).all()
+            for row in rows:
+                row.status = PrelabelStatus.INTERRUPTED.value
+            db.commit()
+            job_ids = [row.job_id for row in rows]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            if PRELABEL_AUTO_RESUME:
+                print(f"🔄 续跑中断的预标注任务: {job_id}")
+                self.start_job(job_id, loop)
+            else:
+                print(f"⚠️ 预标注任务 {job_id} 上次未完成，可调用 /api/prelabel/jobs/{job_id}/resume 续跑")
+
+    def _save(self, job: PrelabelJob, db=None):
+        """把任务进度与游标写入数据库；传入 db 时不提交（由调用方与标注记录一起提交）"""
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            job.updated_at = datetime.utcnow()
+            db.query(PrelabelJobDB).filter(PrelabelJobDB.job_id == job.job_id).update({
+                "status": job.status.value,
+                "started_at": job.started_at,
+                "updated_at": job.updated_at,
+                "completed_at": job.completed_at,
+                "total_images": job.total_images,
+                "processed_images": job.processed_images,
+                "failed_images": job.failed_images,
+                "skipped_images": job.skipped_images,
+                "annotation_count": job.annotation_count,
+                "images_per_second": job.images_per_second,
+                "cursor": job.cursor,
+                "error_message": job.error_message,
+            })
+            if own_session:
+                db.commit()
+        finally:
+            if own_session:
+                db.close()
+
+    def _infer(self, loop, config: PrelabelConfig, images: List[Any]):
+        """在推理执行器中批量推理；推理队列满时等待后重试"""
+        model_key = ai_service.resolve_tool_model(config.tool, config.model)
+        while True:
+            future = asyncio.run_coroutine_threadsafe(
+                inference_executor.run(model_key, ai_service.prelabel_batch, config.tool, images, config.model), loop
+            )
+            try:
+                return future.result()
+            except InferenceQueueFull:
+                time.sleep(QUEUE_RETRY_SECONDS)
+
+    def _run_job(self, job: PrelabelJob, loop):
+        config = job.config
+        db = SessionLocal()
+        committed = {name: getattr(job, name) for name in PROGRESS_FIELDS}
+        try:
+            root, images, dataset_names = resolve_dataset(config)
+            job.total_images = len(images)
+
+            # 类别映射：data.yaml 给出类别表时按类别名对齐到数据集的类别 id，否则使用模型自身的类别 id
+            class_names = dataset_names or ai_service.class_names(config.tool, config.model)
+            name_to_id = {name: class_id for class_id, name in class_names.items()}
+            if config.write_labels and dataset_names is None:
+                classes_path = (
+                    Path(config.labels_dir) / "classes.txt" if config.labels_dir
+                    else _default_label_path(root / "classes.txt", root)
+                )
+                classes_path.parent.mkdir(parents=True, exist_ok=True)
+                classes_path.write_text(
+                    "\n".join(class_names[i] for i in sorted(class_names)) + "\n", encoding="utf-8"
+                )
+
+            # 从游标之后继续
+            start = bisect.bisect_right([image.relative for image in images], job.cursor) if job.cursor else 0
+            remaining = images[start:]
+            if start:
+                print(f"预标注任务 {job.job_id} 从第 {start + 1} 张续跑（游标 {job.cursor}）")
+            self._save(job)
+
+            started = time.perf_counter()
+            processed_this_run = 0
+            chunks = (remaining[i:i + PRELABEL_CHUNK_SIZE] for i in range(0, len(remaining), PRELABEL_CHUNK_SIZE))
+            # 写库时与 /api/auto_annotate 一样按内容登记图片（同名但内容不同的图片另存为新的文件名），提交后保存原图
+            dedup = config.write_db and DEDUP_ENABLED
+            with ThreadPoolExecutor(max_workers=PRELABEL_DECODE_WORKERS, thread_name_prefix="prelabel-decode") as decoders:
+                def submit(chunk):
+                    # 只写标签且不覆盖时，已有标签文件的图片直接跳过，不解码
+                    skip = config.write_labels and not config.write_db and not config.overwrite
+                    return [
+                        (image, None if skip and image.label_path.exists() else decoders.submit(_read_image, image.path, dedup))
+                        for image in chunk
+                    ]
+
+                pending = deque(submit(chunk) for _, chunk in zip(range(PRELABEL_PREFETCH_CHUNKS), chunks))
+                while pending:
+                    if job.cancel_requested:
+                        job.status = PrelabelStatus.CANCELLED
+                        break
+                    batch = pending.popleft()
+                    next_chunk = next(chunks, None)
+                    if next_chunk:
+                        pending.append(submit(next_chunk))
+
+                    decoded, failed = [], 0
+                    for image, future in batch:
+                        if future is None:
+                            job.skipped_images += 1
+                            continue
+                        try:
+                            decoded.append((image, *future.result()))
+                        except Exception as e:
+                            print(f"预标注解码失败 {image.path}: {e}")
+                            failed += 1
+
+                    results = self._infer(loop, config, [array for _, _, array in decoded]) if decoded else []
+                    annotation_rows, blobs = [], []
+                    if dedup:
+                        image_ids = {}
+                        for image, data, _ in decoded:
+                            content_hash = dedup_service.register(db, fingerprint(data)).content_hash
+                            image_ids[image.relative] = upsert_image_content(db, image.relative, content_hash)[0]
+                            blobs.append((content_hash, data))
+                    else:
+                        image_ids = upsert_images(db, [image.relative for image, _, _ in decoded]) if config.write_db else {}
+                    for (image, _, _), (annotations, records) in zip(decoded, results):
+                        if config.write_labels:
+                            existing = image.label_path.exists()
+                            if config.overwrite or not existing:
+                                image.label_path.parent.mkdir(parents=True, exist_ok=True)
+                                lines = yolo_label_lines(config.tool, records, name_to_id)
+                                image.label_path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+                        if config.write_db:
+                            annotation_rows.extend((image_ids[image.relative], annotation) for annotation in annotations)
+                        job.annotation_count += len(annotations)
+
+                    job.processed_images += len(decoded) + failed
+                    job.failed_images += failed
+                    processed_this_run += len(decoded) + failed
+                    job.cursor = batch[-1][0].relative
+                    elapsed = time.perf_counter() - started
+                    job.images_per_second = processed_this_run / elapsed if elapsed > 0 else None
+                    # 标注记录与检查点在同一事务中提交，续跑时不会重复写入
+                    insert_annotations(db, AutoAnnotation, config.tool, annotation_rows)
+                    self._save(job, db)
+                    db.commit()
+                    committed = {name: getattr(job, name) for name in PROGRESS_FIELDS}
+                    # 原图已存在时 put 不重复写入
+                    for content_hash, data in blobs:
+                        try:
+                            blob_store.put(content_hash, data)
+                        except OSError as e:
+                            print(f"⚠️ 保存原图 {content_hash} 失败: {e}")
+
+            if job.status == PrelabelStatus.RUNNING:
+                job.status = PrelabelStatus.COMPLETED
+            print(f"✅ 预标注任务 {job.job_id} 结束: {job.status.value}，"
+                  f"{job.processed_images}/{job.total_images} 张，{job.images_per_second or 0:.1f} img/s")
+        except Exception as e:
+            db.rollback()
+            # 未提交批次的标注记录已回滚，进度与游标也回退，续跑时重新处理该批
+            for name, value in committed.items():
+                setattr(job, name, value)
+            job.status = PrelabelStatus.FAILED
+            job.error_message = str(e)
+            print(f"❌ 预标注任务 {job.job_id} 失败: {e}")
+        finally:
+            job.completed_at = datetime.utcnow()
+            try:
+                self._save(job)
+            finally:
+                db.close()
+                self.running_jobs.pop(job.job_id, None)
+
+
+# 全局预标注服务实例
+prelabel_service = PrelabelService()
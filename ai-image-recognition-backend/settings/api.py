@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 
-from database import get_db
+from database import get_async_db
 from .models import SystemSetting
 import subprocess
 import platform
@@ -39,8 +40,8 @@ async def select_path_dialog():
         return {"path": "", "error": str(e)}
 
 @router.get("/", response_model=List[SettingItem])
-async def get_settings(db: Session = Depends(get_db)):
-    settings = db.query(SystemSetting).all()
+async def get_settings(db: AsyncSession = Depends(get_async_db)):
+    settings = list((await db.scalars(select(SystemSetting))).all())
     # Ensure default training path exists if not in DB
     keys = [s.key for s in settings]
     if "training_output_path" not in keys:
@@ -50,14 +51,14 @@ async def get_settings(db: Session = Depends(get_db)):
             description="模型训练结果输出路径"
         )
         db.add(default_setting)
-        db.commit()
-        db.refresh(default_setting)
+        await db.commit()
+        await db.refresh(default_setting)
         settings.append(default_setting)
     return settings
 
 @router.post("/", response_model=SettingItem)
-async def update_setting(item: SettingItem, db: Session = Depends(get_db)):
-    setting = db.query(SystemSetting).filter(SystemSetting.key == item.key).first()
+async def update_setting(item: SettingItem, db: AsyncSession = Depends(get_async_db)):
+    setting = await db.scalar(select(SystemSetting).where(SystemSetting.key == item.key))
     if setting:
         setting.value = item.value
         if item.description:
@@ -66,13 +67,13 @@ async def update_setting(item: SettingItem, db: Session = Depends(get_db)):
         setting = SystemSetting(key=item.key, value=item.value, description=item.description)
         db.add(setting)
     
-    db.commit()
-    db.refresh(setting)
+    await db.commit()
+    await db.refresh(setting)
     return setting
 
 @router.get("/{key}", response_model=SettingItem)
-async def get_setting(key: str, db: Session = Depends(get_db)):
-    setting = db.query(SystemSetting).filter(SystemSetting.key == key).first()
+async def get_setting(key: str, db: AsyncSession = Depends(get_async_db)):
+    setting = await db.scalar(select(SystemSetting).where(SystemSetting.key == key))
     if not setting:
         if key == "training_output_path":
             return SettingItem(key="training_output_path", value="runs/train", description="模型训练结果输出路径")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试使用独立的临时 SQLite 数据库，导入 database 之前设置
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_auto_annotate.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+"""
+数据集导出读取原图的范围：images_dir 必须位于 AI_DATASET_IMAGES_ROOT 之下，
+数据库中的文件名拼接后跳出 images_dir 的视为找不到；图片存储中有原图时优先使用。
+"""
+import io
+import uuid
+import zipfile
+
+import pytest
+from PIL import Image as PILImage
+
+import dataset_export.exporter as exporter_module
+from annotations.models import AutoAnnotation, Image
+from database import Base, SessionLocal, engine
+from dataset_export.archive import ArchiveSink
+from dataset_export.exporter import DatasetExporter, ExportConfig
+from image_store.blob_store import blob_store
+
+_BOX = {"type": "rectanglelabels", "value": {"x": 10, "y": 10, "width": 20, "height": 20, "rectanglelabels": ["cat"]}}
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (8, 6), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def layout(tmp_path, monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    root = tmp_path / "datasets"
+    (root / "imgs").mkdir(parents=True)
+    (tmp_path / "secret.png").write_bytes(_png("red"))
+    monkeypatch.setattr(exporter_module, "DATASET_IMAGES_ROOT", str(root))
+    monkeypatch.setattr(blob_store, "root", str(tmp_path / "blobs"))
+    return tmp_path
+
+
+def _add_images(filenames, content_hash=None):
+    prefix = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        for filename in filenames:
+            image = Image(filename=f"{prefix}/{filename}", content_hash=content_hash)
+            db.add(image)
+            db.flush()
+            db.add(AutoAnnotation(image_id=image.id, tool_type="object_detection", annotation_data=_BOX))
+        db.commit()
+    finally:
+        db.close()
+    return prefix
+
+
+def _export(config):
+    exporter = DatasetExporter(config)
+    db = SessionLocal()
+    try:
+        data = b"".join(exporter.run(db, ArchiveSink("zip")))
+    finally:
+        db.close()
+    return exporter.stats, zipfile.ZipFile(io.BytesIO(data)).namelist()
+
+
+def test_images_dir_outside_root_is_rejected(layout):
+    with pytest.raises(ValueError):
+        ExportConfig(images_dir=str(layout)).validate()
+    with pytest.raises(ValueError):
+        ExportConfig(images_dir="../").validate()
+
+
+def test_filenames_cannot_escape_images_dir(layout):
+    # 文件名按 {prefix}/... 存储，拼接到 images_dir 后跳出两级到 tmp_path/secret.png
+    prefix = _add_images(["../../../secret.png"])
+    for fmt in ("yolo", "coco"):
+        stats, names = _export(ExportConfig(format=fmt, prefix=prefix, images_dir="imgs"))
+        assert stats.missing_images == 1
+        assert not any(name.startswith("images/") for name in names)
+
+
+def test_originals_come_from_blob_store(layout):
+    content_hash = "ab" * 32
+    blob_store.put(content_hash, _png("blue"))
+    prefix = _add_images(["x.png"], content_hash)
+    stats, names = _export(ExportConfig(format="coco", prefix=prefix))
+    assert stats.images == 1 and stats.missing_images == 0
+    assert any(name.startswith("images/") and name.endswith("x.png") for name in names)
+
+
+def test_unreadable_originals_are_skipped(layout):
+    prefix = _add_images(["broken.png", "ok.png"])
+    images_dir = layout / "datasets" / "imgs" / prefix
+    images_dir.mkdir()
+    (images_dir / "broken.png").write_bytes(b"not an image")
+    (images_dir / "ok.png").write_bytes(_png("green"))
+    stats, names = _export(ExportConfig(format="coco", prefix=prefix, images_dir="imgs"))
+    assert (stats.images, stats.unreadable_images) == (1, 1)
+    assert any(name.startswith("annotations/") for name in names)
@@ -0,0 +1,48 @@
+"""
+检测模型的分支选择：ultralytics YOLO 继承自 torch.nn.Module，必须走 YOLO 的推理路径，
+不能被当作 torchvision 检测模型（否则 detect_batch 会回退到模拟数据）。
+"""
+import numpy as np
+import pytest
+
+ultralytics = pytest.importorskip("ultralytics")
+
+from ai_models import AIModelService, is_ultralytics_model  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def yolo_model():
+    # 按配置文件构建随机权重的模型，不需要下载权重
+    return ultralytics.YOLO("yolov8n.yaml")
+
+
+@pytest.fixture(scope="module")
+def service(yolo_model):
+    service = AIModelService()
+    service.registry.register("YOLO-test", "detection", lambda: yolo_model)
+    return service
+
+
+def _images():
+    return [np.zeros((64, 96, 3), dtype=np.uint8), np.full((48, 48, 3), 127, dtype=np.uint8)]
+
+
+def test_model_kind(yolo_model):
+    torchvision = pytest.importorskip("torchvision")
+    detector = torchvision.models.detection.ssdlite320_mobilenet_v3_large(weights=None, weights_backbone=None)
+    assert is_ultralytics_model(yolo_model)
+    assert not is_ultralytics_model(detector.eval())
+
+
+def test_detect_batch_runs_yolo(service):
+    results = service.detect_batch(_images(), "YOLO-test")
+    assert len(results) == 2
+    for annotations, boxes in results:
+        # 推理失败回退到模拟数据时绘制数据为 None
+        assert boxes is not None
+        assert len(annotations) == len(boxes["xyxy"])
+
+
+def test_detect_objects_runs_yolo(service):
+    detections = service.detect_objects(_images()[0], "YOLO-test")
+    assert detections != service._generate_mock_detections()
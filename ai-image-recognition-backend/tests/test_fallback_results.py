@@ -0,0 +1,53 @@
+"""
+模型不可用或推理出错时返回的模拟 / 空结果必须带 FallbackResult 标记，
+在线接口据此不写入结果缓存、不持久化到 image_blob_results。
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+
+from ai_models import AIModelService, is_fallback  # noqa: E402
+
+
+def _broken_loader():
+    raise OSError("weights unavailable")
+
+
+@pytest.fixture
+def service():
+    service = AIModelService()
+    service.registry.register("Broken-det", "detection", _broken_loader)
+    service.registry.register("Broken-seg", "segmentation", _broken_loader)
+    service.registry.register("Broken-cls", "classification", _broken_loader)
+    return service
+
+
+def _image():
+    return np.zeros((32, 32, 3), dtype=np.uint8)
+
+
+def test_detection_fallback_is_marked(service):
+    (annotations, boxes), = service.detect_batch([_image()], "Broken-det")
+    assert boxes is None and is_fallback(annotations)
+    assert is_fallback(service.detect_objects(_image(), "Broken-det"))
+
+
+def test_classification_fallback_is_marked(service):
+    assert all(is_fallback(result) for result in service.classify_batch([_image()], "Broken-cls"))
+    assert is_fallback(service.classify_image(_image(), "Broken-cls"))
+
+
+def test_segmentation_fallback_is_marked(service):
+    assert is_fallback(service.segment_objects(b"not an image", "Broken-seg"))
+
+
+def test_prelabel_rejects_segmentation_fallback(service):
+    # 预标注任务不能把模拟 / 空的分割结果当作真实标注写库或写标签文件
+    with pytest.raises(RuntimeError):
+        service.prelabel_batch("image_segmentation", [b"not an image"], "Broken-seg")
+
+
+def test_real_results_are_not_marked():
+    assert not is_fallback([])
+    assert not is_fallback([{"class_name": "cat", "confidence": 0.9}])
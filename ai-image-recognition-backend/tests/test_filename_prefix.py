@@ -0,0 +1,34 @@
+"""
+文件名前缀过滤区分大小写（SQLite 的 LIKE 不区分 ASCII 大小写），并且可以使用文件名索引。
+"""
+import uuid
+
+from sqlalchemy import select
+
+from annotations.models import Image
+from annotations.store import filename_prefix_clause, list_images_page
+from database import Base, SessionLocal, engine
+
+
+def test_prefix_is_case_sensitive():
+    Base.metadata.create_all(bind=engine)
+    tag = uuid.uuid4().hex
+    names = [f"{tag}/Cat.jpg", f"{tag}/cat.jpg", f"{tag}/Cat%_.jpg", f"{tag}/Cau.jpg", f"{tag}/Cat\U0010ffff.jpg"]
+    db = SessionLocal()
+    try:
+        db.add_all(Image(filename=name) for name in names)
+        db.commit()
+        found = {row["filename"] for row in list_images_page(db, prefix=f"{tag}/Cat")}
+        assert found == {f"{tag}/Cat.jpg", f"{tag}/Cat%_.jpg", f"{tag}/Cat\U0010ffff.jpg"}
+        found = {row["filename"] for row in list_images_page(db, prefix=f"{tag}/Cat%")}
+        assert found == {f"{tag}/Cat%_.jpg"}
+    finally:
+        db.close()
+
+
+def test_prefix_uses_filename_index():
+    query = select(Image.id).where(filename_prefix_clause(Image.filename, "Cat", "sqlite"))
+    with engine.connect() as conn:
+        compiled = query.compile(conn, compile_kwargs={"literal_binds": True})
+        plan = " ".join(str(row[-1]) for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+    assert "INDEX" in plan.upper()
@@ -0,0 +1,41 @@
+"""
+模型注册表的加载失败重试：失败后 AI_MODEL_RETRY_SECONDS 秒内不再尝试加载，之后的请求重新加载，成功后清除错误。
+"""
+from inference import registry as registry_module
+from inference.registry import ModelRegistry
+
+
+class _FlakyLoader:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("download interrupted")
+        return object()
+
+
+def test_failed_load_is_retried_after_backoff(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(registry_module.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(registry_module, "MODEL_RETRY_SECONDS", 30.0)
+    loader = _FlakyLoader(failures=1)
+    registry = ModelRegistry()
+    registry.register("flaky", "detection", loader)
+
+    assert registry.get("flaky") is None
+    status, = registry.status()["models"]
+    assert status["error"] == "download interrupted" and status["retry_in_seconds"] == 30.0
+
+    # 退避期内不重试
+    clock[0] += 10
+    assert registry.get("flaky") is None
+    assert loader.calls == 1
+
+    clock[0] += 25
+    assert registry.get("flaky") is not None
+    assert loader.calls == 2
+    status, = registry.status()["models"]
+    assert status["error"] is None and status["retry_in_seconds"] is None
@@ -0,0 +1,52 @@
+"""
+预标注写库与 /api/auto_annotate 一样按内容登记图片：同名但内容不同的图片另存为新的图片记录，
+不会把标注追加到已有的另一张图片上；事务提交后保存原图。
+"""
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+cv2 = pytest.importorskip("cv2")
+
+from ai_models import ai_service  # noqa: E402
+from annotations.models import AutoAnnotation, Image  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from image_store.blob_store import blob_store  # noqa: E402
+from prelabel.service import PrelabelConfig, PrelabelService, PrelabelStatus  # noqa: E402
+
+_BOX = {"type": "rectanglelabels", "value": {"x": 10, "y": 10, "width": 20, "height": 20, "rectanglelabels": ["cat"]}}
+
+
+def _run(service, source):
+    job = service.get_job(service.create_job(PrelabelConfig(source=str(source), write_labels=False, write_db=True)))
+    job.status = PrelabelStatus.RUNNING
+    service._run_job(job, loop=None)
+    assert job.status == PrelabelStatus.COMPLETED, job.error_message
+
+
+def test_same_name_different_content(tmp_path, monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(blob_store, "root", str(tmp_path / "blobs"))
+    monkeypatch.setattr(ai_service, "class_names", lambda tool, model: {0: "cat"})
+    service = PrelabelService()
+    monkeypatch.setattr(service, "_infer", lambda loop, config, images: [([_BOX], []) for _ in images])
+
+    # 文件名按相对路径登记，两个目录下的 {name}.png 同名但内容不同
+    name = uuid.uuid4().hex
+    for value in (0, 255):
+        source = tmp_path / f"run{value}"
+        source.mkdir()
+        cv2.imwrite(str(source / f"{name}.png"), np.full((16, 16, 3), value, dtype=np.uint8))
+        _run(service, source)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(Image.id, Image.content_hash).where(Image.filename.like(f"{name}%"))).all()
+        hashes = [content_hash for _, content_hash in rows]
+        counts = [db.query(AutoAnnotation).filter(AutoAnnotation.image_id == image_id).count() for image_id, _ in rows]
+    finally:
+        db.close()
+    assert len(set(hashes)) == 2 and counts == [1, 1]
+    assert all(blob_store.exists(content_hash) for content_hash in hashes)
@@ -0,0 +1,68 @@
+"""
+YOLO 模型的预标注：类别 id 与 classes.txt 使用模型自身的 names（从 0 开始），
+而不是 torchvision 的 COCO 91 类表（0 为 __background__）。
+"""
+import numpy as np
+import pytest
+import torch
+
+cv2 = pytest.importorskip("cv2")
+
+from ai_models import ai_service  # noqa: E402
+from database import Base, engine  # noqa: E402
+from prelabel.models import PrelabelJobDB  # noqa: E402
+from prelabel.service import PrelabelConfig, PrelabelService, PrelabelStatus  # noqa: E402
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = np.array(xyxy, dtype=float), np.array(conf), np.array(cls)
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class _StubYOLO(torch.nn.Module):
+    """模仿 ultralytics YOLO：继承 nn.Module，带 predictor 与 names，每张图片返回固定类别的两个框"""
+    names = {0: "cat", 1: "dog", 2: "bird"}
+    predictor = None
+
+    def forward(self, images):
+        return [_Result(_Boxes([[0, 0, 32, 32], [16, 16, 64, 48]], [0.9, 0.8], [2, 0])) for _ in images]
+
+
+@pytest.fixture(scope="module")
+def stub_model():
+    model = _StubYOLO()
+    ai_service.registry.register("YOLO-prelabel-test", "detection", lambda: model)
+    return model
+
+
+def test_yolo_job_uses_model_names(tmp_path, monkeypatch, stub_model):
+    Base.metadata.create_all(bind=engine, tables=[PrelabelJobDB.__table__])
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    for i in range(3):
+        cv2.imwrite(str(images_dir / f"{i}.jpg"), np.full((64, 64, 3), 40 * i, dtype=np.uint8))
+
+    service = PrelabelService()
+    # 不经过事件循环与推理执行器，直接批量推理
+    monkeypatch.setattr(service, "_infer", lambda loop, config, images: ai_service.prelabel_batch(
+        config.tool, images, config.model
+    ))
+    job_id = service.create_job(PrelabelConfig(source=str(images_dir), model="YOLO-prelabel-test"))
+    job = service.get_job(job_id)
+    job.status = PrelabelStatus.RUNNING
+    service._run_job(job, loop=None)
+    assert job.status == PrelabelStatus.COMPLETED, job.error_message
+
+    classes = (tmp_path / "labels" / "classes.txt").read_text(encoding="utf-8").splitlines()
+    assert classes == ["cat", "dog", "bird"]
+    for i in range(3):
+        lines = (tmp_path / "labels" / f"{i}.txt").read_text(encoding="utf-8").splitlines()
+        assert [int(line.split()[0]) for line in lines] == [2, 0]
@@ -0,0 +1,46 @@
+"""
+预标注任务的检查点：某批的标注记录提交失败时，游标与计数不能前进，
+否则续跑会跳过这一批。
+"""
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+import prelabel.service as prelabel_module  # noqa: E402
+from ai_models import ai_service  # noqa: E402
+from database import Base, engine  # noqa: E402
+from prelabel.models import PrelabelJobDB  # noqa: E402
+from prelabel.service import PrelabelConfig, PrelabelService, PrelabelStatus  # noqa: E402
+
+
+def test_failed_commit_keeps_cursor(tmp_path, monkeypatch):
+    Base.metadata.create_all(bind=engine, tables=[PrelabelJobDB.__table__])
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    for i in range(3):
+        cv2.imwrite(str(images_dir / f"{i}.jpg"), np.zeros((16, 16, 3), dtype=np.uint8))
+
+    calls = []
+
+    def insert_annotations(db, model, tool, rows):
+        calls.append(tool)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(prelabel_module, "PRELABEL_CHUNK_SIZE", 1)
+    monkeypatch.setattr(prelabel_module, "insert_annotations", insert_annotations)
+    monkeypatch.setattr(ai_service, "class_names", lambda tool, model: {0: "cat"})
+    service = PrelabelService()
+    monkeypatch.setattr(service, "_infer", lambda loop, config, images: [([], []) for _ in images])
+
+    job_id = service.create_job(PrelabelConfig(source=str(images_dir)))
+    job = service.get_job(job_id)
+    job.status = PrelabelStatus.RUNNING
+    service._run_job(job, loop=None)
+
+    assert job.status == PrelabelStatus.FAILED
+    assert (job.cursor, job.processed_images) == ("0.jpg", 1)
+    # 数据库中的检查点同样停在最后一次成功提交的批次
+    row = PrelabelService().get_job(job_id)
+    assert (row.cursor, row.processed_images) == ("0.jpg", 1)
@@ -3,7 +3,7 @@ import uuid
 import asyncio
 import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from enum import Enum
 from dataclasses import dataclass, asdict
 import json
@@ -127,6 +127,12 @@ class TrainingService:
     def __init__(self):
         self.tasks: Dict[str, TrainingTask] = {}
         self.running_tasks: Dict[str, threading.Thread] = {}
+        # 训练成功完成后依次调用的回调，例如自动评估（见 evaluation/model_eval.py）
+        self.completion_listeners: List[Callable[[TrainingTask], None]] = []
+    
+    def add_completion_listener(self, listener: Callable[[TrainingTask], None]):
+        """登记训练完成回调；回调在训练线程中执行，抛出的异常只记录日志"""
+        self.completion_listeners.append(listener)
         
     def create_task(self, training_type: TrainingType, config: TrainingConfig) -> str:
         """创建训练任务"""
@@ -223,6 +229,13 @@ class TrainingService:
             task.progress = 100.0
             if task.task_id in self.running_tasks:
                 del self.running_tasks[task.task_id]
+        
+        if task.status == TrainingStatus.COMPLETED:
+            for listener in self.completion_listeners:
+                try:
+                    listener(task)
+                except Exception as e:
+                    self._log_message(task, f"训练完成回调失败: {str(e)}")
     
     def _run_incremental_training(self, task: TrainingTask) -> Optional[Dict]:
         """执行增量训练 (使用新的 IncrementalTrainer)"""
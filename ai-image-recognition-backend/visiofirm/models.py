@@ -7,7 +7,7 @@ class VisioFirmAnnotation(Base):
     __tablename__ = "visiofirm_annotations"
     
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String)
+    filename = Column(String, index=True)
     tool_type = Column(String)  # object_detection, image_classification, image_segmentation
     model = Column(String, nullable=True)
     annotation_data = Column(JSON)
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse
 from typing import List, Optional
+import asyncio
 import json
-import os
-import uuid
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 
 # 导入数据库和AI模型服务
-from database import get_db
-from ai_models import ai_service
+from database import get_async_db
+from ai_models import ai_service, decode_image, is_fallback
+from inference.executor import inference_executor, InferenceQueueFull
+from inference.result_cache import result_cache
 from .models import VisioFirmAnnotation
 
 router = APIRouter(
@@ -19,13 +20,96 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _model_key(tool, model):
+    """请求实际使用的模型名，用作并发控制与结果缓存的键"""
+    return ai_service.resolve_tool_model(tool, model)
+
+async def _annotate(image_bytes, tool, model, category_list):
+    """对一张图片执行推理并转换为前端需要的标注格式，返回 (标注列表, 是否为模拟 / 回退结果)"""
+    # 在内存中解码上传的图像，各工具共用同一份解码结果（不再写临时文件）
+    decoded_image = await asyncio.to_thread(decode_image, image_bytes)
+
+    # 根据工具类型选择不同的标注方法
+    annotations = []
+    fallback = False
+    if tool == "object_detection":
+        # 使用AI服务进行边界框检测
+        detections = await inference_executor.run(
+            _model_key(tool, model), ai_service.detect_objects, decoded_image, model_name=model
+        )
+        fallback = is_fallback(detections)
+
+        # 转换为前端需要的格式
+        for det in detections:
+            class_name = det["class_name"]
+            if category_list and class_name not in category_list:
+                continue
+                
+            # 从bbox_percent中获取百分比坐标
+            x_percent, y_percent, w_percent, h_percent = det["bbox_percent"]
+            
+            annotations.append({
+                "type": "bbox",
+                "label": class_name,
+                "confidence": det["confidence"],
+                "bbox": {
+                    "x": x_percent * 100,  # 转换为百分比
+                    "y": y_percent * 100,  # 转换为百分比
+                    "width": w_percent * 100,  # 转换为百分比
+                    "height": h_percent * 100  # 转换为百分比
+                }
+            })
+    elif tool == "image_classification":
+        # 使用AI服务进行图像分类
+        classifications = await inference_executor.run(
+            _model_key(tool, model), ai_service.classify_image, decoded_image, model_name=model
+        )
+        fallback = is_fallback(classifications)
+
+        # 转换为前端需要的格式
+        for cls in classifications:
+            annotations.append({
+                "type": "classification",
+                "label": cls["class_name"],
+                "confidence": cls["confidence"]
+            })
+
+    elif tool == "image_segmentation":
+        # 使用AI服务进行分割
+        try:
+            segments = await inference_executor.run(
+                _model_key(tool, model), ai_service.segment_objects, decoded_image, model_name=model
+            )
+            fallback = is_fallback(segments)
+
+            # 转换为前端需要的格式
+            for seg in segments:
+                class_name = seg["class_name"]
+                if category_list and class_name not in category_list:
+                    continue
+                    
+                annotations.append({
+                    "type": "polygon",
+                    "label": class_name,
+                    "confidence": seg["confidence"],
+                    "points": seg["points"]
+                })
+        except InferenceQueueFull:
+            raise
+        except Exception as seg_error:
+            print(f"分割处理错误: {str(seg_error)}")
+            import traceback
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"图像分割处理错误: {str(seg_error)}")
+    return annotations, fallback
+
 @router.post("/annotate")
 async def annotate_image(
     image: UploadFile = File(...),
     tool: str = Form(...),
     model: Optional[str] = Form(None),
     categories: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     使用AI模型标准化迭代系统进行图像自动标注
@@ -36,11 +120,8 @@ async def annotate_image(
     - **categories**: 可选的类别列表，JSON格式字符串
     """
     try:
-        # 创建临时文件保存上传的图像
-        temp_file_path = f"temp_{uuid.uuid4()}.jpg"
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(await image.read())
-        
+        image_bytes = await image.read()
+
         # 解析类别列表
         category_list = []
         if categories:
@@ -48,70 +129,26 @@ async def annotate_image(
                 category_list = json.loads(categories)
             except json.JSONDecodeError:
                 category_list = []
-        
-        # 根据工具类型选择不同的标注方法
-        annotations = []
-        if tool == "object_detection":
-            # 使用AI服务进行边界框检测
-            detections = ai_service.detect_objects(temp_file_path, model_name=model)
-            
-            # 转换为前端需要的格式
-            for det in detections:
-                class_name = det["class_name"]
-                if category_list and class_name not in category_list:
-                    continue
-                    
-                # 从bbox_percent中获取百分比坐标
-                x_percent, y_percent, w_percent, h_percent = det["bbox_percent"]
-                
-                annotations.append({
-                    "type": "bbox",
-                    "label": class_name,
-                    "confidence": det["confidence"],
-                    "bbox": {
-                        "x": x_percent * 100,  # 转换为百分比
-                        "y": y_percent * 100,  # 转换为百分比
-                        "width": w_percent * 100,  # 转换为百分比
-                        "height": h_percent * 100  # 转换为百分比
-                    }
-                })
-        elif tool == "image_classification":
-            # 使用AI服务进行图像分类
-            classifications = ai_service.classify_image(temp_file_path, model_name=model)
-            
-            # 转换为前端需要的格式
-            for cls in classifications:
-                annotations.append({
-                    "type": "classification",
-                    "label": cls["class_name"],
-                    "confidence": cls["confidence"]
-                })
 
-        elif tool == "image_segmentation":
-            # 使用AI服务进行分割
-            try:
-                segments = ai_service.segment_objects(temp_file_path, model_name=model)
-                
-                # 转换为前端需要的格式
-                for seg in segments:
-                    class_name = seg["class_name"]
-                    if category_list and class_name not in category_list:
-                        continue
-                        
-                    annotations.append({
-                        "type": "polygon",
-                        "label": class_name,
-                        "confidence": seg["confidence"],
-                        "points": seg["points"]
-                    })
-            except Exception as seg_error:
-                print(f"分割处理错误: {str(seg_error)}")
-                import traceback
-                traceback.print_exc()
-                raise HTTPException(status_code=500, detail=f"图像分割处理错误: {str(seg_error)}")
-        else:
+        if tool not in ("object_detection", "image_classification", "image_segmentation"):
             raise HTTPException(status_code=400, detail=f"不支持的标注工具类型: {tool}")
-        
+
+        # 同一图片、工具、模型、权重版本与类别过滤条件的结果直接取缓存
+        model_key = _model_key(tool, model)
+        version = await asyncio.to_thread(ai_service.model_version, model_key)
+        cache_key = None
+        if version and result_cache.enabled:
+            cache_key = result_cache.make_key(
+                image_bytes, tool, model_key, version,
+                {"endpoint": "visiofirm", "categories": category_list}
+            )
+        annotations = result_cache.get(cache_key) if cache_key else None
+        if annotations is None:
+            annotations, fallback = await _annotate(image_bytes, tool, model, category_list)
+            # 模型不可用或推理出错时返回的是模拟 / 空结果，不写入缓存
+            if cache_key and not fallback:
+                result_cache.put(cache_key, model_key, version, annotations)
+
         # 保存标注结果到数据库
         db_annotation = VisioFirmAnnotation(
             filename=image.filename,
@@ -121,11 +158,7 @@ async def annotate_image(
             created_at=datetime.utcnow()
         )
         db.add(db_annotation)
-        db.commit()
-        
-        # 删除临时文件
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        await db.commit()
         
         # 返回标注结果
         return JSONResponse(content={
@@ -134,11 +167,9 @@ async def annotate_image(
             "message": f"使用VisioFirm AI成功标注了{len(annotations)}个对象"
         })
         
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        # 确保临时文件被删除
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        
         # 打印详细错误信息
         import traceback
         print(f"标注过程中出错: {str(e)}")